@@ -1,2 +1,4 @@
 from .state import State
+from .budget import NodeBudget
 from .mcts import generate_move_mcts as generate_move
+from agents.common import init_saved_state as init
@@ -0,0 +1,202 @@
+import sys
+from functools import lru_cache
+from typing import Optional, Dict, Iterable
+
+import numpy as np
+
+from agents.common import BoardPiece
+from .state import State
+
+PRUNE = 'prune'
+STOP = 'stop'
+
+
+class NodeBudget(object):
+    """
+    Caps the number of live nodes of a search tree. Released nodes are kept in a free list and recycled by later
+    expansions (also across searches), so that a long game does not keep allocating new nodes.
+
+    When the budget is reached, the policy decides what happens:
+        PRUNE - the least-visited leaves are detached from the tree and their nodes are recycled
+        STOP  - expansion stops, the remaining iterations only refine the statistics of the existing nodes
+
+    The free list is not pickled, a budget sent to another process starts with an empty one.
+    """
+
+    def __init__(self, max_nodes: int, policy: str = PRUNE, prune_fraction: float = 0.1):
+        if max_nodes < 2:
+            raise ValueError("max_nodes must allow at least the root and one child")
+        if policy not in (PRUNE, STOP):
+            raise ValueError(f"Unknown policy {policy!r}, expected {PRUNE!r} or {STOP!r}")
+        self.max_nodes = max_nodes
+        self.policy = policy
+        self.prune_fraction = prune_fraction
+        self.free_nodes = []
+        self.live_nodes = 0
+        self.peak_nodes = 0
+        self.allocated = 0
+        self.recycled = 0
+        self.pruned = 0
+        self.expansions_refused = 0
+        self.last_report = None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["free_nodes"] = []
+        return state
+
+    def begin_search(self, root: State) -> None:
+        """
+        Resets the per-search counters, the live nodes are those of the tree below `root` (only the root itself,
+        unless a subtree of the previous search is reused)
+        """
+        self.live_nodes = self.peak_nodes = count_nodes(root)
+        self.allocated = self.recycled = self.pruned = self.expansions_refused = 0
+
+    def end_search(self, root: State, release: bool = True) -> Dict[str, int]:
+        """
+        Stores and returns the memory report of the finished search and, unless the tree is kept for reuse, releases
+        the whole tree into the free list
+        """
+        self.last_report = self.report()
+        if release:
+            self.release_tree(root)
+            self.live_nodes = 0
+        return self.last_report
+
+    def allocate(self, board: np.ndarray, player: BoardPiece, parent: Optional[State] = None) -> State:
+        """
+        Returns a node for the given position, recycled from the free list when possible
+        """
+        if self.free_nodes:
+            node = self.free_nodes.pop()
+            node.recycle(board, player, parent=parent)
+            self.recycled += 1
+        else:
+            node = State(board, player, parent=parent)
+            self.allocated += 1
+        self.live_nodes += 1
+        self.peak_nodes = max(self.peak_nodes, self.live_nodes)
+        return node
+
+    def release(self, node: State) -> None:
+        node.children.clear()
+        node.parent = None
+        if len(self.free_nodes) < self.max_nodes:
+            self.free_nodes.append(node)
+
+    def release_tree(self, root: State, keep: Optional[State] = None) -> None:
+        """
+        Releases every node reachable from `root` (shared nodes of a DAG only once), except the nodes reachable from
+        `keep`: in a DAG the subtree kept for the next search can also be reached through other children of `root`
+        """
+        seen = set()
+        if keep is not None:
+            stack = [keep]
+            while stack:
+                node = stack.pop()
+                if id(node) not in seen:
+                    seen.add(id(node))
+                    stack.extend(node.children.values())
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            stack.extend(node.children.values())
+            self.release(node)
+
+    def make_room(self, root: State, protected: Iterable[State],
+                  node_table: Optional[Dict[bytes, State]] = None) -> bool:
+        """
+        Checks whether a new node may be expanded, pruning the least-visited leaves first if the budget is used up
+        :param root:       State
+                           root node of the search, never pruned
+        :param protected:  iterable
+                           nodes that must not be pruned (the path selected in the current iteration)
+        :param node_table: dict
+                           position-keyed node table of the transposition-aware search, pruned nodes are removed
+        :return:           bool
+                           True if a node can be expanded
+        """
+        if self.live_nodes < self.max_nodes:
+            return True
+        if self.policy == STOP:
+            self.expansions_refused += 1
+            return False
+        self.prune(root, max(1, int(self.max_nodes * self.prune_fraction)), protected, node_table)
+        return self.live_nodes < self.max_nodes
+
+    def prune(self, root: State, no_of_nodes: int, protected: Iterable[State] = (),
+              node_table: Optional[Dict[bytes, State]] = None) -> int:
+        """
+        Detaches up to `no_of_nodes` of the least-visited leaves from the tree and recycles them
+        :return: int
+                 number of pruned nodes
+        """
+        protected_ids = {id(node) for node in protected}
+        protected_ids.add(id(root))
+        links = {}
+        leaves = {}
+        stack = [root]
+        seen = {id(root)}
+        while stack:
+            node = stack.pop()
+            for action, child in node.children.items():
+                links.setdefault(id(child), []).append((node, action))
+                if id(child) not in seen:
+                    seen.add(id(child))
+                    stack.append(child)
+                    if not child.children and id(child) not in protected_ids:
+                        leaves[id(child)] = child
+
+        victims = sorted(leaves.values(), key=lambda leaf: leaf.visits)[:no_of_nodes]
+        for leaf in victims:
+            for parent, action in links[id(leaf)]:
+                del parent.children[action]
+            if node_table is not None:
+                node_table.pop(leaf.key(), None)
+            self.release(leaf)
+        self.live_nodes -= len(victims)
+        self.pruned += len(victims)
+        return len(victims)
+
+    def report(self) -> Dict[str, int]:
+        """
+        Memory use of the current search: node counters and the approximate peak size of the tree in bytes
+        """
+        return dict(
+            max_nodes=self.max_nodes,
+            live_nodes=self.live_nodes,
+            peak_nodes=self.peak_nodes,
+            allocated=self.allocated,
+            recycled=self.recycled,
+            pruned=self.pruned,
+            expansions_refused=self.expansions_refused,
+            peak_bytes=self.peak_nodes * node_size_bytes(),
+        )
+
+
+def count_nodes(root: State) -> int:
+    """
+    Number of distinct nodes reachable from `root`
+    """
+    seen = {id(root)}
+    stack = [root]
+    while stack:
+        for child in stack.pop().children.values():
+            if id(child) not in seen:
+                seen.add(id(child))
+                stack.append(child)
+    return len(seen)
+
+
+@lru_cache(maxsize=None)
+def node_size_bytes(board_shape=(6, 7)) -> int:
+    """
+    Approximate number of bytes held by one node: the object, its attribute dict, its board and children dict
+    """
+    node = State(np.zeros(board_shape, dtype=BoardPiece))
+    return sys.getsizeof(node) + sys.getsizeof(node.__dict__) + sys.getsizeof(node.board) \
+        + sys.getsizeof(node.children)
@@ -1,40 +1,251 @@
+import sys
+import time
 from copy import copy
-from typing import Optional, Tuple
+from typing import Optional, Tuple, Dict, List, Union
 from agents.common import BoardPiece, SavedState, PlayerAction, get_valid_actions, apply_player_action, get_opponent, \
-    check_end_state, GameState
+    check_end_state, GameState, is_winning_action, position_key
 
 import numpy as np
-from agents.agent_mcts import State
+from agents.agent_mcts import State, NodeBudget
+from agents.agent_mcts.ponder import Ponderer
+from agents.rng import AgentRNG, global_rng
+from agents.metrics import get_metrics
+from agents.tablebase import consult
+from agents.transposition import SharedTranspositionTable, attach, EXACT
 
+RANDOM_ROLLOUT = 'random'  # every rollout move is chosen uniformly at random
+TACTICAL_ROLLOUT = 'tactical'  # take an immediate win, else block the opponent's immediate win, else random
+DEFAULT_ITERATIONS = 2000  # iterations of a search without a deadline
+SHARED_MIN_VISITS = 32  # nodes with fewer visits are not published to a shared transposition table
+SHARED_PRIOR_VISITS = 64  # visits a node seeded from a shared transposition table starts with, at most
+SHARED_KEY_TAG = 1 << 63  # tags MCTS entries in a shared table, whose values are relative to the root player
 
-def generate_move_mcts(board: np.ndarray, player: BoardPiece, saved_state: Optional[SavedState]) -> Tuple[
-        PlayerAction, Optional[SavedState]]:
-    # Choose a valid, non-full column and return it as `action`
-    no_of_iterations = 2000
-    action = mcts(board, no_of_iterations, player)
+
+class MCTSSavedState(SavedState):
+    """
+    Saved state of the MCTS agent: besides the RNG it keeps the node budget, the ponderer and whether the searches are
+    transposition-aware for the rest of the game
+    """
+
+    def __init__(self, rng: Optional[AgentRNG] = None, use_transpositions: bool = False):
+        super().__init__(rng=rng)
+        self.node_budget: Optional[NodeBudget] = None
+        self.ponderer: Optional[Ponderer] = None
+        self.use_transpositions = use_transpositions
+
+    def close(self) -> None:
+        if self.ponderer is not None:
+            self.ponderer.stop()
+
+
+def generate_move_mcts(board: np.ndarray, player: BoardPiece, saved_state: Optional[SavedState],
+                       no_of_iterations: Optional[int] = None, max_nodes: Optional[int] = None,
+                       rollout_policy: str = RANDOM_ROLLOUT, ponder: bool = False,
+                       shared_table: Optional[Union[str, SharedTranspositionTable]] = None,
+                       use_transpositions: Optional[bool] = None,
+                       deadline: Optional[float] = None) -> Tuple[PlayerAction, Optional[SavedState]]:
+    """
+    Chooses a valid, non-full column with a Monte-Carlo Tree Search (see mcts). Positions in the endgame tablebase (see
+    agents.tablebase) are not searched, its best move is played
+    :param board:              np.ndarray
+                               Current board represented by array for game state
+    :param player:             BoardPiece
+                               Current player taking the turn
+    :param saved_state:        SavedState
+                               State kept between the moves of the game, an MCTSSavedState is made from any other one
+    :param no_of_iterations:   int
+                               Number of iterations, DEFAULT_ITERATIONS without a deadline. With a deadline the search
+                               runs until the deadline, capped by `no_of_iterations` if given
+    :param max_nodes:          int
+                               Optional cap on the tree size, the NodeBudget (its recycled nodes and the memory report
+                               of the last search) is kept in the saved state for the rest of the game
+    :param rollout_policy:     str
+                               RANDOM_ROLLOUT or TACTICAL_ROLLOUT
+    :param ponder:             bool
+                               If True, the agent keeps searching the position after its move until the opponent has
+                               moved, then reuses the subtree of the opponent's move. Iterations done while pondering
+                               count towards `no_of_iterations`. The pondering thread competes for the GIL with
+                               opponents in the same process, only turn it on against a human (see Ponderer)
+    :param shared_table:       SharedTranspositionTable or str
+                               Optional table (or the name of one, see agents.transposition): new nodes start from the
+                               statistics other searches published for their position, and well visited nodes are
+                               published in turn
+    :param use_transpositions: bool
+                               If True, identical positions reached through different move orders share one node (see
+                               mcts). The setting is kept in the saved state for the rest of the game, None keeps the
+                               setting of the saved state
+    :param deadline:           float
+                               Optional time.monotonic() value at which the search stops
+    :return:                   tuple
+                               Chosen action and the saved state
+    """
+    if not isinstance(saved_state, MCTSSavedState):
+        saved_state = MCTSSavedState(rng=None if saved_state is None else saved_state.rng)
+    if use_transpositions is not None:
+        saved_state.use_transpositions = use_transpositions
+    if max_nodes is not None and saved_state.node_budget is None:
+        saved_state.node_budget = NodeBudget(max_nodes)
+    node_budget = saved_state.node_budget
+    entry = consult(board, player, "mcts")
+    if entry is not None:
+        if saved_state.ponderer is not None:
+            pondered = saved_state.ponderer.adopt(board, node_budget)
+            if pondered is not None and node_budget is not None:
+                node_budget.release_tree(pondered)
+        return entry.move, saved_state
+    if no_of_iterations is None:
+        no_of_iterations = DEFAULT_ITERATIONS if deadline is None else sys.maxsize
+    table = attach(shared_table) if isinstance(shared_table, str) else shared_table
+
+    if not ponder:
+        action = mcts(board, no_of_iterations, player, saved_state.use_transpositions, node_budget=node_budget,
+                      rollout_policy=rollout_policy, rng=saved_state.rng, deadline=deadline, shared_table=table)
+        return action, saved_state
+
+    if saved_state.ponderer is None:
+        saved_state.ponderer = Ponderer()
+    root = saved_state.ponderer.adopt(board, node_budget)
+    if root is None:
+        root = State(board.copy(), player=player)
+    metrics = get_metrics()
+    if metrics.enabled:
+        metrics.increment("ponder_hits" if root.visits else "ponder_misses", agent="mcts")
+        metrics.observe("pondered_visits", root.visits, buckets=(0, 100, 1000, 10000, 100000), agent="mcts")
+    action = mcts(board, max(no_of_iterations - root.visits, 0), player, saved_state.use_transpositions,
+                  node_budget=node_budget, rollout_policy=rollout_policy, rng=saved_state.rng, deadline=deadline,
+                  root=root, shared_table=table)
+    child = root.children.pop(action)
+    if node_budget is not None:
+        node_budget.release_tree(root, keep=child)
+        node_budget.begin_search(child)
+    saved_state.ponderer.start(child, player, node_budget, rollout_policy, saved_state.rng,
+                               saved_state.use_transpositions)
     return action, saved_state
 
 
-def mcts(board: np.ndarray, no_of_iterations: int, player: BoardPiece) -> PlayerAction:
+def mcts(board: np.ndarray, no_of_iterations: int, player: BoardPiece, use_transpositions: bool = False,
+         node_budget: Optional[NodeBudget] = None, rollout_policy: str = RANDOM_ROLLOUT,
+         rng: Optional[AgentRNG] = None, deadline: Optional[float] = None, root: Optional[State] = None,
+         shared_table: Optional[SharedTranspositionTable] = None) -> PlayerAction:
     """
     the Monte-Carlo Tree Search Algo wrapper, that creates the tree with root with initial board, traverse the tree and
     finally chooses the best action as per the no of wins
-    :param board:            np.ndarray
-                             Current board represented by array for game state
-    :param no_of_iterations: int
-                             Number of iterations for the Monte Carlo Algorithm
-    :param player:           BoardPiece
-                             Current player taking the turn
-    :return:                 PlayerAction
-                             Chosen best action the player should take
+    :param board:              np.ndarray
+                               Current board represented by array for game state
+    :param no_of_iterations:   int
+                               Number of iterations for the Monte Carlo Algorithm
+    :param player:             BoardPiece
+                               Current player taking the turn
+    :param use_transpositions: bool
+                               If True, identical positions reached through different move orders share one node,
+                               turning the search tree into a DAG (the nodes of a reused `root` included)
+    :param node_budget:        NodeBudget
+                               Optional cap on the number of live nodes, its report of the search is available as
+                               node_budget.last_report afterwards
+    :param rollout_policy:     str
+                               RANDOM_ROLLOUT or TACTICAL_ROLLOUT
+    :param rng:                AgentRNG
+                               Random number generator of the agent, the global one if not given
+    :param deadline:           float
+                               Optional time.monotonic() value at which the search stops, even if not all iterations
+                               are done (at least one iteration is always run)
+    :param root:               State
+                               Optional root node for `board` to continue searching (e.g. a subtree kept from the
+                               previous move). The caller owns it, so it is not released to the node budget
+    :param shared_table:       SharedTranspositionTable
+                               Optional table shared with other searches: new nodes are seeded from it and nodes with
+                               at least SHARED_MIN_VISITS visits are published to it after the search
+    :return:                   PlayerAction
+                               Chosen best action the player should take
+    """
+    metrics = get_metrics()
+    t0 = time.perf_counter() if metrics.enabled else 0.0
+    init_state = State(board.copy(), player=player) if root is None else root
+    node_table = new_node_table(init_state) if use_transpositions else None
+    if node_budget is not None:
+        node_budget.begin_search(init_state)
+    visits_before = init_state.visits  # a reused or pondered root comes with the visits of earlier searches
+    tree_traversal(no_of_iterations, init_state, player, node_table, node_budget, rollout_policy, rng, deadline,
+                   shared_table)
+    if not init_state.children:
+        # not even the first expansion happened before the deadline
+        tree_traversal(2, init_state, player, node_table, node_budget, rollout_policy, rng, shared_table=shared_table)
+    action = PlayerAction(init_state.get_best_action(0))
+    if shared_table is not None:
+        publish_statistics(init_state, player, shared_table)
+    if metrics.enabled:
+        report_search_metrics(init_state, init_state.visits - visits_before, time.perf_counter() - t0)
+    if node_budget is not None:
+        node_budget.end_search(init_state, release=root is None)
+    return action
+
+
+def tree_statistics(root: State) -> Tuple[int, int]:
+    """
+    Counts the distinct nodes and the parent-child links reachable from `root`. In the transposition-aware search
+    every link beyond the first one into a node is a transposition hit
+    :param root: State
+                 root node of the search
+    :return:     tuple
+                 number of nodes and number of links
     """
-    init_state = State(board.copy(), player=player)
-    tree_traversal(no_of_iterations, init_state, player)
-    chosen_child: State = init_state.get_best_move(0)
-    return PlayerAction(chosen_child.action)
+    seen = {id(root)}
+    stack = [root]
+    links = 0
+    while stack:
+        node = stack.pop()
+        links += len(node.children)
+        for child in node.children.values():
+            if id(child) not in seen:
+                seen.add(id(child))
+                stack.append(child)
+    return len(seen), links
 
 
-def tree_traversal(no_of_iterations: int, initial_node: State, player: BoardPiece):
+def report_search_metrics(root: State, no_of_iterations: int, seconds: float):
+    """
+    Reports the statistics of a finished search to the metrics registry. `no_of_iterations` are the iterations of this
+    search only (every one of them ends with a rollout or a terminal node backpropagated to the root), not the visits
+    the root brought from earlier searches
+    """
+    metrics = get_metrics()
+    nodes, links = tree_statistics(root)
+    transposition_hits = links - (nodes - 1)
+    metrics.increment("searches", agent="mcts")
+    metrics.increment("iterations", no_of_iterations, agent="mcts")
+    metrics.increment("rollouts", no_of_iterations, agent="mcts")
+    metrics.increment("transposition_hits", transposition_hits, agent="mcts")
+    metrics.set_gauge("tree_nodes", nodes, agent="mcts")
+    metrics.set_gauge("iterations_per_second", no_of_iterations / seconds if seconds > 0 else 0.0, agent="mcts")
+    metrics.observe("search_seconds", seconds, agent="mcts")
+    metrics.event("search", agent="mcts", iterations=no_of_iterations, seconds=seconds, tree_nodes=nodes,
+                  rollouts=no_of_iterations, transposition_hits=transposition_hits,
+                  transposition_hit_rate=transposition_hits / links if links else 0.0)
+
+
+def new_node_table(root: State) -> Dict[bytes, State]:
+    """
+    Creates the position-keyed node table used by the transposition-aware search, seeded with the root node and the
+    nodes already below it (a subtree kept from the previous move)
+    :param root: State
+                 root node of the search
+    :return:     dict
+                 mapping of State.key() to the node holding the statistics of that position
+    """
+    node_table = {root.key(): root}
+    stack = [root]
+    while stack:
+        for child in stack.pop().children.values():
+            if child.key() not in node_table:
+                node_table[child.key()] = child
+                stack.append(child)
+    return node_table
+
+
+def tree_traversal(no_of_iterations: int, initial_node: State, player: BoardPiece,
+                   node_table: Optional[Dict[bytes, State]] = None, node_budget: Optional[NodeBudget] = None,
+                   rollout_policy: str = RANDOM_ROLLOUT, rng: Optional[AgentRNG] = None,
+                   deadline: Optional[float] = None, shared_table: Optional[SharedTranspositionTable] = None):
     """
     traverse the tree for the given number of iterations to populate the search tree with wins and visit suggestions
     :param no_of_iterations: int
@@ -43,29 +254,92 @@ def tree_traversal(no_of_iterations: int, initial_node: State, player: BoardPiec
                              State object for the current game board acting the root of the search tree
     :param player:           BoardPiece
                              Current player taking the turn
+    :param node_table:       dict
+                             Optional position-keyed node table. When given, expansion links to the existing node of
+                             an already reached position
+    :param node_budget:      NodeBudget
+                             Optional cap on the number of live nodes. Once reached, leaves are pruned or expansion
+                             stops, depending on the policy of the budget
+    :param rollout_policy:   str
+                             RANDOM_ROLLOUT or TACTICAL_ROLLOUT
+    :param rng:              AgentRNG
+                             Random number generator of the agent, the global one if not given
+    :param deadline:         float
+                             Optional time.monotonic() value after which no further iteration is started
+    :param shared_table:     SharedTranspositionTable
+                             Optional shared table the statistics of newly created nodes are seeded from
     """
+    rng = global_rng() if rng is None else rng
     for _ in range(no_of_iterations):
-        current_node = select_leaf_node(initial_node)
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+        path = []
+        current_node = select_leaf_node(initial_node, path)
+
+        if current_node.visits != 0 and (node_budget is None or node_budget.make_room(initial_node, path, node_table)):
+            current_node = expand(current_node, node_table, node_budget, rng)
+            path.append(current_node)
+            if shared_table is not None and current_node.visits == 0:
+                seed_statistics(current_node, player, shared_table)
+        v = rollout(current_node, initial_node, player, rollout_policy, rng)
+        backpropagate_path(path, v)
+
 
-        if current_node.visits != 0:
-            current_node = expand(current_node)
-        v = rollout(current_node, initial_node, player)
-        backpropagate(current_node, v)
+def shared_key(board: np.ndarray, player: BoardPiece) -> int:
+    """
+    Key of a position in a shared transposition table searched with `player` at the root (node values count the wins
+    of the root player, so they are only shared between searches of the same root player)
+    """
+    return position_key(board) | SHARED_KEY_TAG | int(player) << 56
 
 
-def select_leaf_node(node) -> State:
+def seed_statistics(node: State, player: BoardPiece, table: SharedTranspositionTable) -> None:
+    """
+    Starts a new node with the statistics published for its position, scaled down to at most SHARED_PRIOR_VISITS visits
+    """
+    entry = table.probe(shared_key(node.board, player))
+    if entry is not None and entry.visits > 0:
+        visits = min(entry.visits, SHARED_PRIOR_VISITS)
+        node.visits = visits
+        node.value = entry.value * visits / entry.visits
+
+
+def publish_statistics(root: State, player: BoardPiece, table: SharedTranspositionTable) -> None:
+    """
+    Stores the statistics of all nodes with at least SHARED_MIN_VISITS visits, unless the table holds more visits
+    """
+    stack, published = [root], set()
+    while stack:
+        node = stack.pop()
+        if node.visits < SHARED_MIN_VISITS or id(node) in published:
+            continue
+        published.add(id(node))
+        key = shared_key(node.board, player)
+        entry = table.probe(key)
+        if entry is None or entry.visits < node.visits:
+            move = node.get_best_action(0)
+            table.store(key, node.value, node.visits.bit_length(), EXACT, -1 if move is None else int(move),
+                        node.visits)
+        stack.extend(node.children.values())
+
+
+def select_leaf_node(node, path: Optional[List[State]] = None) -> State:
     """
     checks if the given node is a leaf node i.e. whether it is not fully expanded(there are available actions still left
     to explore) or continue to move down the tree until it finds a leaf node
     :param node: State
                  current node to be checked
+    :param path: list
+                 if given, every node visited on the way down is appended to it
     :return:     State
                  Leaf node (not fully expanded tree node)
     """
+    if path is not None:
+        path.append(node)
     if node.is_leaf_node():
         return node
     best_node = node.get_best_move(exploration_constant=2)
-    return select_leaf_node(best_node)
+    return select_leaf_node(best_node, path)
 
 
 def calculate_value(rolledout_node: State, terminal_node: State, init_player: BoardPiece):
@@ -88,7 +362,8 @@ def calculate_value(rolledout_node: State, terminal_node: State, init_player: Bo
     return value
 
 
-def rollout(rolledout_node: State, init_node: State, init_player: BoardPiece):
+def rollout(rolledout_node: State, init_node: State, init_player: BoardPiece, policy: str = RANDOM_ROLLOUT,
+            rng: Optional[AgentRNG] = None):
     """
     Calculate and return the value of the node according to the WIN of the game current player by simulating randomly until it
     reaches terminal state. Returns 0 when it is the root node, since it does not need simulation
@@ -99,12 +374,19 @@ def rollout(rolledout_node: State, init_node: State, init_player: BoardPiece):
                              initial node
     :param init_player:      BoardPiece
                              Current game player taking the turn(initial player)
+    :param policy:           str
+                             RANDOM_ROLLOUT or TACTICAL_ROLLOUT
+    :param rng:              AgentRNG
+                             Random number generator of the agent, the global one if not given
     :return:                 Float
                              simulation value according to the WIN of the game current player
     """
     value = 0
     if rolledout_node == init_node:
         return value
+    rng = global_rng() if rng is None else rng
+    if policy == TACTICAL_ROLLOUT:
+        return tactical_rollout(rolledout_node, init_player, rng)
     current_node = copy(rolledout_node)
 
     while True:
@@ -114,12 +396,67 @@ def rollout(rolledout_node: State, init_node: State, init_player: BoardPiece):
             value = calculate_value(rolledout_node, current_node, init_player)
             break
         valid_actions = get_valid_actions(board)
-        selected_action = np.random.choice(valid_actions)
+        selected_action = rng.choice(valid_actions)
         board = apply_player_action(board, selected_action, current_player, True)
         current_node = State(board=board, player=get_opponent(current_player))
     return value
 
 
+def tactical_rollout(rolledout_node: State, init_player: BoardPiece, rng: Optional[AgentRNG] = None):
+    """
+    Simulates the game from the node with the tactical policy (see choose_tactical_action). Wins are detected with the
+    cheap last-move check instead of building a State for every ply
+
+    :param rolledout_node:   State
+                             the node that is simulated
+    :param init_player:      BoardPiece
+                             Current game player taking the turn(initial player)
+    :param rng:              AgentRNG
+                             Random number generator of the agent, the global one if not given
+    :return:                 int
+                             simulation value according to the WIN of the game current player
+    """
+    rng = global_rng() if rng is None else rng
+    if rolledout_node.is_terminal:
+        return calculate_value(rolledout_node, rolledout_node, init_player)
+    board = rolledout_node.board.copy()
+    current_player = rolledout_node.player
+    while True:
+        valid_actions = get_valid_actions(board)
+        if len(valid_actions) == 0:
+            return 0
+        selected_action, is_win = choose_tactical_action(board, valid_actions, current_player, rng)
+        if is_win:
+            return int(current_player == init_player and rolledout_node.player == get_opponent(init_player))
+        apply_player_action(board, selected_action, current_player)
+        current_player = get_opponent(current_player)
+
+
+def choose_tactical_action(board: np.ndarray, valid_actions: np.ndarray, player: BoardPiece,
+                           rng: Optional[AgentRNG] = None) -> Tuple[PlayerAction, bool]:
+    """
+    Takes an immediate win, otherwise blocks the opponent's immediate win, otherwise plays randomly
+    :param board:         np.ndarray
+                          Current board
+    :param valid_actions: np.ndarray
+                          Playable columns
+    :param player:        BoardPiece
+                          Player to move
+    :param rng:           AgentRNG
+                          Random number generator of the agent, the global one if not given
+    :return:              tuple
+                          chosen action and whether it wins the game
+    """
+    for action in valid_actions:
+        if is_winning_action(board, action, player):
+            return action, True
+    opponent = get_opponent(player)
+    for action in valid_actions:
+        if is_winning_action(board, action, opponent):
+            return action, False
+    return (global_rng() if rng is None else rng).choice(valid_actions), False
+
+
 def backpropagate(current_node, v):
     """
     Backpropagate the simulated value and the visit till the root node and
@@ -138,23 +475,58 @@ def backpropagate(current_node, v):
         v = int(not v)
 
 
-def expand(node):
+def backpropagate_path(path: List[State], v):
+    """
+    Backpropagate the simulated value and the visit along the selected path. In the transposition-aware search a node
+    can have several parents, so the parent pointer does not necessarily lead back the way the node was reached
+
+    :param path:             list
+                             nodes from the root down to the simulated node
+    :param v:                int
+                             simulation value
+    """
+    for current_node in reversed(path):
+        current_node.update_state(v)
+        v = int(not v)
+
+
+def expand(node, node_table: Optional[Dict[bytes, State]] = None, node_budget: Optional[NodeBudget] = None,
+           rng: Optional[AgentRNG] = None):
     """
     Expand the node with a randomly chosen child
-    :param node: State
-                 The node where a new randomly chosen child is added
-    :return:     State
-                 created child node
+    :param node:        State
+                        The node where a new randomly chosen child is added
+    :param node_table:  dict
+                        Optional position-keyed node table. If the child position is already in it, the existing node
+                        is linked as the child instead of creating a new one
+    :param node_budget: NodeBudget
+                        Optional node budget the child is allocated (or recycled) from
+    :param rng:         AgentRNG
+                        Random number generator of the agent, the global one if not given
+    :return:            State
+                       created (or linked) child node
     """
     board = node.board
     valid_actions = get_valid_actions(board)
     valid_actions = remove_action_already_present_as_child(node, valid_actions)
 
-    action = np.random.choice(valid_actions)
+    action = (global_rng() if rng is None else rng).choice(valid_actions)
     player = node.player
     child_board = apply_player_action(board, action, player, True)
-    child = State(child_board, get_opponent(player), parent=node, action=action)
+    if node_table is not None:
+        child = node_table.get(child_board.tobytes())
+        if child is not None:
+            node.children[action] = child
+            return child
+    # a node of the transposition-aware search can get more parents, it keeps none
+    parent = node if node_table is None else None
+    if node_budget is not None:
+        child = node_budget.allocate(child_board, get_opponent(player), parent=parent)
+    else:
+        child = State(child_board, get_opponent(player), parent=parent)
     node.children[action] = child
+    if node_table is not None:
+        node_table[child.key()] = child
     return child
 
 
@@ -0,0 +1,93 @@
+import threading
+from typing import Optional
+
+import numpy as np
+
+from agents.common import BoardPiece
+from agents.rng import AgentRNG
+from .state import State
+from .budget import NodeBudget
+
+PONDER_CHUNK = 50  # iterations between two checks of the stop flag
+MAX_PONDER_ITERATIONS = 200000  # pondering stops by itself after this many iterations
+
+
+class Ponderer(object):
+    """
+    Keeps searching the position after the agent's own move in a background thread, while the opponent thinks. When
+    the opponent's move arrives, the subtree of the resulting position is adopted as the root of the next search.
+
+    The thread shares the RNG and node budget of the agent, it is always stopped before the agent searches again.
+    It also shares the GIL with everything else in the process: against an opponent searching in the same process
+    (tournament.py, agent-vs-agent games of main.py, benchmarks) it slows that opponent down, so pondering is off by
+    default and only turned on for games against a human (main.py).
+    """
+
+    def __init__(self):
+        self.root: Optional[State] = None
+        self.player: Optional[BoardPiece] = None
+        self.thread: Optional[threading.Thread] = None
+        self.stop_event = threading.Event()
+        self.iterations = 0
+        self.hits = 0
+        self.misses = 0
+
+    def start(self, root: State, player: BoardPiece, node_budget: Optional[NodeBudget], rollout_policy: str,
+              rng: AgentRNG, use_transpositions: bool = False) -> None:
+        """
+        Starts pondering on `root`, the position after the agent's move
+        :param root:               State
+                                   node of the position the opponent has to move in
+        :param player:             BoardPiece
+                                   the agent's player, the values of the tree are kept from its point of view
+        :param use_transpositions: bool
+                                   whether the pondering search is transposition-aware, as the agent's searches
+        """
+        from .mcts import tree_traversal, new_node_table
+
+        self.stop()
+        self.root, self.player = root, player
+        root.parent = None
+        self.iterations = 0
+        self.stop_event.clear()
+        node_table = new_node_table(root) if use_transpositions else None
+
+        def ponder():
+            while not self.stop_event.is_set() and self.iterations < MAX_PONDER_ITERATIONS and not root.is_terminal:
+                tree_traversal(PONDER_CHUNK, root, player, node_table, node_budget, rollout_policy, rng)
+                self.iterations += PONDER_CHUNK
+
+        self.thread = threading.Thread(target=ponder, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+
+    def adopt(self, board: np.ndarray, node_budget: Optional[NodeBudget] = None) -> Optional[State]:
+        """
+        Stops pondering and returns the node of `board` (the position after the opponent's move) detached from the
+        pondered tree, or None if the opponent played a move that was not explored. The rest of the pondered tree is
+        released to the node budget.
+        """
+        self.stop()
+        root, self.root = self.root, None
+        if root is None:
+            return None
+        adopted = None
+        for action, child in root.children.items():
+            if np.array_equal(child.board, board):
+                adopted = child
+                break
+        if adopted is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            del root.children[action]
+            adopted.parent = None
+        if node_budget is not None:
+            node_budget.release_tree(root, keep=adopted)
+            node_budget.live_nodes = 0
+        return adopted
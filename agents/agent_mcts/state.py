@@ -1,4 +1,7 @@
 import math
+import warnings
+from typing import Optional
+
 import numpy as np
 
 from agents.common import BoardPiece, PlayerAction, check_end_state, get_valid_actions, GameState, PLAYER1, PLAYER2
@@ -6,19 +9,55 @@ from agents.common import BoardPiece, PlayerAction, check_end_state, get_valid_a
 
 class State(object):
     def __init__(self, board: np.ndarray, player: BoardPiece = None, value: float = 0.0, visits: int = 0,
-                 action: PlayerAction = 0, parent=None):
-        self.board = board.copy()
+                 parent=None, action: Optional[PlayerAction] = None):
+        # the node takes ownership of `board` (recycle writes into it): pass a fresh, writeable board, never the
+        # read-only board the harness lends to the agent
+        # the actions are kept on the edges, as the keys of the parent's `children`: in the transposition-aware search
+        # a node is the child of several parents through different actions, and it has no `parent` pointer
+        # `action` is deprecated, it is only read by the deprecated add_child(child)
+        if action is not None:
+            warnings.warn("State(action=...) is deprecated, pass the action to add_child(action, child)",
+                          DeprecationWarning, stacklevel=2)
+        self.action = action
+        self.board = board
         self.children = {}
         self.value = value
         self.visits = visits
         self.player = player
-        self.action = action
         self.parent = parent
-        self.is_terminal = not(check_end_state(self.board, PLAYER1) == GameState.STILL_PLAYING) \
-                           or not(check_end_state(self.board, PLAYER2) == GameState.STILL_PLAYING)
+        self.is_terminal = self.check_terminal()
+
+    def check_terminal(self) -> bool:
+        return not(check_end_state(self.board, PLAYER1) == GameState.STILL_PLAYING) \
+               or not(check_end_state(self.board, PLAYER2) == GameState.STILL_PLAYING)
+
+    def recycle(self, board: np.ndarray, player: BoardPiece = None, parent=None):
+        """
+        Re-initializes a released node in place for a new position, reusing its board buffer
+        """
+        self.board[...] = board
+        self.children.clear()
+        self.value = 0.0
+        self.visits = 0
+        self.player = player
+        self.parent = parent
+        self.action = None
+        self.is_terminal = self.check_terminal()
+
+    def key(self) -> bytes:
+        """
+        Position key of the node, identical for every path (move order) leading to the same board
+        """
+        return self.board.tobytes()
 
-    def add_child(self, child):
-        self.children[child.action] = child
+    def add_child(self, action, child=None):
+        if child is None:  # deprecated add_child(child), the action was given to the child's constructor
+            warnings.warn("add_child(child) is deprecated, use add_child(action, child)", DeprecationWarning,
+                          stacklevel=2)
+            action, child = action.action, action
+            if action is None:
+                raise TypeError("add_child(child) needs a child created with an action, use add_child(action, child)")
+        self.children[action] = child
 
     def update_state(self, value: float) -> None:
         self.visits += 1
@@ -34,21 +73,27 @@ class State(object):
         return w_i / s_i + exploration_constant * math.sqrt(math.log(s_p) / s_i)
 
     def get_best_move(self, exploration_constant):
+        return self.get_best_edge(exploration_constant)[1]
+
+    def get_best_action(self, exploration_constant) -> PlayerAction:
+        return self.get_best_edge(exploration_constant)[0]
+
+    def get_best_edge(self, exploration_constant):
         # define best score & best moves
         best_score = float('-inf')
-        best_child = None
+        best_action, best_child = None, None
 
-        # loop over child nodes
-        for child_node in self.children.values():
+        # loop over the edges (action, child node)
+        for action, child_node in self.children.items():
             w_i = child_node.value
             s_i = child_node.visits
             s_p = self.visits
             if s_i == 0:
-                best_child = child_node
+                best_action, best_child = action, child_node
             else:
                 move_score = w_i if exploration_constant == 0 else child_node.get_ucb1_value(s_p, exploration_constant)
                 if move_score > best_score:
                     best_score = move_score
-                    best_child = child_node
+                    best_action, best_child = action, child_node
 
-        return best_child
+        return best_action, best_child
@@ -1 +1,3 @@
+from .eval_cache import EvaluationCache
 from .minimax import generate_move_minimax as generate_move
+from agents.common import init_saved_state as init
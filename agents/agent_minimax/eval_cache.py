@@ -0,0 +1,64 @@
+from collections import OrderedDict
+from typing import Callable, Dict
+
+import numpy as np
+
+from agents.common import BoardPiece
+
+DEFAULT_MAX_ENTRIES = 100_000  # about 20 MB
+ENTRY_BYTES = 200  # approximate size of an entry: key bytes, score and the OrderedDict link
+
+
+class EvaluationCache(object):
+    """
+    Bounded cache of the results of the deterministic evaluation function `evaluate(board, player)` (score_action),
+    keyed by the board bytes and the player. A cache only ever holds the scores of its own evaluation function (keep
+    one cache per evaluator). Once `max_entries` entries are cached, the least recently used one is evicted for every
+    new entry.
+    The entries are not pickled (nor copied by copy.copy): a saved state sent to another process gets an empty cache
+    with the same settings and counters, instead of megabytes of scores that are cheap to recompute
+    """
+
+    def __init__(self, evaluate: Callable[[np.ndarray, BoardPiece], int], max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.evaluate_uncached = evaluate
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[bytes, int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def evaluate(self, board: np.ndarray, player: BoardPiece) -> int:
+        """
+        evaluate(board, player), computed only if it is not cached
+        """
+        key = board.tobytes() + bytes((int(player),))
+        score = self.entries.get(key)
+        if score is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return score
+        self.misses += 1
+        score = self.evaluate_uncached(board, player)
+        if self.max_entries > 0:
+            self.entries[key] = score
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return score
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["entries"] = OrderedDict()
+        return state
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def statistics(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return dict(entries=len(self.entries), max_entries=self.max_entries, hits=self.hits, misses=self.misses,
+                    evictions=self.evictions, hit_rate=self.hits / lookups if lookups else 0.0,
+                    approx_bytes=len(self.entries) * ENTRY_BYTES)
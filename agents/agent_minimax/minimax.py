@@ -1,8 +1,18 @@
+import time
 from enum import Enum
-from typing import Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple, Union
 from agents.common import BoardPiece, SavedState, PlayerAction, get_valid_actions, check_end_state, \
-    GameState, PLAYER1, PLAYER2, NO_PLAYER, apply_player_action, CONNECT_N, get_opponent
+    GameState, PLAYER1, PLAYER2, NO_PLAYER, apply_player_action, CONNECT_N, get_opponent, position_key
 import numpy as np
+from agents.rng import AgentRNG, global_rng
+from agents.metrics import get_metrics
+from agents.transposition import SharedTranspositionTable, attach, bound_flag, EXACT, LOWER_BOUND, UPPER_BOUND
+from agents.tablebase import consult
+from agents.agent_minimax.eval_cache import EvaluationCache, DEFAULT_MAX_ENTRIES
+from agents.agent_minimax.threats import threat_score
+
+
+SEARCH_DEPTH = 4  # depth of a search without a deadline
 
 
 class Count(Enum):
@@ -10,6 +20,25 @@ class Count(Enum):
     IS_NOT_COUNTABLE = 0
 
 
+class SearchTimeout(Exception):
+    """
+    Raised inside the search when its deadline has passed
+    """
+
+
+class MinimaxSavedState(SavedState):
+    """
+    Saved state of the minimax agent: besides the RNG it keeps an evaluation cache per evaluator for the rest of the
+    game, `eval_cache` is the one of the last search
+    """
+
+    def __init__(self, rng: Optional[AgentRNG] = None, eval_cache: Optional[EvaluationCache] = None):
+        super().__init__(rng=rng)
+        self.eval_cache = eval_cache
+        self.eval_caches: Dict[Callable, EvaluationCache] = {} if eval_cache is None else \
+            {eval_cache.evaluate_uncached: eval_cache}
+
+
 def check_for_score_for_no_of_filled_position(board: np.ndarray, player: BoardPiece, no_of_filled_position: int):
     """
     # Remark: explain briefly what the function is doing - Student comment : added
@@ -156,8 +185,18 @@ def score_action(board: np.ndarray, player: BoardPiece):
         return (my_fours - opp_fours) * 100000 + (my_threes - opp_threes) * 100 + (my_twos - opp_twos) * 10
 
 
-def minimax_with_alpha_beta_pruning(board: np.ndarray, depth: int, alpha: float, beta: float, player: BoardPiece) -> (
-        PlayerAction, int):
+HEURISTIC = "heuristic"
+THREATS = "threats"
+EVALUATORS = {HEURISTIC: score_action, THREATS: threat_score}
+
+
+def minimax_with_alpha_beta_pruning(board: np.ndarray, depth: int, alpha: float, beta: float, player: BoardPiece,
+                                    rng: Optional[AgentRNG] = None, stats: Optional[dict] = None,
+                                    deadline: Optional[float] = None,
+                                    table: Optional[SharedTranspositionTable] = None,
+                                    cache: Optional[EvaluationCache] = None,
+                                    evaluate: Callable[[np.ndarray, BoardPiece], int] = score_action) \
+        -> (PlayerAction, int):
     """
     Apply minimax with alpha beta pruning and generate move for current player and returns player action
     :param board:           np.ndarray
@@ -170,38 +209,82 @@ def minimax_with_alpha_beta_pruning(board: np.ndarray, depth: int, alpha: float,
                             beta parameter to prune away computing node values whenever alpha > beta
     :param player:          BoardPiece
                             Player for whom move is being generated
+    :param rng:             AgentRNG
+                            Random number generator of the agent, the global one if not given
+    :param stats:           dict
+                            if given, its 'nodes' and 'leaves' counters are incremented for every searched node and
+                            every evaluated leaf
+    :param deadline:        float
+                            optional time.monotonic() value, SearchTimeout is raised when a node is entered later
+    :param table:           SharedTranspositionTable
+                            optional transposition table, searched nodes are stored in it and looked up before they
+                            are searched again (by this or any other process attached to the table)
+    :param cache:           EvaluationCache
+                            optional cache the leaves are evaluated through
+    :param evaluate:        Callable
+                            evaluation function of the leaves (one of EVALUATORS) if no cache is given, the cache
+                            evaluates with its own
     :return:                tuple
                             tuple containing player action (move) and saved state
     """
 
     valid_locations = get_valid_actions(board)
+    if stats is not None:
+        stats['nodes'] += 1
+    if deadline is not None and time.monotonic() >= deadline:
+        raise SearchTimeout
 
     if depth == 0 or len(valid_locations) == 0 or check_end_state(board, player) != GameState.STILL_PLAYING:
-        return -1, score_action(board, player)
+        if stats is not None:
+            stats['leaves'] += 1
+        return -1, evaluate(board, player) if cache is None else cache.evaluate(board, player)
+
+    key, entry = None, None
+    if table is not None:
+        key = position_key(board)
+        entry = table.probe(key)
+        if entry is not None and entry.depth >= depth:
+            if entry.flag == EXACT:
+                return PlayerAction(entry.move), entry.value
+            if entry.flag == LOWER_BOUND:
+                alpha = max(alpha, entry.value)
+            elif entry.flag == UPPER_BOUND:
+                beta = min(beta, entry.value)
+            if alpha >= beta:
+                return PlayerAction(entry.move), entry.value
+    window = (alpha, beta)
 
     # Remark: you should randomize among the moves with the highest score after evaluating
     #  - Student comment : fixed it by just shuffling and then taking the best_column
-    np.random.shuffle(valid_locations)
+    rng = global_rng() if rng is None else rng
+    rng.shuffle(valid_locations)
+    if entry is not None and entry.move in valid_locations:
+        # search the best move of an earlier (shallower) search first, for the earliest cutoffs
+        valid_locations = np.concatenate(([entry.move], valid_locations[valid_locations != entry.move]))
 
     if player == PLAYER1:
         max_score = -np.inf
         best_column = valid_locations.__getitem__(0)
         for col in valid_locations:
             updated_copy_board = apply_player_action(board, col, player, True)
-            _, new_score = minimax_with_alpha_beta_pruning(updated_copy_board, depth - 1, alpha, beta, PLAYER2)
+            _, new_score = minimax_with_alpha_beta_pruning(updated_copy_board, depth - 1, alpha, beta, PLAYER2, rng,
+                                                          stats, deadline, table, cache, evaluate)
             if new_score > max_score:
                 max_score = new_score
                 best_column = col
             alpha = max(alpha, new_score)
             if alpha >= beta:
                 break
+        if table is not None:
+            table.store(key, max_score, depth, bound_flag(max_score, *window), int(best_column))
         return best_column, max_score
     else:
         min_score = np.inf
         best_column = valid_locations.__getitem__(0)
         for col in valid_locations:
             updated_copy_board = apply_player_action(board, col, player, True)
-            _, new_score = minimax_with_alpha_beta_pruning(updated_copy_board, depth - 1, alpha, beta, PLAYER1)
+            _, new_score = minimax_with_alpha_beta_pruning(updated_copy_board, depth - 1, alpha, beta, PLAYER1, rng,
+                                                          stats, deadline, table, cache, evaluate)
             if new_score < min_score:
                 min_score = new_score
                 best_column = col
@@ -210,11 +293,166 @@ def minimax_with_alpha_beta_pruning(board: np.ndarray, depth: int, alpha: float,
             beta = min(new_score, beta)
             if beta <= alpha:
                 break
+        if table is not None:
+            table.store(key, min_score, depth, bound_flag(min_score, *window), int(best_column))
         return best_column, min_score
 
 
-def generate_move_minimax(board: np.ndarray, player: BoardPiece, saved_state: Optional[SavedState]) -> Tuple[
-        PlayerAction, Optional[SavedState]]:
+def iterative_deepening(board: np.ndarray, player: BoardPiece, deadline: float, rng: Optional[AgentRNG] = None,
+                        stats: Optional[dict] = None, table: Optional[SharedTranspositionTable] = None,
+                        cache: Optional[EvaluationCache] = None,
+                        evaluate: Callable[[np.ndarray, BoardPiece], int] = score_action) -> (PlayerAction, int):
+    """
+    Searches with increasing depth until the deadline passes or the whole game tree is searched. The depth grows in
+    steps of 2: the leaves are scored for the player to move there while PLAYER1 maximizes, which only keeps the sign of
+    the scores at even depths (as SEARCH_DEPTH). The first search (depth 2) always completes, even past the deadline
+    :param board:           np.ndarray
+                            Current state of the board
+    :param player:          BoardPiece
+                            Player for whom move is being generated
+    :param deadline:        float
+                            time.monotonic() value at which the search is stopped
+    :param rng:             AgentRNG
+                            Random number generator of the agent, the global one if not given
+    :param stats:           dict
+                            optional node counters, see minimax_with_alpha_beta_pruning
+    :param table:           SharedTranspositionTable
+                            optional transposition table, see minimax_with_alpha_beta_pruning
+    :param cache:           EvaluationCache
+                            optional leaf evaluation cache
+    :param evaluate:        Callable
+                            evaluation function of the leaves, see minimax_with_alpha_beta_pruning
+    :return:                tuple
+                            move of the deepest completed search and its depth (0 if the board is full)
+    """
+    valid_actions = get_valid_actions(board)
+    action = valid_actions[0] if len(valid_actions) else PlayerAction(-1)
+    max_depth = int(np.count_nonzero(board == NO_PLAYER))
+    completed_depth = 0
+    for depth in range(2, max_depth + 2, 2):
+        try:
+            action, _ = minimax_with_alpha_beta_pruning(board, depth, -np.inf, np.inf, player, rng, stats,
+                                                        deadline if completed_depth else None, table, cache, evaluate)
+        except SearchTimeout:
+            break
+        completed_depth = depth
+    return action, completed_depth
+
+
+def multi_pv(board: np.ndarray, depth: int, player: BoardPiece, k: Optional[int] = None,
+             rng: Optional[AgentRNG] = None, stats: Optional[dict] = None,
+             table: Optional[SharedTranspositionTable] = None,
+             cache: Optional[EvaluationCache] = None,
+             evaluate: Callable[[np.ndarray, BoardPiece], int] = score_action) -> List[Tuple[PlayerAction, float]]:
+    """
+    Scores all root moves (or the best `k`) in one search. Every move gets the score the minimax search of `depth`
+    plies gives it, the moves are searched with a common transposition table and evaluation cache, so the subtrees
+    the moves share are searched once. With `k` a move is searched with the k-th best score found so far as bound and
+    dropped as soon as it cannot beat it
+    :param board:           np.ndarray
+                            Current state of the board
+    :param depth:           int
+                            search depth, including the root move
+    :param player:          BoardPiece
+                            Player for whom the moves are scored
+    :param k:               int
+                            if given, only the best k moves are returned
+    :param rng:             AgentRNG
+                            Random number generator of the agent, the global one if not given
+    :param stats:           dict
+                            optional node counters, see minimax_with_alpha_beta_pruning
+    :param table:           SharedTranspositionTable
+                            optional transposition table, also used to search the most promising moves first
+    :param cache:           EvaluationCache
+                            optional leaf evaluation cache
+    :param evaluate:        Callable
+                            evaluation function of the leaves, see minimax_with_alpha_beta_pruning
+    :return:                list
+                            (action, score) pairs, best move first
+    """
+    maximizing = player == PLAYER1
+    sign = 1 if maximizing else -1
+    opponent = get_opponent(player)
+    children = [(col, apply_player_action(board, col, player, True)) for col in get_valid_actions(board)]
+
+    def guess(child):
+        # order by the scores of earlier searches if the table knows them, else centre columns first
+        col, child_board = child
+        entry = None if table is None else table.probe(position_key(child_board))
+        return (-sign * entry.value if entry is not None else np.inf, abs(int(col) - board.shape[1] // 2))
+
+    if table is not None:
+        table.new_search()
+    children.sort(key=guess)
+    scored = []
+    for col, child_board in children:
+        bound = -sign * np.inf
+        if k is not None and len(scored) >= k:
+            bound = scored[k - 1][1]
+        window = (bound, np.inf) if maximizing else (-np.inf, bound)
+        _, score = minimax_with_alpha_beta_pruning(child_board, depth - 1, *window, opponent, rng, stats,
+                                                   table=table, cache=cache, evaluate=evaluate)
+        if k is not None and len(scored) >= k and sign * score <= sign * bound:
+            continue
+        scored.append((PlayerAction(col), score))
+        scored.sort(key=lambda action_score: -sign * action_score[1])
+    return scored if k is None else scored[:k]
+
+
+def generate_move_minimax(board: np.ndarray, player: BoardPiece, saved_state: Optional[SavedState],
+                          shared_table: Optional[Union[str, SharedTranspositionTable]] = None,
+                          cache_size: int = DEFAULT_MAX_ENTRIES, evaluator: str = HEURISTIC,
+                          deadline: Optional[float] = None) -> Tuple[PlayerAction, Optional[SavedState]]:
     # Choose a valid, non-full column randomly and return it as `action`
-    action, _ = minimax_with_alpha_beta_pruning(board, 4, -np.inf, np.inf, player)
+    # With a `deadline` (time.monotonic() value) the search is deepened iteratively until the deadline instead of
+    # searching SEARCH_DEPTH plies
+    # With a `shared_table` (a SharedTranspositionTable or the name of one, see agents.transposition) searched
+    # positions are shared with every other search attached to the table
+    # Leaf evaluations are cached in an LRU cache of `cache_size` entries (0 disables it), kept in the saved state for
+    # the rest of the game
+    # `evaluator` selects the evaluation function of the leaves from EVALUATORS: HEURISTIC (score_action, open runs) or
+    # THREATS (threat_score, odd/even threat analysis)
+    # Positions in the endgame tablebase (see agents.tablebase) are not searched, its best move is played
+    if not isinstance(saved_state, MinimaxSavedState):
+        saved_state = MinimaxSavedState(rng=None if saved_state is None else saved_state.rng)
+    entry = consult(board, player, "minimax")
+    if entry is not None:
+        return entry.move, saved_state
+    evaluate = EVALUATORS[evaluator]
+    if cache_size > 0:
+        if evaluate not in saved_state.eval_caches:
+            saved_state.eval_caches[evaluate] = EvaluationCache(evaluate, cache_size)
+        saved_state.eval_cache = saved_state.eval_caches[evaluate]
+    else:
+        saved_state.eval_cache = None
+    cache = saved_state.eval_cache
+    table = attach(shared_table) if isinstance(shared_table, str) else shared_table
+    if table is not None:
+        table.new_search()
+    metrics = get_metrics()
+    stats = dict(nodes=0, leaves=0) if metrics.enabled else None
+    t0 = time.perf_counter()
+    if deadline is None:
+        depth = SEARCH_DEPTH
+        action, _ = minimax_with_alpha_beta_pruning(board, depth, -np.inf, np.inf, player, saved_state.rng, stats,
+                                                    table=table, cache=cache, evaluate=evaluate)
+    else:
+        action, depth = iterative_deepening(board, player, deadline, saved_state.rng, stats, table, cache,
+                                            evaluate=evaluate)
+    if not metrics.enabled:
+        return action, saved_state
+
+    seconds = time.perf_counter() - t0
+    metrics.increment("searches", agent="minimax")
+    metrics.increment("nodes", stats['nodes'], agent="minimax")
+    metrics.increment("leaf_evaluations", stats['leaves'], agent="minimax")
+    metrics.set_gauge("nodes_per_second", stats['nodes'] / seconds if seconds > 0 else 0.0, agent="minimax")
+    metrics.set_gauge("search_depth", depth, agent="minimax")
+    metrics.observe("search_seconds", seconds, agent="minimax")
+    if cache is not None:
+        cache_stats = cache.statistics()
+        metrics.set_gauge("eval_cache_entries", cache_stats['entries'], agent="minimax")
+        metrics.set_gauge("eval_cache_hit_rate", cache_stats['hit_rate'], agent="minimax")
+        metrics.set_gauge("eval_cache_evictions", cache_stats['evictions'], agent="minimax")
+    metrics.event("search", agent="minimax", depth=depth, seconds=seconds, **stats)
     return action, saved_state
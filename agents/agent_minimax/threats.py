@@ -0,0 +1,123 @@
+"""
+Threat-based evaluation (odd/even threat analysis) for the minimax agent.
+
+A threat of a player is an empty square that completes four of the player's pieces. The evaluation looks at the threat
+squares of both players the way Allis' analysis of Connect-4 does:
+    - the row parity of a threat decides who profits from zugzwang at the end of the game: the first player (PLAYER1)
+      wants threats on odd rows (1st, 3rd and 5th from the bottom), the second player threats on even rows,
+    - a threat above a threat of the opponent in the same column is worth little, the lower threat decides the column,
+    - two threats of a player on top of each other win the column,
+    - a threat on the lowest empty square of its column can be played at once.
+Open lines of two and three pieces are counted as well, so positions without threats are still told apart.
+
+Everything is computed with the 69 possible lines of four as a (lines x squares) matrix, squares in board.ravel() order
+(row * 7 + col, row 0 at the bottom).
+"""
+import itertools
+
+import numpy as np
+
+from agents.common import BoardPiece, CONNECT_N, NO_PLAYER, PLAYER1, get_opponent
+
+ROWS, COLUMNS = 6, 7
+WIN_SCORE = 100000  # as score_action
+IMMEDIATE_WIN_SCORE = 50000
+ZUGZWANG_SCORE = 2000
+STACKED_THREAT_SCORE = 1000
+GOOD_THREAT_SCORE = 300  # threat on a row of the player's parity
+THREAT_SCORE = 100
+THREE_SCORE = 20
+TWO_SCORE = 5
+
+
+def line_matrix(rows: int = ROWS, cols: int = COLUMNS) -> np.ndarray:
+    """
+    (number of lines of CONNECT_N squares, rows * cols) matrix, 1 where a square belongs to a line
+    """
+    lines = []
+    for row, col in itertools.product(range(rows), range(cols)):
+        for d_row, d_col in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            end_row, end_col = row + (CONNECT_N - 1) * d_row, col + (CONNECT_N - 1) * d_col
+            if 0 <= end_row < rows and 0 <= end_col < cols:
+                line = np.zeros(rows * cols, dtype=np.int8)
+                line[[(row + i * d_row) * cols + col + i * d_col for i in range(CONNECT_N)]] = 1
+                lines.append(line)
+    return np.array(lines)
+
+
+LINES = line_matrix()
+LINES_BOOL = LINES.astype(bool)
+ODD_ROWS = np.repeat((np.arange(ROWS) % 2 == 0)[:, None], COLUMNS, axis=1)  # odd rows counted from 1 at the bottom
+
+
+def threat_squares(empty: np.ndarray, counts: np.ndarray, open_lines: np.ndarray) -> np.ndarray:
+    """
+    Boolean (rows, cols) array of the threats of a player, given its piece `counts` per line and its `open_lines`
+    (lines without pieces of the opponent)
+    """
+    threes = LINES_BOOL[open_lines & (counts == CONNECT_N - 1)]
+    return (threes.any(axis=0) & empty).reshape(ROWS, COLUMNS)
+
+
+def lowest_rows(threats: np.ndarray) -> np.ndarray:
+    """
+    Row of the lowest threat of every column, ROWS for columns without a threat
+    """
+    return np.where(threats.any(axis=0), threats.argmax(axis=0), ROWS)
+
+
+def threat_score(board: np.ndarray, player: BoardPiece) -> int:
+    """
+    Threat-based heuristic score of `board` for `player`, who is to move. Drop-in alternative to score_action: wins
+    score WIN_SCORE, a threat `player` can play at once or two of the opponent that cannot both be blocked score
+    +-IMMEDIATE_WIN_SCORE, else the unblocked threats are scored by row parity (plus a bonus for the player whose
+    threats win the zugzwang and for stacked threats), followed by the open lines of three and two
+    :param board:               np.ndarray
+                                Current board represented by array for game state
+    :param player:              BoardPiece
+                                Player to move, the score is from its point of view
+    :return:                    int
+                                returns the heuristic score of current board
+    """
+    opponent = get_opponent(player)
+    squares = board.ravel()
+    own_counts = LINES @ (squares == player).view(np.int8)
+    opp_counts = LINES @ (squares == opponent).view(np.int8)
+    if (opp_counts == CONNECT_N).any():
+        return -WIN_SCORE
+    if (own_counts == CONNECT_N).any():
+        return WIN_SCORE
+    empty = squares == NO_PLAYER
+    own_open, opp_open = opp_counts == 0, own_counts == 0
+    own_threats = threat_squares(empty, own_counts, own_open)
+    opp_threats = threat_squares(empty, opp_counts, opp_open)
+
+    heights = ROWS - np.count_nonzero(empty.reshape(ROWS, COLUMNS), axis=0)
+    rows = np.arange(ROWS)[:, None]
+    playable = rows == heights[None, :]
+    own_immediate = np.count_nonzero(own_threats & playable)
+    opp_immediate = np.count_nonzero(opp_threats & playable)
+    if own_immediate:
+        return IMMEDIATE_WIN_SCORE
+    if opp_immediate >= 2:
+        return -IMMEDIATE_WIN_SCORE
+
+    # threats above a lower threat of the opponent in the same column are blocked by it
+    own_useful = own_threats & (rows < lowest_rows(opp_threats)[None, :])
+    opp_useful = opp_threats & (rows < lowest_rows(own_threats)[None, :])
+    own_parity = ODD_ROWS if player == PLAYER1 else ~ODD_ROWS
+    own_good = np.count_nonzero(own_useful & own_parity)
+    opp_good = np.count_nonzero(opp_useful & ~own_parity)
+    score = GOOD_THREAT_SCORE * (own_good - opp_good) \
+        + THREAT_SCORE * (np.count_nonzero(own_useful) - own_good - np.count_nonzero(opp_useful) + opp_good) \
+        + STACKED_THREAT_SCORE * (np.count_nonzero(own_useful[1:] & own_useful[:-1])
+                                  - np.count_nonzero(opp_useful[1:] & opp_useful[:-1]))
+    if own_good and not opp_good:
+        score += ZUGZWANG_SCORE
+    elif opp_good and not own_good:
+        score -= ZUGZWANG_SCORE
+    score += THREE_SCORE * (np.count_nonzero(own_open & (own_counts == 3))
+                            - np.count_nonzero(opp_open & (opp_counts == 3)))
+    score += TWO_SCORE * (np.count_nonzero(own_open & (own_counts == 2))
+                          - np.count_nonzero(opp_open & (opp_counts == 2)))
+    return int(score)
@@ -1 +1,2 @@
-from .random import generate_move_random as generate_move
\ No newline at end of file
+from .random import generate_move_random as generate_move
+from agents.common import init_saved_state as init
@@ -8,10 +8,12 @@ def generate_move_random(
     board: np.ndarray, player: BoardPiece, saved_state: Optional[SavedState]
 ) -> Tuple[PlayerAction, Optional[SavedState]]:
     # Choose a valid, non-full column randomly and return it as `action`
+    if saved_state is None:
+        saved_state = SavedState()
     action = PlayerAction(-1)
     rows, columns = board.shape
     is_valid = False
     while not is_valid:
-        action = np.random.choice(columns, 1)[0]
+        action = PlayerAction(saved_state.rng.randint(columns))
         is_valid = is_action_valid(board, action)
     return action, saved_state
\ No newline at end of file
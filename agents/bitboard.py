@@ -0,0 +1,57 @@
+"""
+Integer bitboards of the standard 6x7 board, shared by the exact solvers (agents.tablebase, benchmarks.strength) and
+the bitboard backend of benchmarks.perft.
+
+A position is a pair of Python ints: the stones of one player (usually the player to move) and the occupied squares.
+Square (row, col) is bit col * COLUMN_BITS + row, each column has a spare bit above its top square, so that a stone
+can be dropped into column col with `mask | (mask + BOTTOMS[col])` and lines never wrap from one column to the next.
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+
+from agents.common import BoardPiece, NO_PLAYER, PLAYER1, PLAYER2, initialize_game_state
+
+ROWS, COLUMNS = 6, 7
+COLUMN_BITS = ROWS + 1
+BOTTOMS = [1 << (col * COLUMN_BITS) for col in range(COLUMNS)]
+TOPS = [1 << (col * COLUMN_BITS + ROWS - 1) for col in range(COLUMNS)]
+FULL = sum(((1 << ROWS) - 1) << (col * COLUMN_BITS) for col in range(COLUMNS))
+
+
+def connects_four(stones: int) -> bool:
+    for shift in (1, COLUMN_BITS, COLUMN_BITS - 1, COLUMN_BITS + 1):  # vertical, horizontal, both diagonals
+        pairs = stones & (stones >> shift)
+        if pairs & (pairs >> 2 * shift):
+            return True
+    return False
+
+
+def to_bitboards(board: np.ndarray, player: Optional[BoardPiece] = None) -> Tuple[int, int]:
+    """
+    (stones of `player`, occupied squares) of `board`. Without a player the stones are those of the player to move,
+    PLAYER1 if the number of stones is even
+    """
+    if player is None:
+        player = PLAYER1 if np.count_nonzero(board) % 2 == 0 else PLAYER2
+    current = mask = 0
+    for row, col in zip(*np.nonzero(board != NO_PLAYER)):
+        bit = 1 << (int(col) * COLUMN_BITS + int(row))
+        mask |= bit
+        if board[row, col] == player:
+            current |= bit
+    return current, mask
+
+
+def to_board(current: int, mask: int) -> np.ndarray:
+    """
+    Board of the bitboards, `current` being the stones of the player to move
+    """
+    board = initialize_game_state()
+    player1 = current if bin(mask).count("1") % 2 == 0 else current ^ mask
+    for row in range(ROWS):
+        for col in range(COLUMNS):
+            bit = 1 << (col * COLUMN_BITS + row)
+            if mask & bit:
+                board[row, col] = PLAYER1 if player1 & bit else PLAYER2
+    return board
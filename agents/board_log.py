@@ -0,0 +1,145 @@
+"""
+Reader of game logs made of pretty_print_board text dumps (e.g. the output of main.play_game with verbose=True).
+
+A board is found by its column footer line ("|0 1 2 3 4 5 6 |"): it is the block of lines from the top border above
+the footer, so the lines between boards (prompts, move times) are skipped. Many boards are decoded at once on the
+bytes of the log: every cell is read at its fixed offset from the start of its line and mapped to a BoardPiece with a
+lookup table, so whitespace after a line (trailing spaces, "\r") is ignored. A board whose borders, bars, separators
+or pieces are not where pretty_print_board puts them raises ValueError with its byte offset. The board shape is taken
+from the first board of a log (rows between the borders, columns from the length of its first row).
+
+Files are read in chunks, the bytes of a board cut by the end of a chunk are carried over to the next chunk. An
+incomplete board at the end of a file is dropped.
+
+    python -m agents.board_log games.log [more.log ...] --output boards.npy [--chunk-size 4194304]
+"""
+import argparse
+import os
+import time
+from typing import BinaryIO, Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+from agents.common import BoardPiece, NO_PLAYER, PLAYER1, PLAYER2, NO_PLAYER_PRINT, PLAYER1_PRINT, PLAYER2_PRINT, \
+    initialize_game_state
+
+CHUNK_SIZE = 1 << 22
+MAX_BOARD_LINES = 64  # lines kept from a chunk without a complete board, enough for any board
+NEWLINE, SPACE, BAR, BORDER, FIRST_COLUMN = (ord(character) for character in "\n |=0")
+CODES = np.full(256, -1, dtype=BoardPiece)  # byte -> BoardPiece, -1 for bytes that are not a piece
+CODES[ord(NO_PLAYER_PRINT)] = NO_PLAYER
+CODES[ord(PLAYER1_PRINT)] = PLAYER1
+CODES[ord(PLAYER2_PRINT)] = PLAYER2
+
+
+def board_shape(buffer: np.ndarray, starts: np.ndarray, borders: np.ndarray, footer: int,
+                offset: int = 0) -> Tuple[int, int]:
+    """
+    (rows, columns) of the board whose footer is line `footer`
+    """
+    tops = borders[borders < footer - 1]
+    if not len(tops):
+        raise ValueError(f"board without a top border before byte {offset + int(starts[footer])}")
+    top = tops[-1]
+    first_row = bytes(buffer[starts[top + 1]:starts[top + 2] if top + 2 < len(starts) else len(buffer)])
+    return int(footer - top - 2), (len(first_row.rstrip()) - 2) // 2
+
+
+def decode_boards(data: Union[bytes, bytearray, memoryview], shape: Optional[Tuple[int, int]] = None,
+                  offset: int = 0) -> Tuple[np.ndarray, int, Optional[Tuple[int, int]]]:
+    """
+    Decodes the boards of a log (or a part of one) at once
+    :param data:    bytes
+                    Text of the log
+    :param shape:   tuple
+                    (rows, columns) of the boards, taken from the first board if None
+    :param offset:  int
+                    Position of `data` in the log, for the byte offsets of errors
+    :return:        tuple
+                    the (N, rows, columns) boards, the number of bytes of `data` no longer needed (up to the end of
+                    the footer of the last board, at most all but MAX_BOARD_LINES lines) and the shape (None if no
+                    board was found yet)
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if not len(buffer):
+        return np.empty((0,) + (shape or initialize_game_state().shape), dtype=BoardPiece), 0, shape
+    starts = np.concatenate(([0], np.flatnonzero(buffer == NEWLINE) + 1))
+    # positions past the end of the buffer read its last byte, a newline or a bar that never starts a border or footer
+    first, second = buffer.take(starts, mode="clip"), buffer.take(starts + 1, mode="clip")
+    footers = np.flatnonzero((first == BAR) & (second == FIRST_COLUMN))
+    consumed = int(starts[max(len(starts) - MAX_BOARD_LINES, 0)])
+    if not len(footers):
+        return np.empty((0,) + (shape or initialize_game_state().shape), dtype=BoardPiece), consumed, shape
+    borders = np.flatnonzero((first == BAR) & (second == BORDER))
+    if shape is None:
+        shape = board_shape(buffer, starts, borders, footers[0], offset)
+    rows, cols = shape
+    tops = footers - rows - 2
+    if tops[0] < 0:
+        raise ValueError(f"incomplete board before byte {offset + int(starts[footers[0]])}")
+
+    row_starts = starts[tops[:, None] + 1 + np.arange(rows)]
+    lines = buffer.take(row_starts[..., None] + np.arange(2 * cols + 2), mode="clip")  # (N, rows, line bytes)
+    boards = CODES[lines[..., 1:-1:2]]
+    valid = (buffer.take(starts[tops] + 1, mode="clip") == BORDER) \
+        & (buffer.take(starts[footers - 1] + 1, mode="clip") == BORDER) \
+        & ((lines[..., 0] == BAR) & (lines[..., -1] == BAR)).all(axis=1) \
+        & (lines[..., 2:-1:2] == SPACE).all(axis=(1, 2)) & (boards >= 0).all(axis=(1, 2))
+    if not valid.all():
+        bad = tops[np.argmin(valid)]
+        raise ValueError(f"malformed {rows}x{cols} board at byte {offset + int(starts[bad])}")
+    end = footers[-1] + 1
+    consumed = max(consumed, int(starts[end]) if end < len(starts) else len(buffer))
+    return np.ascontiguousarray(boards[:, ::-1]), consumed, shape
+
+
+def parse_boards(text: Union[str, bytes], shape: Optional[Tuple[int, int]] = None) -> np.ndarray:
+    """
+    The boards of the pretty_print_board dumps in `text`, as an (N, rows, columns) array
+    """
+    return decode_boards(text.encode() if isinstance(text, str) else text, shape)[0]
+
+
+def iter_boards(log: Union[str, os.PathLike, BinaryIO], chunk_size: int = CHUNK_SIZE,
+                shape: Optional[Tuple[int, int]] = None) -> Iterator[np.ndarray]:
+    """
+    Yields the boards of a log file (a path or a binary file object) chunk by chunk, as (N, rows, columns) arrays
+    """
+    stream = open(log, "rb") if isinstance(log, (str, os.PathLike)) else log
+    try:
+        carry, offset = b"", 0
+        while True:
+            chunk = stream.read(chunk_size)
+            data = carry + chunk
+            boards, consumed, shape = decode_boards(data, shape, offset)
+            if len(boards):
+                yield boards
+            if not chunk:
+                return
+            carry, offset = data[consumed:], offset + consumed
+    finally:
+        if stream is not log:
+            stream.close()
+
+
+def read_boards(log: Union[str, os.PathLike, BinaryIO], chunk_size: int = CHUNK_SIZE) -> np.ndarray:
+    """
+    All boards of a log file as one (N, rows, columns) array
+    """
+    chunks = list(iter_boards(log, chunk_size))
+    return np.concatenate(chunks) if chunks else np.empty((0,) + initialize_game_state().shape, dtype=BoardPiece)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert pretty_print_board text logs to an (N, rows, cols) array")
+    parser.add_argument("logs", nargs="+")
+    parser.add_argument("--output", default="boards.npy")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="bytes read at a time")
+    cli_args = parser.parse_args()
+    t0 = time.perf_counter()
+    cli_boards = np.concatenate([read_boards(cli_log, cli_args.chunk_size) for cli_log in cli_args.logs])
+    cli_seconds = time.perf_counter() - t0
+    np.save(cli_args.output, cli_boards)
+    cli_bytes = sum(os.path.getsize(cli_log) for cli_log in cli_args.logs)
+    print(f"{len(cli_boards)} boards from {cli_bytes} bytes in {cli_seconds:.2f} s "
+          f"({cli_bytes / max(cli_seconds, 1e-9) / 1e6:.0f} MB/s), saved to {cli_args.output}")
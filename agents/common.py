@@ -1,8 +1,9 @@
+import itertools
 from enum import Enum
-from typing import Optional
+from typing import Dict, Optional
 import numpy as np
 from typing import Callable, Tuple
-from scipy.signal.sigtools import _convolve2d
+from agents.rng import AgentRNG
 
 BoardPiece = np.int8  # The data type (dtype) of the board
 NO_PLAYER = BoardPiece(0)  # board[i, j] == NO_PLAYER where the position is empty
@@ -74,23 +75,15 @@ def string_to_board(pp_board: str) -> np.ndarray:
     """
     Takes the output of pretty_print_board and turns it back into an ndarray.
     This is quite useful for debugging, when the agent crashed and you have the last
-    board state as a string.
+    board state as a string. Logs of many boards are read with agents.board_log.
     :rtype: board
     """
-    game_rows_string = pp_board.splitlines()
-    # ignoring the boundary styles of the board
-    game_rows_string_actual = game_rows_string[1: len(game_rows_string) - 2]
-    game_rows_string_actual_reversed = game_rows_string_actual[::-1]  # reversing the string board
-    each_row_length = len(game_rows_string_actual_reversed[1]) - 2
-    board = np.empty((0, int(each_row_length / 2)), np.int8)
-    for game_row in game_rows_string_actual_reversed:
-        # removing the '|'s from start and end and taking only the player print characters
-        game_row_actual = game_row[1:each_row_length:2]
-        # replacing player print character with player numbers
-        game_row_actual = game_row_actual.replace(PLAYER1_PRINT, str(PLAYER1)).replace(PLAYER2_PRINT, str(PLAYER2)).replace(' ', str(NO_PLAYER))
-        # creating board only is board is undefined so as to generalize the size of the board
-        board = np.vstack((board, list(map(np.int8, game_row_actual))))
-    return board
+    from agents.board_log import parse_boards
+
+    boards = parse_boards(pp_board)
+    if not len(boards):
+        raise ValueError("no board found")
+    return boards[0]
 
 
 def apply_player_action(
@@ -180,13 +173,92 @@ def get_valid_actions(board: np.ndarray):
     return np.where(board[-1] == NO_PLAYER)[0]
 
 
+def is_winning_action(board: np.ndarray, action: PlayerAction, player: BoardPiece) -> bool:
+    """
+    Returns True if `player` dropping a piece in column `action` connects four. Only the lines through the
+    landing square are scanned, so this is much cheaper than applying the action and calling connected_four
+    """
+    rows, cols = board.shape
+    row = int(np.count_nonzero(board[:, action] != NO_PLAYER))
+    if row >= rows:
+        return False
+    for d_row, d_col in ((0, 1), (1, 0), (1, 1), (1, -1)):
+        count = 1
+        for sign in (1, -1):
+            r, c = row + sign * d_row, action + sign * d_col
+            while 0 <= r < rows and 0 <= c < cols and board[r, c] == player:
+                count += 1
+                r, c = r + sign * d_row, c + sign * d_col
+        if count >= CONNECT_N:
+            return True
+    return False
+
+
+def position_keys(boards: np.ndarray) -> np.ndarray:
+    """
+    Returns a unique uint64 key for each board of `boards` (shape (..., rows, cols)). Every column gets rows + 1 bits
+    holding its occupied squares plus the squares of PLAYER1, which identifies the column without carrying into the
+    next one (49 bits for a 6x7 board)
+    """
+    rows, cols = boards.shape[-2:]
+    shifts = np.arange(cols, dtype=np.uint64)[None, :] * np.uint64(rows + 1) + np.arange(rows, dtype=np.uint64)[:, None]
+    weights = np.left_shift(np.uint64(1), shifts)
+    occupied = (boards != NO_PLAYER) * weights
+    player1 = (boards == PLAYER1) * weights
+    return occupied.sum(axis=(-2, -1), dtype=np.uint64) + player1.sum(axis=(-2, -1), dtype=np.uint64)
+
+
+def _column_codes(rows: int) -> Dict[bytes, int]:
+    codes = {}
+    for height in range(rows + 1):
+        for pieces in itertools.product((PLAYER1, PLAYER2), repeat=height):
+            player1 = sum(1 << row for row, piece in enumerate(pieces) if piece == PLAYER1)
+            codes[bytes(pieces) + bytes(rows - height)] = (1 << height) - 1 + player1
+    return codes
+
+
+_COLUMN_CODES = _column_codes(6)
+
+
+def position_key(board: np.ndarray) -> int:
+    """
+    position_keys of a single 6x7 board, looked up column by column, which is several times faster. Columns that
+    cannot occur in a game (pieces floating above an empty square, other values) are not in the lookup table, such
+    boards are keyed by position_keys
+    """
+    if board.shape != (6, 7) or board.dtype != BoardPiece:
+        return int(position_keys(board))
+    columns = board.T.tobytes()
+    key = 0
+    for col in range(7):
+        code = _COLUMN_CODES.get(columns[6 * col:6 * col + 6])
+        if code is None:
+            return int(position_keys(board))
+        key |= code << (7 * col)
+    return key
+
+
 def get_opponent(current_player: BoardPiece) -> BoardPiece:
     return PLAYER2 if current_player == PLAYER1 else PLAYER1
 
 
 class SavedState:
-    def __init__(self, computational_result):
+    def __init__(self, computational_result=None, rng: Optional[AgentRNG] = None):
         self.computational_result = computational_result
+        self.rng = AgentRNG() if rng is None else rng
+
+    def close(self) -> None:
+        """
+        Called by the harness when the game is over, releases background work of the agent (e.g. pondering)
+        """
+
+
+def init_saved_state(_board: np.ndarray, _player: BoardPiece, seed: Optional[int] = None) -> SavedState:
+    """
+    Init hook of the agents: returns the SavedState the agent starts the game with, holding its own random number
+    generator. Pass a seed (e.g. functools.partial(init, seed=1)) to replay a game exactly.
+    """
+    return SavedState(rng=AgentRNG(seed))
 
 
 col_kernel = np.ones((CONNECT_N, 1), dtype=BoardPiece)
@@ -195,23 +267,78 @@ dia_l_kernel = np.diag(np.ones(CONNECT_N, dtype=BoardPiece))
 dia_r_kernel = np.array(np.diag(np.ones(CONNECT_N, dtype=BoardPiece))[::-1, :])
 
 
+_convolve2d: Optional[Callable[[np.ndarray, np.ndarray], np.ndarray]] = None
+
+
+def _load_convolve2d() -> Callable[[np.ndarray, np.ndarray], np.ndarray]:
+    """
+    The valid 2d convolution of connected_four: SciPy's private C implementation if it can be imported, a NumPy one
+    otherwise. SciPy is optional and only imported on the first call, its import costs far more than the search of a
+    move in a short-lived worker
+    """
+    try:
+        from scipy.signal._sigtools import _convolve2d as convolve2d  # SciPy >= 1.8
+    except ImportError:
+        try:
+            from scipy.signal.sigtools import _convolve2d as convolve2d
+        except ImportError:
+            convolve2d = None
+    if convolve2d is None:
+        taps: Dict[Tuple[Tuple[int, ...], bytes], list] = {}
+
+        def numpy_convolve2d(board: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+            # sum of the board slices shifted by the non-zero taps of the flipped kernel
+            key = (kernel.shape, kernel.tobytes())
+            if key not in taps:
+                flipped = kernel[::-1, ::-1]
+                taps[key] = [(int(k), int(l), int(flipped[k, l])) for k, l in zip(*np.nonzero(flipped))]
+            rows, cols = board.shape[0] - kernel.shape[0] + 1, board.shape[1] - kernel.shape[1] + 1
+            result = np.zeros((rows, cols), dtype=board.dtype)
+            for k, l, weight in taps[key]:
+                result += board[k:k + rows, l:l + cols] if weight == 1 else weight * board[k:k + rows, l:l + cols]
+            return result
+        return numpy_convolve2d
+
+    def scipy_convolve2d(board: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+        return convolve2d(board, kernel, 1, 0, 0, BoardPiece(0))
+    return scipy_convolve2d
+
+
+def convolve2d_valid(board: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    global _convolve2d
+    if _convolve2d is None:
+        _convolve2d = _load_convolve2d()
+    return _convolve2d(board, kernel)
+
+
 def connected_four(
     board: np.ndarray, player: BoardPiece, _last_action: Optional[PlayerAction] = None
 ) -> bool:
-    board = board.copy()
-
-    other_player = BoardPiece(player % 2 + 1)
-    board[board == other_player] = NO_PLAYER
-    board[board == player] = BoardPiece(1)
+    board = (board == player).view(BoardPiece)  # 1 where `player` has a piece, without changing (or copying) board
 
     for kernel in (col_kernel, row_kernel, dia_l_kernel, dia_r_kernel):
-        result = _convolve2d(board, kernel, 1, 0, 0, BoardPiece(0))
+        result = convolve2d_valid(board, kernel)
         if np.any(result == CONNECT_N):
             return True
     return False
 
 
+def read_only_view(board: np.ndarray, lock: bool = False) -> np.ndarray:
+    """
+    Non-writeable view of `board`, the way the harness hands the board to a GenMove: agents read it and copy it
+    (board.copy(), apply_player_action(..., copy=True)) only where they change a position. Writes to the view raise
+    ValueError. The view shows the game board, which changes once the move is played: keep a copy, not the view, to
+    remember a position. With lock=True `board` itself is made non-writeable as well, so the view cannot be made
+    writeable again either (the debug mode of the harness), until the owner sets board.flags.writeable = True.
+    """
+    if lock:
+        board.flags.writeable = False
+    view = board.view()
+    view.flags.writeable = False
+    return view
+
+
 GenMove = Callable[
-    [np.ndarray, BoardPiece, Optional[SavedState]],  # Arguments for the generate_move function
+    [np.ndarray, BoardPiece, Optional[SavedState]],  # Arguments for the generate_move function, the board is read-only
     Tuple[PlayerAction, Optional[SavedState]]  # Return type of the generate_move function
 ]
@@ -0,0 +1,181 @@
+"""
+Compact binary game records.
+
+A record file starts with an 8 byte header (magic b"C4GR", format version, board rows and columns, one reserved byte)
+followed by one fixed-size record per game (RECORD_DTYPE, 212 bytes for a 6x7 board):
+
+    n_moves     uint8               number of moves played
+    winner      int8                PLAYER1, PLAYER2 or NO_PLAYER for a draw (or an unfinished game)
+    moves       uint8[rows * cols]  played columns, PLAYER1 moves first, padded with NO_MOVE
+    move_times  float32[rows * cols] seconds taken by each move
+
+Files are append-only (GameRecordWriter) and read through a memory map (GameRecordReader), so any game or position
+of a large file is available without parsing the rest of it.
+"""
+import os
+from typing import Iterable, Optional, Sequence, Union
+
+import numpy as np
+
+from agents.common import BoardPiece, PlayerAction, PLAYER1, PLAYER2, NO_PLAYER, initialize_game_state
+
+MAGIC = b"C4GR"
+VERSION = 1
+HEADER_SIZE = 8
+NO_MOVE = 255
+ROWS, COLUMNS = initialize_game_state().shape
+
+
+def record_dtype(rows: int = ROWS, columns: int = COLUMNS) -> np.dtype:
+    max_moves = rows * columns
+    return np.dtype([
+        ("n_moves", np.uint8),
+        ("winner", np.int8),
+        ("moves", np.uint8, (max_moves,)),
+        ("move_times", np.float32, (max_moves,)),
+    ])
+
+
+RECORD_DTYPE = record_dtype()
+
+
+class GameRecordWriter(object):
+    """
+    Appends games to a record file, creating it (with its header) if it does not exist
+    """
+
+    def __init__(self, path: Union[str, os.PathLike]):
+        self.path = path
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not is_new:
+            read_header(path)
+        self.file = open(path, "ab")
+        if is_new:
+            self.file.write(MAGIC + bytes([VERSION, ROWS, COLUMNS, 0]))
+        self.record = np.zeros(1, dtype=RECORD_DTYPE)
+
+    def write(self, moves: Sequence[PlayerAction], winner: BoardPiece,
+              move_times: Optional[Sequence[float]] = None) -> None:
+        record = self.record
+        record["n_moves"] = len(moves)
+        record["winner"] = winner
+        record["moves"] = NO_MOVE
+        record["moves"][0, :len(moves)] = moves
+        record["move_times"] = 0
+        if move_times is not None:
+            record["move_times"][0, :len(move_times)] = move_times
+        self.file.write(record.tobytes())
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_header(path: Union[str, os.PathLike]) -> None:
+    with open(path, "rb") as file:
+        header = file.read(HEADER_SIZE)
+    if len(header) != HEADER_SIZE or header[:4] != MAGIC:
+        raise ValueError(f"{path} is not a game record file")
+    if header[4] != VERSION:
+        raise ValueError(f"{path} has record format version {header[4]}, expected {VERSION}")
+    if (header[5], header[6]) != (ROWS, COLUMNS):
+        raise ValueError(f"{path} holds {header[5]}x{header[6]} boards, expected {ROWS}x{COLUMNS}")
+
+
+class GameRecordReader(object):
+    """
+    Memory-mapped view of a record file. Records appended after opening are not visible, open a new reader for them.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike]):
+        read_header(path)
+        no_of_games = (os.path.getsize(path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+        if no_of_games:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(no_of_games,))
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def winners(self) -> np.ndarray:
+        return self.records["winner"]
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return self.records["n_moves"]
+
+    def moves(self, game: int) -> np.ndarray:
+        record = self.records[game]
+        return np.array(record["moves"][:record["n_moves"]])
+
+    def move_times(self, game: int) -> np.ndarray:
+        record = self.records[game]
+        return np.array(record["move_times"][:record["n_moves"]])
+
+    def position(self, game: int, ply: Optional[int] = None) -> np.ndarray:
+        """
+        Board of `game` after its first `ply` moves (after all moves if ply is None)
+        """
+        moves = self.moves(game)
+        return replay(moves if ply is None else moves[:ply])
+
+    def positions(self, game: int) -> np.ndarray:
+        """
+        All boards of `game`, shape (n_moves + 1, rows, columns), starting with the empty board
+        """
+        return replay_positions(self.moves(game))
+
+    def boards_at(self, ply: int, games: Optional[Iterable[int]] = None) -> np.ndarray:
+        """
+        Boards of many games after `ply` moves (or after their last move if they are shorter), replayed for all games
+        at once. Shape (no_of_games, rows, columns)
+        """
+        records = self.records if games is None else self.records[np.asarray(list(games), dtype=np.intp)]
+        n = len(records)
+        boards = np.zeros((n, ROWS, COLUMNS), dtype=BoardPiece)
+        heights = np.zeros((n, COLUMNS), dtype=np.intp)
+        game_index = np.arange(n)
+        lengths = records["n_moves"]
+        for index in range(ply):
+            active = game_index[lengths > index]
+            if len(active) == 0:
+                break
+            actions = records["moves"][active, index].astype(np.intp)
+            boards[active, heights[active, actions], actions] = PLAYER1 if index % 2 == 0 else PLAYER2
+            heights[active, actions] += 1
+        return boards
+
+
+def replay(moves: Sequence[PlayerAction]) -> np.ndarray:
+    """
+    Board after playing `moves` from the empty board, PLAYER1 moving first
+    """
+    board = initialize_game_state()
+    heights = [0] * COLUMNS
+    for ply, action in enumerate(moves):
+        board[heights[action], action] = PLAYER1 if ply % 2 == 0 else PLAYER2
+        heights[action] += 1
+    return board
+
+
+def replay_positions(moves: Sequence[PlayerAction]) -> np.ndarray:
+    """
+    All boards reached by playing `moves` from the empty board, shape (len(moves) + 1, rows, columns)
+    """
+    boards = np.zeros((len(moves) + 1, ROWS, COLUMNS), dtype=BoardPiece)
+    heights = [0] * COLUMNS
+    for ply, action in enumerate(moves):
+        boards[ply + 1] = boards[ply]
+        boards[ply + 1, heights[action], action] = PLAYER1 if ply % 2 == 0 else PLAYER2
+        heights[action] += 1
+    return boards
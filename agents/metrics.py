@@ -0,0 +1,242 @@
+"""
+Metrics reported by the agents and the game harness: counters, gauges, histograms and per-move events.
+
+Agents report into the process-wide registry returned by get_metrics(). It is a disabled registry by default, whose
+methods return immediately; code that has to do extra work to compute a metric (e.g. walk the search tree to count
+its nodes) checks `metrics.enabled` first, so metrics cost next to nothing unless a harness installs an enabled
+registry with set_metrics(Metrics(sinks)).
+
+Sinks receive every event (emit) and the aggregated snapshot (write) when the registry is flushed:
+    InMemorySink            keeps events and the last snapshot, e.g. for tests and notebooks
+    JsonLinesSink           appends one JSON object per event (and per snapshot) to a file
+    PrometheusTextFileSink  rewrites a Prometheus text exposition file, e.g. for the node exporter textfile collector
+"""
+import json
+import math
+import os
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def metric_key(name: str, labels: Dict[str, object]) -> MetricKey:
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class Histogram(object):
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one counts values above the largest bucket
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket containing the q-quantile
+        """
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return math.inf
+
+
+class Snapshot(object):
+    def __init__(self, counters: Dict[MetricKey, float], gauges: Dict[MetricKey, float],
+                 histograms: Dict[MetricKey, Histogram]):
+        self.timestamp = time.time()
+        self.counters = counters
+        self.gauges = gauges
+        self.histograms = histograms
+
+
+class Sink(object):
+    def emit(self, event: Dict) -> None:
+        pass
+
+    def write(self, snapshot: Snapshot) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class InMemorySink(Sink):
+    def __init__(self):
+        self.events: List[Dict] = []
+        self.snapshot: Optional[Snapshot] = None
+
+    def emit(self, event: Dict) -> None:
+        self.events.append(event)
+
+    def write(self, snapshot: Snapshot) -> None:
+        self.snapshot = snapshot
+
+
+class JsonLinesSink(Sink):
+    def __init__(self, path: str):
+        self.file = open(path, "a")
+
+    def emit(self, event: Dict) -> None:
+        self.file.write(json.dumps(event) + "\n")
+
+    def write(self, snapshot: Snapshot) -> None:
+        def labelled(key: MetricKey) -> str:
+            name, labels = key
+            return name + "".join(f",{label}={value}" for label, value in labels)
+
+        self.file.write(json.dumps(dict(
+            event="snapshot",
+            time=snapshot.timestamp,
+            counters={labelled(key): value for key, value in snapshot.counters.items()},
+            gauges={labelled(key): value for key, value in snapshot.gauges.items()},
+            histograms={labelled(key): dict(count=h.count, sum=h.sum, buckets=list(h.buckets), counts=h.counts)
+                        for key, h in snapshot.histograms.items()},
+        )) + "\n")
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class PrometheusTextFileSink(Sink):
+    def __init__(self, path: str, prefix: str = "connect4_"):
+        self.path = path
+        self.prefix = prefix
+
+    def write(self, snapshot: Snapshot) -> None:
+        def format_labels(labels: Tuple[Tuple[str, str], ...], *extra: Tuple[str, str]) -> str:
+            labels = labels + extra
+            if not labels:
+                return ""
+            return "{" + ",".join(f'{label}="{value}"' for label, value in labels) + "}"
+
+        lines = []
+        for kind, metrics in (("counter", snapshot.counters), ("gauge", snapshot.gauges)):
+            for name in sorted({name for name, _ in metrics}):
+                lines.append(f"# TYPE {self.prefix}{name} {kind}")
+                for (metric_name, labels), value in metrics.items():
+                    if metric_name == name:
+                        lines.append(f"{self.prefix}{name}{format_labels(labels)} {value}")
+        for name in sorted({name for name, _ in snapshot.histograms}):
+            lines.append(f"# TYPE {self.prefix}{name} histogram")
+            for (metric_name, labels), histogram in snapshot.histograms.items():
+                if metric_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (math.inf,), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == math.inf else repr(bound)
+                    lines.append(f"{self.prefix}{name}_bucket{format_labels(labels, ('le', le))} {cumulative}")
+                lines.append(f"{self.prefix}{name}_sum{format_labels(labels)} {histogram.sum}")
+                lines.append(f"{self.prefix}{name}_count{format_labels(labels)} {histogram.count}")
+        # written next to the target and renamed, so a scraper never reads a partial file
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.path)
+
+
+class Metrics(object):
+    enabled = True
+
+    def __init__(self, sinks: Sequence[Sink] = ()):
+        self.sinks = list(sinks)
+        self.counters: Dict[MetricKey, float] = {}
+        self.gauges: Dict[MetricKey, float] = {}
+        self.histograms: Dict[MetricKey, Histogram] = {}
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        key = metric_key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        self.gauges[metric_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = LATENCY_BUCKETS, **labels) -> None:
+        key = metric_key(name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    def event(self, name: str, **fields) -> None:
+        """
+        Passes a structured record (e.g. the statistics of one search) to the sinks
+        """
+        event = dict(event=name, time=time.time(), **fields)
+        for sink in self.sinks:
+            sink.emit(event)
+
+    def snapshot(self) -> Snapshot:
+        return Snapshot(dict(self.counters), dict(self.gauges),
+                        {key: _copy_histogram(histogram) for key, histogram in self.histograms.items()})
+
+    def flush(self) -> None:
+        snapshot = self.snapshot()
+        for sink in self.sinks:
+            sink.write(snapshot)
+
+    def close(self) -> None:
+        self.flush()
+        for sink in self.sinks:
+            sink.close()
+
+
+class NullMetrics(Metrics):
+    """
+    Disabled registry, every call returns immediately
+    """
+    enabled = False
+
+    def __init__(self):
+        super().__init__()
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        pass
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        pass
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = LATENCY_BUCKETS, **labels) -> None:
+        pass
+
+    def event(self, name: str, **fields) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+
+def _copy_histogram(histogram: Histogram) -> Histogram:
+    copy = Histogram(histogram.buckets)
+    copy.counts = list(histogram.counts)
+    copy.sum, copy.count = histogram.sum, histogram.count
+    return copy
+
+
+_metrics: Metrics = NullMetrics()
+
+
+def get_metrics() -> Metrics:
+    return _metrics
+
+
+def set_metrics(metrics: Optional[Metrics]) -> Metrics:
+    """
+    Installs the process-wide registry (a disabled one for None) and returns the previous one
+    """
+    global _metrics
+    previous, _metrics = _metrics, NullMetrics() if metrics is None else metrics
+    return previous
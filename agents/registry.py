@@ -0,0 +1,50 @@
+"""
+Registry of the agents by name, resolved on first use.
+
+Registering an agent only records the module it lives in, the module (and everything it imports) is imported the first
+time the agent is loaded, so a process only pays the import cost of the agents it plays. Names that are not registered
+are taken as the name of a package in `agents` (e.g. agent_mcts).
+
+    from agents.registry import load_agent
+    generate_move, init = load_agent("agent_mcts")
+"""
+import importlib
+from typing import Callable, Dict, List, NamedTuple
+
+from agents.common import GenMove
+
+AGENTS: Dict[str, str] = {
+    "agent_mcts": "agents.agent_mcts",
+    "agent_minimax": "agents.agent_minimax",
+    "agent_random": "agents.agent_random",
+}
+_loaded: Dict[str, "Agent"] = {}
+
+
+class Agent(NamedTuple):
+    generate_move: GenMove
+    init: Callable  # init hook, a no-op if the agent has none
+
+
+def register(name: str, module: str) -> None:
+    """
+    Registers the agent `name` as the `generate_move` (and optional `init`) of `module`, which is not imported yet
+    """
+    AGENTS[name] = module
+    _loaded.pop(name, None)
+
+
+def load_agent(name: str) -> Agent:
+    """
+    Returns the generate_move and init hook of the agent `name`, importing its module on the first call
+    """
+    agent = _loaded.get(name)
+    if agent is None:
+        module = importlib.import_module(AGENTS.get(name, f"agents.{name}"))
+        agent = Agent(module.generate_move, getattr(module, "init", lambda board, player, seed=None: None))
+        _loaded[name] = agent
+    return agent
+
+
+def agent_names() -> List[str]:
+    return sorted(AGENTS)
@@ -0,0 +1,59 @@
+from typing import Optional, Sequence
+
+import numpy as np
+
+BLOCK_SIZE = 4096  # number of uniform samples drawn from the generator at once
+
+
+class AgentRNG(object):
+    """
+    Random number service of one agent. It owns a np.random.Generator, so that an agent seeded through its init hook
+    replays identically, and prefetches uniform samples in blocks, as drawing single values from NumPy (e.g. calling
+    np.random.choice on a 7 element array for every rollout ply) mostly costs call overhead.
+    """
+
+    def __init__(self, seed: Optional[int] = None, block_size: int = BLOCK_SIZE):
+        self.seed = seed
+        self.generator = np.random.default_rng(seed)
+        self.block_size = block_size
+        self._buffer = []
+        self._index = 0
+
+    def random(self) -> float:
+        """
+        Returns a uniform sample from [0, 1)
+        """
+        if self._index == len(self._buffer):
+            self._buffer = self.generator.random(self.block_size).tolist()
+            self._index = 0
+        value = self._buffer[self._index]
+        self._index += 1
+        return value
+
+    def randint(self, high: int) -> int:
+        """
+        Returns a uniform integer from [0, high)
+        """
+        return int(self.random() * high)
+
+    def choice(self, options: Sequence):
+        """
+        Returns a uniformly chosen element of `options`
+        """
+        return options[int(self.random() * len(options))]
+
+    def shuffle(self, array: np.ndarray) -> None:
+        """
+        Shuffles `array` in place
+        """
+        self.generator.shuffle(array)
+
+
+_global_rng = AgentRNG()
+
+
+def global_rng() -> AgentRNG:
+    """
+    The process wide fallback used when a function is called without the RNG of an agent
+    """
+    return _global_rng
@@ -0,0 +1,291 @@
+"""
+Endgame tablebase: exact results of late-game positions, generated offline and probed through a memory map.
+
+A tablebase file starts with a 16 byte header (magic b"C4TB", format version, the maximum number of empty cells of
+its positions, two reserved bytes, the number of slots as uint64) followed by a hash table of uint64 slots (linear
+probing from the Fibonacci hash of the key, at most half full, 0 marks an empty slot):
+
+    bits  0-48  position key (agents.common.position_key)
+    bits 49-50  result for the player to move: LOSS, DRAW or WIN
+    bits 51-56  distance: moves until the game ends with perfect play (the winner wins as fast as possible, the loser
+                loses as slowly as possible)
+    bits 57-59  best move
+
+Enumerating every position with at most K empty cells is out of reach (the rest of the board is arbitrary), so the
+generator solves the complete game tree below a set of seed positions with K empty cells, taken from seeded random
+games or from a game record file (agents.game_record) of real games, and stores every position of these trees. The
+positions are solved with integer bitboards (agents.bitboard) and a memoised negamax over all moves.
+
+Both agents consult the process-wide tablebase of get_tablebase() before searching and play its best move on a hit.
+It is loaded from the file named by the environment variable CONNECT4_TABLEBASE, if set, or installed with
+set_tablebase.
+
+    python -m agents.tablebase --empty 8 --games 2000 --output endgame.c4tb
+    python -m agents.tablebase --empty 10 --records tournament/games.c4gr --output endgame.c4tb
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+from agents.bitboard import ROWS, COLUMNS, BOTTOMS, TOPS, FULL, connects_four, to_bitboards, to_board
+from agents.common import BoardPiece, PlayerAction, PLAYER1, position_key
+from agents.metrics import get_metrics
+from agents.rng import AgentRNG
+
+MAGIC = b"C4TB"
+VERSION = 1
+HEADER = struct.Struct("<4sBBxxQ")
+ENVIRONMENT_VARIABLE = "CONNECT4_TABLEBASE"
+
+LOSS, DRAW, WIN = 0, 1, 2
+KEY_BITS = 49
+KEY_MASK = (1 << KEY_BITS) - 1
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+MASK64 = (1 << 64) - 1
+
+
+class TablebaseEntry(NamedTuple):
+    result: int
+    distance: int
+    move: PlayerAction
+
+
+def encode(key: int, result: int, distance: int, move: int) -> int:
+    return key | result << KEY_BITS | distance << (KEY_BITS + 2) | move << (KEY_BITS + 8)
+
+
+def decode(slot: int) -> TablebaseEntry:
+    return TablebaseEntry((slot >> KEY_BITS) & 0x3, (slot >> (KEY_BITS + 2)) & 0x3F,
+                          PlayerAction((slot >> (KEY_BITS + 8)) & 0x7))
+
+
+def slot_index(key: int, shift: int) -> int:
+    return ((key * HASH_MULTIPLIER) & MASK64) >> shift
+
+
+class Solver(object):
+    """
+    Solves positions given as bitboards (stones of the player to move, occupied squares) and remembers the result of
+    every position of the solved trees, keyed by position key
+    """
+
+    def __init__(self):
+        self.results: Dict[int, Tuple[int, int, int]] = {}
+
+    @staticmethod
+    def key(current: int, mask: int) -> int:
+        player1_to_move = bin(mask).count("1") % 2 == 0
+        return mask + (current if player1_to_move else current ^ mask)
+
+    def solve(self, current: int, mask: int) -> Tuple[int, int, int]:
+        """
+        (result, distance, best move) of the position, which must not be finished
+        """
+        key = self.key(current, mask)
+        known = self.results.get(key)
+        if known is not None:
+            return known
+        best, best_rank = None, None
+        for col in (3, 2, 4, 1, 5, 0, 6):
+            if mask & TOPS[col]:
+                continue
+            child_mask = mask | (mask + BOTTOMS[col])
+            mover = current ^ mask ^ child_mask
+            if connects_four(mover):
+                result, distance = WIN, 1
+            elif child_mask == FULL:
+                result, distance = DRAW, 1
+            else:
+                child_result, child_distance, _ = self.solve(mover ^ child_mask, child_mask)
+                result, distance = 2 - child_result, child_distance + 1
+            rank = (result, -distance if result == WIN else distance)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = (result, distance, col), rank
+        self.results[key] = best
+        return best
+
+
+def random_seeds(no_of_games: int, max_empty: int, seed: int = 0) -> Iterable[Tuple[int, int]]:
+    """
+    Positions (bitboards) with `max_empty` empty cells reached by random games that are still going on by then
+    """
+    rng = AgentRNG(seed)
+    for _ in range(no_of_games):
+        current, mask = 0, 0
+        for _ in range(ROWS * COLUMNS - max_empty):
+            free = [col for col in range(COLUMNS) if not mask & TOPS[col]]
+            col = free[rng.randint(len(free))]
+            child_mask = mask | (mask + BOTTOMS[col])
+            mover = current ^ mask ^ child_mask
+            if connects_four(mover):
+                break
+            current, mask = mover ^ child_mask, child_mask
+        else:
+            yield current, mask
+
+
+def record_seeds(path: str, max_empty: int) -> Iterable[Tuple[int, int]]:
+    """
+    The positions with `max_empty` empty cells of the games of a game record file
+    """
+    from agents.game_record import GameRecordReader
+
+    reader = GameRecordReader(path)
+    ply = ROWS * COLUMNS - max_empty
+    for game in np.flatnonzero(reader.lengths > ply):
+        yield to_bitboards(reader.position(int(game), ply))
+
+
+def generate(output: str, max_empty: int, seeds: Iterable[Tuple[int, int]]) -> Dict[str, float]:
+    """
+    Solves the trees below the seed positions (bitboards) and writes every solved position to `output`
+    """
+    solver = Solver()
+    no_of_seeds = 0
+    for current, mask in seeds:
+        solver.solve(current, mask)
+        no_of_seeds += 1
+    write(output, max_empty, solver.results)
+    return dict(seeds=no_of_seeds, positions=len(solver.results))
+
+
+def write(output: str, max_empty: int, results: Dict[int, Tuple[int, int, int]]) -> None:
+    n_slots = 1 << max(1, (2 * len(results)).bit_length())
+    shift = 64 - (n_slots.bit_length() - 1)
+    slots = np.zeros(n_slots, dtype="<u8")
+    for key, (result, distance, move) in results.items():
+        index = slot_index(key, shift)
+        while slots[index]:
+            index = (index + 1) & (n_slots - 1)
+        slots[index] = encode(key, result, distance, move)
+    with open(output + ".tmp", "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, max_empty, n_slots))
+        file.write(slots.tobytes())
+    os.replace(output + ".tmp", output)
+
+
+class Tablebase(object):
+    """
+    Read-only, memory-mapped tablebase file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.max_empty, self.n_slots = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError(f"{path} is not a tablebase file of version {VERSION}")
+        self.slots = memoryview(self.map)[HEADER.size:].cast("Q")
+        self.shift = 64 - (self.n_slots.bit_length() - 1)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return sum(1 for slot in self.slots if slot)
+
+    def probe_key(self, key: int) -> Optional[TablebaseEntry]:
+        slots, last = self.slots, self.n_slots - 1
+        index = slot_index(key, self.shift)
+        while True:
+            slot = slots[index]
+            if slot == 0:
+                return None
+            if slot & KEY_MASK == key:
+                return decode(slot)
+            index = (index + 1) & last
+
+    def probe(self, board: np.ndarray, player: Optional[BoardPiece] = None) -> Optional[TablebaseEntry]:
+        """
+        Result, distance and best move of `board` for the player to move, None if the position is not in the
+        tablebase or `player` is not the player to move
+        """
+        pieces = np.count_nonzero(board)
+        if board.size - pieces > self.max_empty or (player is not None and (player == PLAYER1) != (pieces % 2 == 0)):
+            return None
+        entry = self.probe_key(position_key(board))
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def close(self) -> None:
+        self.slots.release()
+        self.map.close()
+
+
+_tablebase: Optional[Tablebase] = None
+_loaded_from_environment = False
+
+
+def get_tablebase() -> Optional[Tablebase]:
+    """
+    The tablebase of this process: the one installed with set_tablebase, else the file named by CONNECT4_TABLEBASE
+    """
+    global _tablebase, _loaded_from_environment
+    if _tablebase is None and not _loaded_from_environment:
+        _loaded_from_environment = True
+        path = os.environ.get(ENVIRONMENT_VARIABLE)
+        if path:
+            _tablebase = Tablebase(path)
+    return _tablebase
+
+
+def set_tablebase(tablebase: Optional[Union[Tablebase, str]]) -> Optional[Tablebase]:
+    """
+    Installs the tablebase (or the tablebase file) of this process, None disables it. Returns the previous one
+    """
+    global _tablebase, _loaded_from_environment
+    previous = _tablebase
+    _tablebase = Tablebase(tablebase) if isinstance(tablebase, str) else tablebase
+    _loaded_from_environment = True
+    return previous
+
+
+def consult(board: np.ndarray, player: BoardPiece, agent: str) -> Optional[TablebaseEntry]:
+    """
+    Probes the tablebase of this process, if any, for the move of `agent` and counts the hits in the metrics
+    """
+    tablebase = get_tablebase()
+    if tablebase is None:
+        return None
+    entry = tablebase.probe(board, player)
+    if entry is not None:
+        metrics = get_metrics()
+        if metrics.enabled:
+            metrics.increment("tablebase_hits", agent=agent)
+    return entry
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate an endgame tablebase")
+    parser.add_argument("--empty", type=int, default=8, help="empty cells of the seed positions (at most 12 or so)")
+    parser.add_argument("--games", type=int, default=1000, help="random games the seed positions are taken from")
+    parser.add_argument("--records", default=None, help="take the seed positions from this game record file instead")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="endgame.c4tb")
+    cli_args = parser.parse_args()
+    if cli_args.empty > 14:
+        sys.exit("positions with more than 14 empty cells have too large game trees")
+    cli_seeds = list(record_seeds(cli_args.records, cli_args.empty) if cli_args.records else
+                     random_seeds(cli_args.games, cli_args.empty, cli_args.seed))
+    t0 = time.perf_counter()
+    cli_summary = generate(cli_args.output, cli_args.empty, cli_seeds)
+    cli_seconds = time.perf_counter() - t0
+    cli_tablebase = Tablebase(cli_args.output)
+    cli_boards = [to_board(*cli_seed) for cli_seed in cli_seeds[:1000]]
+    t0 = time.perf_counter()
+    for cli_board in cli_boards:
+        cli_tablebase.probe(cli_board)
+    cli_probe = (time.perf_counter() - t0) / max(len(cli_boards), 1)
+    print(f"{cli_summary['positions']} positions below {cli_summary['seeds']} seeds solved in {cli_seconds:.1f} s, "
+          f"{os.path.getsize(cli_args.output)} bytes in {cli_args.output}, {cli_probe * 1e6:.1f} us per probe")
+    cli_tablebase.close()
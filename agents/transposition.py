@@ -0,0 +1,169 @@
+"""
+Transposition table in a multiprocessing.shared_memory block, shared by all processes that attach to it.
+
+The block starts with two header words (number of slots, search generation) followed by fixed-size slots of four
+64 bit words:
+
+    check   key ^ data ^ info ^ visits, verifies the entry
+    data    value (float64 bits)
+    info    depth (8 bits) | flag (8 bits) | move + 1 (8 bits) | generation (16 bits)
+    visits  visit count (MCTS statistics, 0 for minimax entries)
+
+The table is lock-free: an entry is written word by word without synchronisation and a reader accepts it only if
+the check word matches the key it looks for, so an entry torn by concurrent writers (or a different position in the
+slot) is simply a miss. Keys are the position keys of agents.common.position_keys (callers may set the bits above
+bit 49 to keep different kinds of entries apart). Slots are grouped in buckets of two: a store overwrites the entry
+of the same key, else the empty, older-generation or shallowest slot of the bucket.
+
+    table = SharedTranspositionTable(1 << 20)   # creates the block, table.name is passed to other processes
+    other = attach(table.name)                  # in another process (tables are also picklable by name)
+    ...
+    table.close(); table.unlink()               # the creating process removes the block when all are done
+"""
+from multiprocessing import shared_memory
+from typing import Dict, NamedTuple, Optional
+
+EMPTY = 0
+EXACT = 1
+LOWER_BOUND = 2
+UPPER_BOUND = 3
+
+HEADER_WORDS = 2
+SLOT_WORDS = 4
+BUCKET_SLOTS = 2
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+MASK64 = (1 << 64) - 1
+
+
+class TableEntry(NamedTuple):
+    value: float
+    depth: int
+    flag: int
+    move: int
+    visits: int
+
+
+def bound_flag(value: float, alpha: float, beta: float) -> int:
+    """
+    Flag of a fail-soft alpha-beta result searched with the window (alpha, beta)
+    """
+    if value <= alpha:
+        return UPPER_BOUND
+    if value >= beta:
+        return LOWER_BOUND
+    return EXACT
+
+
+class SharedTranspositionTable(object):
+    """
+    Creates a table of (at least) `n_slots` slots, rounded up to a power of two, or attaches to the existing table
+    `name`
+    """
+
+    def __init__(self, n_slots: int = 1 << 20, name: Optional[str] = None):
+        if name is None:
+            n_slots = max(BUCKET_SLOTS, 1 << (n_slots - 1).bit_length())
+            self.shm = shared_memory.SharedMemory(create=True, size=8 * (HEADER_WORDS + SLOT_WORDS * n_slots))
+            self.words = self.shm.buf.cast("Q")
+            self.words[0] = n_slots
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.words = self.shm.buf.cast("Q")
+        self.values = self.shm.buf.cast("d")
+        self.n_slots = self.words[0]
+        self.shift = 64 - (self.n_slots // BUCKET_SLOTS).bit_length() + 1
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.replacements = 0
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def generation(self) -> int:
+        return self.words[1]
+
+    def new_search(self) -> None:
+        """
+        Starts a new generation, entries of older generations are replaced first
+        """
+        self.words[1] = (self.words[1] + 1) & 0xFFFF
+
+    def bucket(self, key: int) -> int:
+        """
+        Index of the first slot of the key's bucket (Fibonacci hashing, as the low bits of position keys are sparse)
+        """
+        return ((key * HASH_MULTIPLIER) & MASK64) >> self.shift << 1 if self.shift < 64 else 0
+
+    def _read(self, slot: int, key: int) -> Optional[TableEntry]:
+        words = self.words
+        base = HEADER_WORDS + SLOT_WORDS * slot
+        data, info, visits = words[base + 1], words[base + 2], words[base + 3]
+        flag = (info >> 8) & 0xFF
+        if flag == EMPTY or words[base] ^ data ^ info ^ visits != key:
+            return None
+        return TableEntry(self.values[base + 1], info & 0xFF, flag, ((info >> 16) & 0xFF) - 1, visits)
+
+    def probe(self, key: int) -> Optional[TableEntry]:
+        first = self.bucket(key)
+        for slot in range(first, first + BUCKET_SLOTS):
+            entry = self._read(slot, key)
+            if entry is not None:
+                self.hits += 1
+                return entry
+        self.misses += 1
+        return None
+
+    def store(self, key: int, value: float, depth: int, flag: int = EXACT, move: int = -1, visits: int = 0) -> None:
+        words = self.words
+        generation = self.generation
+        first = self.bucket(key)
+        target, target_rank = first, None
+        for slot in range(first, first + BUCKET_SLOTS):
+            if self._read(slot, key) is not None:
+                target, target_rank = slot, None
+                break
+            info = words[HEADER_WORDS + SLOT_WORDS * slot + 2]
+            rank = ((info >> 8) & 0xFF != EMPTY, info >> 24 == generation, info & 0xFF)
+            if target_rank is None or rank < target_rank:
+                target, target_rank = slot, rank
+        if target_rank is not None and target_rank[0]:
+            self.replacements += 1
+        base = HEADER_WORDS + SLOT_WORDS * target
+        info = min(depth, 0xFF) | flag << 8 | (move + 1) << 16 | generation << 24
+        visits = min(visits, MASK64)
+        self.values[base + 1] = value
+        words[base + 2] = info
+        words[base + 3] = visits
+        words[base] = key ^ words[base + 1] ^ info ^ visits
+        self.stores += 1
+
+    def statistics(self) -> Dict[str, int]:
+        return dict(slots=self.n_slots, hits=self.hits, misses=self.misses, stores=self.stores,
+                    replacements=self.replacements)
+
+    def close(self) -> None:
+        self.words.release()
+        self.values.release()
+        self.shm.close()
+
+    def unlink(self) -> None:
+        self.shm.unlink()
+
+    def __reduce__(self):
+        return attach, (self.name,)
+
+
+_attached: Dict[str, SharedTranspositionTable] = {}
+
+
+def attach(name: str) -> SharedTranspositionTable:
+    """
+    Attaches to the table `name`, once per process
+    """
+    table = _attached.get(name)
+    if table is None:
+        table = _attached[name] = SharedTranspositionTable(name=name)
+    return table
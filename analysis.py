@@ -0,0 +1,191 @@
+"""
+Bulk position analysis on a persistent process pool.
+
+    with BoardAnalyzer(processes=4, args=(5,)) as analyzer:
+        for index, action, score in analyzer.analyze(boards):   # boards: (N, 6, 7), results stream as they finish
+            ...
+        actions, scores = analyzer.analyze_all(boards)          # the same, collected in board order
+
+The workers are started once and keep the agent imported (and its init hook's SavedState) for all later calls. For
+every call the boards and sides to move are copied once into a multiprocessing.shared_memory block which the workers
+read in place: a task only carries the block name and an index range, never board data.
+
+The default analyser is the minimax search (args: depth, default minimax.SEARCH_DEPTH), whose score is the value
+returned by minimax_with_alpha_beta_pruning. Any other agent package is run through its generate_move and reports
+a NaN score. Terminal positions get the action -1.
+
+    python analysis.py boards.npy --depth 5 --output analysis.npy
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+from agents.common import BoardPiece, PlayerAction, PLAYER1, PLAYER2, GameState, check_end_state, \
+    get_opponent, read_only_view
+
+MINIMAX = "minimax"
+RESULT_DTYPE = np.dtype([("index", np.int64), ("action", PlayerAction), ("score", np.float64)])
+
+_worker = {}  # per worker process: analyser settings, agent, saved state and the attached shared memory block
+
+
+def side_to_move(boards: np.ndarray) -> np.ndarray:
+    """
+    PLAYER1 for boards with as many pieces of both players, PLAYER2 otherwise
+    """
+    player1 = np.count_nonzero(boards == PLAYER1, axis=(-2, -1))
+    player2 = np.count_nonzero(boards == PLAYER2, axis=(-2, -1))
+    return np.where(player1 == player2, PLAYER1, PLAYER2).astype(BoardPiece)
+
+
+def _init_worker(agent: str, args: tuple, seed: Optional[int]):
+    from agents.rng import AgentRNG
+
+    _worker.update(agent=agent, args=args, shm=None)
+    if agent == MINIMAX:
+        from agents.agent_minimax.minimax import MinimaxSavedState, score_action
+        from agents.agent_minimax.eval_cache import EvaluationCache
+
+        _worker["saved_state"] = MinimaxSavedState(rng=AgentRNG(None if seed is None else seed + os.getpid()),
+                                                   eval_cache=EvaluationCache(score_action))
+    else:
+        from agents.registry import load_agent
+
+        _worker["generate_move"], init = load_agent(agent)
+        _worker["init"] = init
+        _worker["seed"] = seed
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    shm = _worker["shm"]
+    if shm is None or shm.name != name:
+        if shm is not None:
+            shm.close()
+        shm = _worker["shm"] = shared_memory.SharedMemory(name=name)
+    return shm
+
+
+def _analyse_slice(name: str, n: int, start: int, stop: int) -> np.ndarray:
+    """
+    Analyses boards start, ..., stop - 1 of the n boards in shared memory block `name`
+    """
+    from agents.agent_minimax.minimax import minimax_with_alpha_beta_pruning, score_action, SEARCH_DEPTH
+
+    buffer = _attach(name).buf
+    boards = np.ndarray((n, 6, 7), dtype=BoardPiece, buffer=buffer)
+    players = np.ndarray((n,), dtype=BoardPiece, buffer=buffer, offset=boards.nbytes)
+    results = np.empty(stop - start, dtype=RESULT_DTYPE)
+    results["index"] = np.arange(start, stop)
+    for i, index in enumerate(range(start, stop)):
+        board, player = read_only_view(boards[index]), players[index]
+        if check_end_state(board, get_opponent(player)) != GameState.STILL_PLAYING:
+            action, score = -1, score_action(board, player) if _worker["agent"] == MINIMAX else np.nan
+        elif _worker["agent"] == MINIMAX:
+            depth = _worker["args"][0] if _worker["args"] else SEARCH_DEPTH
+            saved_state = _worker["saved_state"]
+            action, score = minimax_with_alpha_beta_pruning(board, depth, -np.inf, np.inf, player, saved_state.rng,
+                                                            cache=saved_state.eval_cache)
+        else:
+            saved_state = _worker.get(int(player))
+            if saved_state is None:
+                saved_state = _worker["init"](board, player, seed=_worker["seed"])
+            action, _worker[int(player)] = _worker["generate_move"](board, player, saved_state, *_worker["args"])
+            score = np.nan
+        results[i] = (index, action, score)
+    return results
+
+
+class BoardAnalyzer(object):
+    """
+    Persistent pool of `processes` workers (one per CPU if None) analysing boards with the minimax search or the agent
+    package agents.<agent>
+    """
+
+    def __init__(self, agent: str = MINIMAX, args: tuple = (), processes: Optional[int] = None,
+                 seed: Optional[int] = None):
+        self.executor = ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                            initargs=(agent, tuple(args), seed))
+        self.workers = processes or os.cpu_count() or 1
+
+    def analyze(self, boards: np.ndarray, players: Optional[np.ndarray] = None,
+                chunk_size: Optional[int] = None) -> Iterator[Tuple[int, PlayerAction, float]]:
+        """
+        Yields (index, action, score) for every board of `boards` (shape (N, 6, 7)) in the order the work finishes.
+        `players` are the sides to move (see side_to_move if not given), `chunk_size` the boards per task (by
+        default about four tasks per worker)
+        """
+        boards = np.asarray(boards, dtype=BoardPiece).reshape(-1, 6, 7)
+        n = len(boards)
+        if n == 0:
+            return
+        players = side_to_move(boards) if players is None else np.asarray(players, dtype=BoardPiece)
+        chunk_size = chunk_size or max(1, -(-n // (4 * self.workers)))
+        shm = shared_memory.SharedMemory(create=True, size=boards.nbytes + n)
+        try:
+            np.ndarray(boards.shape, dtype=BoardPiece, buffer=shm.buf)[:] = boards
+            np.ndarray((n,), dtype=BoardPiece, buffer=shm.buf, offset=boards.nbytes)[:] = players
+            futures = [self.executor.submit(_analyse_slice, shm.name, n, start, min(start + chunk_size, n))
+                       for start in range(0, n, chunk_size)]
+            try:
+                for future in as_completed(futures):
+                    for index, action, score in future.result():
+                        yield int(index), PlayerAction(action), float(score)
+            finally:
+                for future in futures:
+                    future.cancel()
+                for future in futures:
+                    if not future.cancelled():
+                        future.exception()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def analyze_all(self, boards: np.ndarray, players: Optional[np.ndarray] = None,
+                    chunk_size: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Actions and scores of all boards, in the order of `boards`
+        """
+        n = len(np.asarray(boards).reshape(-1, 6, 7))
+        actions = np.full(n, -1, dtype=PlayerAction)
+        scores = np.full(n, np.nan)
+        for index, action, score in self.analyze(boards, players, chunk_size):
+            actions[index], scores[index] = action, score
+        return actions, scores
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyse a batch of positions")
+    parser.add_argument("boards", help=".npy file of shape (N, 6, 7) or a self-play chunk (see selfplay.py)")
+    parser.add_argument("--agent", default=MINIMAX, help=f"{MINIMAX} (default) or a package name in agents")
+    parser.add_argument("--depth", type=int, default=None, help=f"search depth of the {MINIMAX} analyser")
+    parser.add_argument("--args", type=json.loads, default=[], help="JSON list of extra generate_move arguments")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", default="analysis.npy")
+    cli_args = parser.parse_args()
+    data = np.load(cli_args.boards, mmap_mode="r")
+    if data.dtype.names and "board" in data.dtype.names:
+        cli_boards, cli_players = data["board"], data["player"]
+    else:
+        cli_boards, cli_players = data, None
+    analyser_args = cli_args.args if cli_args.depth is None else [cli_args.depth]
+    with BoardAnalyzer(cli_args.agent, analyser_args, cli_args.processes, cli_args.seed) as cli_analyzer:
+        cli_results = np.empty(len(cli_boards), dtype=RESULT_DTYPE)
+        for cli_result in cli_analyzer.analyze(cli_boards, cli_players):
+            cli_results[cli_result[0]] = cli_result
+    np.save(cli_args.output, cli_results)
+    print(f"{len(cli_results)} positions analysed, results in {cli_args.output}")
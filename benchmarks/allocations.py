@@ -0,0 +1,329 @@
+"""
+Allocation profiling of agent searches with tracemalloc: peak memory per move and the memory the search holds at its
+peak, per search phase and per source line.
+
+Any GenMove can be profiled by wrapping it with AllocationProfiler.wrap. For every move the profiler records
+    - peak_bytes:      the exact peak of traced memory during the move above the memory at its start,
+    - retained_bytes:  traced memory still held after the move (e.g. a tree kept for pondering, caches),
+    - live at peak:    the memory allocated during the move and alive in the largest of the snapshots taken every
+                       `interval` seconds while the agent searches, grouped by source line and by search phase.
+tracemalloc only sees live blocks, so temporaries freed before a snapshot (a board copy checked and dropped in a
+rollout) show up in peak_bytes but only partly in the per-line and per-phase numbers, while what a search keeps (tree
+nodes, their boards and untried actions) is caught in full. The phases are those of benchmarks.profiling (PHASES):
+an allocation belongs to a phase if its traceback contains the call from the phase's caller to one of its callees.
+
+`run` plays one untraced move per agent first (lazy imports and caches), then profiles headless games between the two
+agents (as benchmarks.profiling) and writes <output>/allocations.json, a summary per agent (mean and max per move,
+phases, top lines) that `compare` checks against an earlier one:
+
+    python -m benchmarks.allocations run agent_mcts agent_minimax --games 2 --args-1 "[300]" [--output allocations]
+    python -m benchmarks.allocations compare old/allocations.json allocations/allocations.json [--threshold 0.25]
+"""
+import argparse
+import ast
+import bisect
+import functools
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks.profiling import PHASES, play_games
+
+SAMPLE_INTERVAL = 0.005
+TRACEBACK_FRAMES = 16
+TOP_LINES = 15
+DEFAULT_THRESHOLD = 0.25
+EXCLUDED_FILES = {  # allocations of the profiling itself, by file of the most recent frame
+    tracemalloc.__file__,
+    threading.__file__,  # the sampler thread
+    "<frozen importlib._bootstrap>",
+    "<unknown>",
+    __file__,
+}
+
+
+class FunctionIndex(object):
+    """
+    Maps (file, line) to the name of the innermost function defined around the line, parsed from the source files
+    """
+
+    def __init__(self):
+        self.files: Dict[str, Tuple[List[int], List[Tuple[int, int, str]]]] = {}
+
+    @functools.lru_cache(maxsize=None)
+    def function(self, filename: str, lineno: int) -> Optional[str]:
+        if filename not in self.files:
+            self.files[filename] = self.parse(filename)
+        starts, functions = self.files[filename]
+        name, span = None, None
+        for index in range(bisect.bisect_right(starts, lineno) - 1, -1, -1):
+            start, end, function = functions[index]
+            if start <= lineno <= end and (span is None or end - start < span):
+                name, span = function, end - start
+        return name
+
+    @staticmethod
+    def parse(filename: str) -> Tuple[List[int], List[Tuple[int, int, str]]]:
+        try:
+            with open(filename) as file:
+                tree = ast.parse(file.read())
+        except (OSError, SyntaxError, ValueError):
+            return [], []
+        functions = sorted((node.lineno, node.end_lineno, node.name) for node in ast.walk(tree)
+                           if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)))
+        return [start for start, _, _ in functions], functions
+
+
+class PeakSampler(object):
+    """
+    Takes a tracemalloc snapshot every `interval` seconds in a background thread while the traced memory is above
+    that of the last snapshot kept, so the kept snapshot is close to the peak of the move
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+        self.size = -1
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            size = tracemalloc.get_traced_memory()[0]
+            if size > self.size:
+                self.snapshot, self.size = tracemalloc.take_snapshot(), size
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+
+class AllocationProfiler(object):
+    """
+    Records the allocations of the moves of wrapped GenMoves, per agent name. tracemalloc is started on entering the
+    context (if it is not running yet) and stopped on exit
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, top_lines: int = TOP_LINES):
+        self.interval = interval
+        self.top_lines = top_lines
+        self.moves: Dict[str, List[Dict]] = defaultdict(list)
+        self.index = FunctionIndex()
+        self.phases: Dict[Tuple[str, tracemalloc.Traceback], str] = {}
+        self.started = False
+
+    def __enter__(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEBACK_FRAMES)
+            self.started = True
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.started:
+            tracemalloc.stop()
+            self.started = False
+
+    def wrap(self, generate_move: Callable, name: str) -> Callable:
+        """
+        GenMove that plays like `generate_move` and records the allocations of every move under `name`
+        """
+        @functools.wraps(generate_move)
+        def profiled(*args, **kwargs):
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            start = tracemalloc.get_traced_memory()[0]
+            t0 = time.perf_counter()
+            with PeakSampler(self.interval) as sampler:
+                result = generate_move(*args, **kwargs)
+            seconds = time.perf_counter() - t0
+            current, peak = tracemalloc.get_traced_memory()
+            peak_snapshot = sampler.snapshot if sampler.snapshot is not None else tracemalloc.take_snapshot()
+            self.moves[name].append(self.move_record(name, before, peak_snapshot,
+                                                     peak - start, current - start, seconds))
+            return result
+
+        return profiled
+
+    def move_record(self, name: str, before: tracemalloc.Snapshot, peak: tracemalloc.Snapshot, peak_bytes: int,
+                    retained_bytes: int, seconds: float) -> Dict:
+        phases = defaultdict(int)
+        lines = defaultdict(lambda: [0, 0])
+        for difference in peak.compare_to(before, "traceback"):
+            frame = difference.traceback[-1]  # most recent frame: where the memory was allocated
+            if difference.size_diff <= 0 or frame.filename in EXCLUDED_FILES:
+                continue
+            phases[self.phase(name, difference.traceback)] += difference.size_diff
+            line = lines[f"{os.path.relpath(frame.filename)}:{frame.lineno}"]
+            line[0] += difference.size_diff
+            line[1] += max(difference.count_diff, 0)
+        top = sorted(lines.items(), key=lambda item: -item[1][0])[:self.top_lines]
+        return dict(seconds=seconds, peak_bytes=peak_bytes, retained_bytes=retained_bytes,
+                    live_at_peak_bytes=sum(phases.values()), phases=dict(phases),
+                    lines={line: dict(bytes=size, blocks=blocks) for line, (size, blocks) in top})
+
+    def phase(self, agent: str, traceback: tracemalloc.Traceback) -> str:
+        if (agent, traceback) not in self.phases:
+            self.phases[agent, traceback] = self.find_phase(agent, traceback)
+        return self.phases[agent, traceback]
+
+    def find_phase(self, agent: str, traceback: tracemalloc.Traceback) -> str:
+        phases = PHASES.get(agent, {})
+        for caller_frame, callee_frame in zip(traceback, traceback[1:]):  # oldest frame first
+            file_name = os.path.basename(caller_frame.filename)
+            candidates = [(phase, caller, callees) for phase, (phase_file, caller, callees) in phases.items()
+                          if phase_file == file_name]
+            if not candidates:
+                continue
+            function = self.index.function(caller_frame.filename, caller_frame.lineno)
+            callee = self.index.function(callee_frame.filename, callee_frame.lineno)
+            for phase, caller, callees in candidates:
+                if function == caller and callee in callees:
+                    return phase
+        return "other"
+
+    def summary(self) -> Dict:
+        """
+        Per agent: number of moves, mean and max bytes per move, mean live bytes at peak per phase and the source
+        lines with the most live bytes at peak (mean per move)
+        """
+        summary = {}
+        for name, moves in self.moves.items():
+            n = len(moves)
+            phases, lines = defaultdict(float), defaultdict(lambda: [0.0, 0.0])
+            for move in moves:
+                for phase, size in move["phases"].items():
+                    phases[phase] += size / n
+                for line, stats in move["lines"].items():
+                    lines[line][0] += stats["bytes"] / n
+                    lines[line][1] += stats["blocks"] / n
+            summary[name] = dict(
+                moves=n,
+                seconds=sum(move["seconds"] for move in moves),
+                peak_bytes_mean=sum(move["peak_bytes"] for move in moves) / n,
+                peak_bytes_max=max(move["peak_bytes"] for move in moves),
+                retained_bytes_mean=sum(move["retained_bytes"] for move in moves) / n,
+                live_at_peak_bytes_mean=sum(move["live_at_peak_bytes"] for move in moves) / n,
+                phases=dict(sorted(phases.items(), key=lambda item: -item[1])),
+                lines={line: dict(bytes=size, blocks=blocks) for line, (size, blocks) in
+                       sorted(lines.items(), key=lambda item: -item[1][0])[:self.top_lines]},
+            )
+        return summary
+
+
+def format_bytes(size: float) -> str:
+    for unit, scale in (("MiB", 1 << 20), ("KiB", 1 << 10)):
+        if abs(size) >= scale:
+            return f"{size / scale:.1f} {unit}"
+    return f"{size:.0f} B"
+
+
+def print_summary(summary: Dict):
+    for agent, result in summary.items():
+        print(f"{agent}: {result['moves']} moves, peak {format_bytes(result['peak_bytes_mean'])} per move "
+              f"(max {format_bytes(result['peak_bytes_max'])}), retained {format_bytes(result['retained_bytes_mean'])}")
+        print(f"  live at peak {format_bytes(result['live_at_peak_bytes_mean'])} per move:")
+        for phase, size in result["phases"].items():
+            print(f"    {phase:16s} {format_bytes(size):>10s}")
+        for line, stats in result["lines"].items():
+            print(f"    {format_bytes(stats['bytes']):>10s} {stats['blocks']:9.1f} blocks  {line}")
+
+
+def warm_up(agent: str, args: tuple = ()):
+    """
+    Plays one untraced move of `agent` on the empty board, so lazy imports and module-level caches are not counted as
+    (and do not slow down the snapshots of) the first profiled move
+    """
+    from agents.common import PLAYER1, initialize_game_state
+    from agents.registry import load_agent
+
+    generate_move, init = load_agent(agent)
+    board = initialize_game_state()
+    generate_move(board.copy(), PLAYER1, init(board, PLAYER1, seed=0), *args)
+
+
+def profile_allocations(agent_1: str, agent_2: str, no_of_games: int = 2, args_1: tuple = (), args_2: tuple = (),
+                        seed: int = 0, output: str = "allocations", interval: float = SAMPLE_INTERVAL,
+                        verbose: bool = True) -> Dict:
+    os.makedirs(output, exist_ok=True)
+    warm_up(agent_1, tuple(args_1))
+    warm_up(agent_2, tuple(args_2))
+    with AllocationProfiler(interval) as profiler:
+        play_games(agent_1, agent_2, no_of_games, tuple(args_1), tuple(args_2), seed, wrap=profiler.wrap)
+    report = dict(
+        meta=dict(python=platform.python_version(), platform=platform.platform(),
+                  time=time.strftime("%Y-%m-%dT%H:%M:%S")),
+        agents=[agent_1, agent_2], args=[list(args_1), list(args_2)], games=no_of_games, seed=seed,
+        summary=profiler.summary(),
+    )
+    with open(os.path.join(output, "allocations.json"), "w") as report_file:
+        json.dump(report, report_file, indent=2)
+    if verbose:
+        print_summary(report["summary"])
+        print(f"results in {output}/allocations.json")
+    return report
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = DEFAULT_THRESHOLD, verbose: bool = True) -> List[str]:
+    """
+    Compares the per-move means of two reports, returns the "agent: metric" entries that grew by more than
+    `threshold` (a fraction) or are missing
+    """
+    failures = []
+    for agent, base in baseline["summary"].items():
+        result = current["summary"].get(agent)
+        metrics = [(metric, base[metric], None if result is None else result[metric]) for metric in
+                   ("peak_bytes_mean", "peak_bytes_max", "retained_bytes_mean", "live_at_peak_bytes_mean")]
+        metrics += [(f"phase {phase}", size, None if result is None else result["phases"].get(phase, 0.0))
+                    for phase, size in base["phases"].items()]
+        for metric, old, new in metrics:
+            if new is None:
+                failures.append(f"{agent}: {metric}")
+                if verbose:
+                    print(f"{agent:16s} {metric:28s} missing")
+                continue
+            change = new / old - 1 if old else 0.0
+            grew = change > threshold
+            if grew:
+                failures.append(f"{agent}: {metric}")
+            if verbose:
+                print(f"{agent:16s} {metric:28s} {format_bytes(old):>10s} -> {format_bytes(new):>10s} "
+                      f"{change:+7.1%}{'  REGRESSION' if grew else ''}")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Allocation profiling of headless games with tracemalloc")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="profile the allocations of games between two agents")
+    run_parser.add_argument("agent_1", help="name of the first agent, e.g. agent_mcts")
+    run_parser.add_argument("agent_2", help="name of the second agent, e.g. agent_minimax")
+    run_parser.add_argument("--games", type=int, default=2)
+    run_parser.add_argument("--args-1", type=json.loads, default=[], help="JSON list of extra generate_move arguments")
+    run_parser.add_argument("--args-2", type=json.loads, default=[], help="JSON list of extra generate_move arguments")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--interval", type=float, default=SAMPLE_INTERVAL, help="snapshot interval in seconds")
+    run_parser.add_argument("--output", default="allocations")
+    compare_parser = commands.add_parser("compare", help="compare two allocations.json files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    cli_args = parser.parse_args()
+    if cli_args.command == "run":
+        profile_allocations(cli_args.agent_1, cli_args.agent_2, cli_args.games, cli_args.args_1, cli_args.args_2,
+                            cli_args.seed, cli_args.output, cli_args.interval)
+    else:
+        with open(cli_args.baseline) as baseline_file, open(cli_args.current) as current_file:
+            regressions = compare(json.load(baseline_file), json.load(current_file), cli_args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {cli_args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
@@ -0,0 +1,79 @@
+"""
+Counts the board copies (ndarray.copy calls) made while agents play, per move and per calling source line.
+
+The harness lends the board to the agents as a read-only view (agents.common.read_only_view) and agents copy a board
+only where they change a position, so the copies left are those of the search itself (e.g. apply_player_action with
+copy=True for every new node). tracemalloc (benchmarks.allocations) misses most of these short-lived copies, the
+counts here see every one of them. Copies are counted with sys.setprofile in the thread playing the games, so
+background threads (pondering) are not counted.
+
+    python -m benchmarks.board_copies agent_mcts agent_minimax --games 2 --args-1 "[300]" [--top 15]
+"""
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+from typing import Dict
+
+import numpy as np
+
+from benchmarks.profiling import play_games
+
+TOP_LINES = 15
+
+
+class CopyCounter(object):
+    """
+    Profile function (sys.setprofile) counting the ndarray.copy calls per calling "file:line"
+    """
+
+    def __init__(self):
+        self.lines = Counter()
+
+    def __call__(self, frame, event, arg):
+        if event == "c_call" and getattr(arg, "__name__", None) == "copy" \
+                and isinstance(getattr(arg, "__self__", None), np.ndarray):
+            self.lines[f"{os.path.relpath(frame.f_code.co_filename)}:{frame.f_lineno}"] += 1
+
+    def __enter__(self):
+        sys.setprofile(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        sys.setprofile(None)
+
+
+def count_copies(agent_1: str, agent_2: str, no_of_games: int = 2, args_1: tuple = (), args_2: tuple = (),
+                 seed: int = 0, top_lines: int = TOP_LINES, verbose: bool = True) -> Dict:
+    """
+    Plays the games (as benchmarks.profiling) and returns the number of moves, the board copies per move and the
+    lines making the most copies (copies per move)
+    """
+    with CopyCounter() as counter:
+        results = play_games(agent_1, agent_2, no_of_games, tuple(args_1), tuple(args_2), seed)
+    moves = sum(n_moves for _, n_moves in results)
+    report = dict(
+        agents=[agent_1, agent_2], args=[list(args_1), list(args_2)], games=no_of_games, seed=seed, moves=moves,
+        copies_per_move=sum(counter.lines.values()) / moves,
+        lines={line: count / moves for line, count in counter.lines.most_common(top_lines)},
+    )
+    if verbose:
+        print(f"{moves} moves, {report['copies_per_move']:.1f} board copies per move")
+        for line, copies in report["lines"].items():
+            print(f"    {copies:10.1f}  {line}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count the board copies per move of headless games")
+    parser.add_argument("agent_1", help="name of the first agent, e.g. agent_mcts")
+    parser.add_argument("agent_2", help="name of the second agent, e.g. agent_minimax")
+    parser.add_argument("--games", type=int, default=2)
+    parser.add_argument("--args-1", type=json.loads, default=[], help="JSON list of extra generate_move arguments")
+    parser.add_argument("--args-2", type=json.loads, default=[], help="JSON list of extra generate_move arguments")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--top", type=int, default=TOP_LINES, help="number of source lines listed")
+    cli_args = parser.parse_args()
+    count_copies(cli_args.agent_1, cli_args.agent_2, cli_args.games, cli_args.args_1, cli_args.args_2, cli_args.seed,
+                 cli_args.top)
@@ -0,0 +1,79 @@
+"""
+Compares the leaf evaluators of the minimax agent (agents.agent_minimax.minimax.EVALUATORS) at equal wall time.
+
+    - cost:     microseconds per evaluation over sampled positions,
+    - depth:    mean depth iterative deepening completes with each evaluator in `move_seconds` per move, over the
+                positions of benchmarks.positions (POSITIONS and sampled positions),
+    - strength: a tournament (tournament.run_tournament) of minimax with the first evaluator against minimax with the
+                second one, both under the same per-move time control, so a costlier evaluator pays with depth.
+
+    python -m benchmarks.evaluators --games 40 --move-seconds 0.2 [--processes 4] [--first threats --second heuristic]
+"""
+import argparse
+import statistics
+import time
+from typing import Dict
+
+import numpy as np
+
+from agents.agent_minimax.eval_cache import DEFAULT_MAX_ENTRIES, EvaluationCache
+from agents.agent_minimax.minimax import EVALUATORS, HEURISTIC, THREATS, iterative_deepening
+from agents.rng import AgentRNG
+from benchmarks.positions import POSITIONS, sample_positions
+
+
+def evaluation_cost(evaluator: str, positions, repeats: int = 20) -> float:
+    evaluate = EVALUATORS[evaluator]
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        for board, player in positions:
+            evaluate(board, player)
+    return (time.perf_counter() - t0) / (repeats * len(positions))
+
+
+def reached_depth(evaluator: str, positions, move_seconds: float) -> float:
+    depths = []
+    for index, (board, player) in enumerate(positions):
+        cache = EvaluationCache(EVALUATORS[evaluator], DEFAULT_MAX_ENTRIES)
+        _, depth = iterative_deepening(board, player, time.monotonic() + move_seconds, AgentRNG(index), cache=cache,
+                                       evaluate=EVALUATORS[evaluator])
+        depths.append(depth)
+    return statistics.mean(depths)
+
+
+def compare(first: str = THREATS, second: str = HEURISTIC, no_of_games: int = 40, move_seconds: float = 0.2,
+            processes=None, seed: int = 0, output: str = "tournament/evaluators") -> Dict:
+    from main import TimeControl
+    from tournament import run_tournament, print_summary
+
+    positions = [(board, player) for board, player in POSITIONS.values()] + sample_positions(10, seed=0)
+    result = {}
+    for evaluator in (first, second):
+        result[evaluator] = dict(
+            seconds_per_evaluation=evaluation_cost(evaluator, positions),
+            depth=reached_depth(evaluator, positions, move_seconds),
+        )
+        print(f"{evaluator:10s} {result[evaluator]['seconds_per_evaluation'] * 1e6:8.1f} us per evaluation, "
+              f"depth {result[evaluator]['depth']:.2f} in {move_seconds} s")
+    summary = run_tournament("agent_minimax", "agent_minimax", no_of_games, processes,
+                             (None, DEFAULT_MAX_ENTRIES, first), (None, DEFAULT_MAX_ENTRIES, second), seed, output,
+                             TimeControl(move_seconds))
+    print(f"{first} (first agent) against {second} (second agent), {move_seconds} s per move:")
+    print_summary(summary)
+    result["tournament"] = summary
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the minimax evaluators at equal time per move")
+    parser.add_argument("--first", choices=sorted(EVALUATORS), default=THREATS)
+    parser.add_argument("--second", choices=sorted(EVALUATORS), default=HEURISTIC)
+    parser.add_argument("--games", type=int, default=40)
+    parser.add_argument("--move-seconds", type=float, default=0.2)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="tournament/evaluators")
+    cli_args = parser.parse_args()
+    np.seterr(all="ignore")
+    compare(cli_args.first, cli_args.second, cli_args.games, cli_args.move_seconds, cli_args.processes, cli_args.seed,
+            cli_args.output)
@@ -0,0 +1,93 @@
+"""
+Cold-start latency: time to import the modules short-lived workers and CLIs start with, each in a fresh interpreter.
+
+Every module is imported `repeats` times in a new `python -c` process, timed inside the process (the interpreter's own
+startup is reported separately as "interpreter"). The results use the format of benchmarks.suite, so the regression
+gate applies to them too. With --detail the modules with the largest own import time (python -X importtime) are
+listed for every benchmarked module.
+
+    python -m benchmarks.import_time --output imports.json [--repeats 7] [--detail]
+    python -m benchmarks.suite compare imports_baseline.json imports.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+MODULES = ["agents.common", "agents.registry", "agents.agent_random", "agents.agent_minimax", "agents.agent_mcts",
+           "main", "tournament", "selfplay", "analysis", "server"]
+TIMED_IMPORT = "import time; t0 = time.perf_counter(); import {module}; print(time.perf_counter() - t0)"
+
+
+def time_import(module: str, repeats: int = 5) -> Dict:
+    """
+    Seconds to import `module` in `repeats` fresh interpreters, and seconds from the interpreter's start to exit
+    """
+    imports, processes = [], []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", TIMED_IMPORT.format(module=module)], check=True,
+                                capture_output=True, text=True).stdout
+        processes.append(time.perf_counter() - t0)
+        imports.append(float(output.split()[-1]))
+    return dict(median=statistics.median(imports), min=min(imports), repeats=repeats,
+                process_median=statistics.median(processes))
+
+
+def time_interpreter(repeats: int = 5) -> Dict:
+    timings = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        timings.append(time.perf_counter() - t0)
+    return dict(median=statistics.median(timings), min=min(timings), repeats=repeats)
+
+
+def import_profile(module: str, top: int = 10) -> List[Tuple[str, float]]:
+    """
+    The `top` modules with the largest own import time (seconds) when importing `module`, from python -X importtime
+    """
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], check=True,
+                            capture_output=True, text=True).stderr
+    own = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        own.append((name.strip(), int(self_us) / 1e6))
+    return sorted(own, key=lambda entry: -entry[1])[:top]
+
+
+def run(modules: Optional[List[str]] = None, repeats: int = 5, detail: bool = False, verbose: bool = True) -> Dict:
+    results = {"interpreter": time_interpreter(repeats)}
+    if verbose:
+        print(f"{'interpreter':24s} {results['interpreter']['median'] * 1e3:8.1f} ms")
+    for module in modules or MODULES:
+        results[f"import_{module}"] = time_import(module, repeats)
+        if verbose:
+            print(f"{module:24s} {results[f'import_{module}']['median'] * 1e3:8.1f} ms")
+        if detail:
+            for name, seconds in import_profile(module):
+                print(f"    {name:40s} {seconds * 1e3:8.1f} ms")
+    return dict(
+        meta=dict(python=platform.python_version(), machine=platform.machine(), platform=platform.platform(),
+                  time=time.strftime("%Y-%m-%dT%H:%M:%S")),
+        benchmarks=results,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the cold import of the agents and CLIs")
+    parser.add_argument("modules", nargs="*", help=f"modules to time, default: {' '.join(MODULES)}")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--detail", action="store_true", help="list the slowest imports of every module")
+    parser.add_argument("--output", default=None, help="JSON file for the results (format of benchmarks.suite)")
+    cli_args = parser.parse_args()
+    cli_results = run(cli_args.modules, cli_args.repeats, cli_args.detail)
+    if cli_args.output:
+        with open(cli_args.output, "w") as output_file:
+            json.dump(cli_results, output_file, indent=2)
@@ -0,0 +1,100 @@
+"""
+Compares the plain MCTS tree with the transposition-aware search (DAG), in which identical positions reached through
+different move orders share one node.
+
+For each position and seed both variants run the same number of iterations and report:
+    - the number of distinct nodes allocated,
+    - the peak memory traced by tracemalloc during the search,
+    - the iterations needed until the chosen move stops changing (checked every `checkpoint` iterations).
+
+Run with:  python -m benchmarks.mcts_transpositions
+"""
+import time
+import tracemalloc
+from typing import Optional, Dict
+
+import numpy as np
+
+from agents.agent_mcts import State
+from agents.agent_mcts.mcts import tree_traversal, new_node_table
+from agents.rng import AgentRNG
+from agents.common import BoardPiece
+from benchmarks.positions import POSITIONS
+
+def count_nodes(root: State) -> int:
+    """
+    Counts the distinct nodes reachable from `root`, counting shared (transposed) nodes once
+    :param root: State
+                 root of the search tree or DAG
+    :return:     int
+                 number of distinct nodes
+    """
+    seen = set()
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        stack.extend(node.children.values())
+    return len(seen)
+
+
+def run_search(board: np.ndarray, player: BoardPiece, no_of_iterations: int, checkpoint: int,
+               use_transpositions: bool, seed: int) -> Dict[str, float]:
+    """
+    Runs one search and collects its statistics
+    :param board:              np.ndarray
+                               root board
+    :param player:             BoardPiece
+                               player to move at the root
+    :param no_of_iterations:   int
+                               total number of MCTS iterations
+    :param checkpoint:         int
+                               number of iterations between two checks of the currently chosen move
+    :param use_transpositions: bool
+                               whether identical positions share one node
+    :param seed:               int
+                               seed of the random number generator of the search
+    :return:                   dict
+                               nodes, peak memory in bytes, iterations to convergence and wall time
+    """
+    rng = AgentRNG(seed)
+    rng.random()  # fills the prefetch buffer, which is not part of the tree
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    root = State(board.copy(), player=player)
+    node_table = new_node_table(root) if use_transpositions else None
+    chosen = []
+    for _ in range(no_of_iterations // checkpoint):
+        tree_traversal(checkpoint, root, player, node_table, rng=rng)
+        chosen.append(root.get_best_action(0))
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    converged_at = len(chosen)
+    while converged_at > 1 and chosen[converged_at - 2] == chosen[-1]:
+        converged_at -= 1
+    return dict(nodes=count_nodes(root), peak_bytes=peak, converged_at=converged_at * checkpoint, seconds=elapsed)
+
+
+def compare(no_of_iterations: int = 2000, checkpoint: int = 100, seeds: int = 5, positions: Optional[dict] = None):
+    """
+    Prints the plain tree versus DAG comparison averaged over `seeds` runs per position
+    """
+    positions = POSITIONS if positions is None else positions
+    header = f"{'position':<14}{'variant':<8}{'nodes':>9}{'peak KiB':>11}{'converged':>11}{'time s':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, (board, player) in positions.items():
+        for label, use_transpositions in (("tree", False), ("dag", True)):
+            runs = [run_search(board, player, no_of_iterations, checkpoint, use_transpositions, seed)
+                    for seed in range(seeds)]
+            mean = {k: np.mean([r[k] for r in runs]) for k in runs[0]}
+            print(f"{name:<14}{label:<8}{mean['nodes']:>9.0f}{mean['peak_bytes'] / 1024:>11.1f}"
+                  f"{mean['converged_at']:>11.0f}{mean['seconds']:>9.2f}")
+
+
+if __name__ == "__main__":
+    compare()
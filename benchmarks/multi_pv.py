@@ -0,0 +1,72 @@
+"""
+Compares the cost of scoring the root moves with minimax.multi_pv against one search per column.
+
+For each position the following are run at the same depth and report searched nodes and seconds:
+    - best move:  one minimax_with_alpha_beta_pruning search, which only returns the best move (reference),
+    - per move:   a separate full-window search of every root move, without transposition table or cache,
+    - multi-PV:   multi_pv for all moves and for the top 1 and top 3, with a transposition table and evaluation cache
+                  shared by the moves (fresh for every run).
+The scores of the per-move searches and of multi_pv are checked to be identical.
+
+Run with:  python -m benchmarks.multi_pv [depth]
+"""
+import sys
+import time
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+
+from agents.agent_minimax.eval_cache import EvaluationCache
+from agents.agent_minimax.minimax import minimax_with_alpha_beta_pruning, multi_pv, score_action
+from agents.common import apply_player_action, get_opponent, get_valid_actions
+from agents.rng import AgentRNG
+from agents.transposition import SharedTranspositionTable
+from benchmarks.positions import POSITIONS
+
+
+def measure(search: Callable[[dict], object]) -> Tuple[object, int, float]:
+    stats = dict(nodes=0, leaves=0)
+    t0 = time.perf_counter()
+    result = search(stats)
+    return result, stats['nodes'], time.perf_counter() - t0
+
+
+def per_move_scores(board: np.ndarray, depth: int, player, stats: dict) -> Dict[int, float]:
+    scores = {}
+    for col in get_valid_actions(board):
+        child = apply_player_action(board, col, player, True)
+        _, scores[int(col)] = minimax_with_alpha_beta_pruning(child, depth - 1, -np.inf, np.inf, get_opponent(player),
+                                                              AgentRNG(0), stats)
+    return scores
+
+
+def shared_multi_pv(board: np.ndarray, depth: int, player, k, stats: dict):
+    table = SharedTranspositionTable(1 << 16)
+    try:
+        return multi_pv(board, depth, player, k, AgentRNG(0), stats, table, EvaluationCache(score_action))
+    finally:
+        table.close()
+        table.unlink()
+
+
+def compare(depth: int = 5):
+    print(f"depth {depth}")
+    print(f"{'position':14s} {'search':12s} {'nodes':>9s} {'seconds':>9s}")
+    for name, (board, player) in POSITIONS.items():
+        runs = [
+            ("best move", lambda stats: minimax_with_alpha_beta_pruning(board, depth, -np.inf, np.inf, player,
+                                                                        AgentRNG(0), stats)),
+            ("per move", lambda stats: per_move_scores(board, depth, player, stats)),
+            ("multi-PV", lambda stats: shared_multi_pv(board, depth, player, None, stats)),
+            ("multi-PV k=3", lambda stats: shared_multi_pv(board, depth, player, 3, stats)),
+            ("multi-PV k=1", lambda stats: shared_multi_pv(board, depth, player, 1, stats)),
+        ]
+        results = {}
+        for search, run in runs:
+            results[search], nodes, seconds = measure(run)
+            print(f"{name:14s} {search:12s} {nodes:9d} {seconds:9.3f}")
+        assert {int(action): score for action, score in results["multi-PV"]} == results["per move"]
+
+
+if __name__ == "__main__":
+    compare(*map(int, sys.argv[1:]))
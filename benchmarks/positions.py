@@ -0,0 +1,41 @@
+"""
+Position sets shared by the benchmarks: POSITIONS, three named search positions (empty board, opening, middle game),
+and sample_positions, positions taken out of seeded random games.
+
+The boards of POSITIONS are shared module state, copy them before playing moves on them.
+"""
+from typing import List, Tuple
+
+import numpy as np
+
+from agents.common import BoardPiece, PLAYER1, PLAYER2, GameState, initialize_game_state, string_to_board, \
+    apply_player_action, get_valid_actions, check_end_state, get_opponent
+
+POSITIONS = {
+    "empty board": (initialize_game_state(), PLAYER1),
+    "opening": (string_to_board("|==============|\n|              |\n|              |\n|              |"
+                                "\n|              |\n|      O       |\n|    X X O     |\n|==============|"
+                                "\n|0 1 2 3 4 5 6 |"), PLAYER1),
+    "middle game": (string_to_board("|==============|\n|              |\n|              |\n|      O       |"
+                                    "\n|      X X     |\n|    O O X     |\n|  X X O O     |\n|==============|"
+                                    "\n|0 1 2 3 4 5 6 |"), PLAYER2),
+}
+
+
+def sample_positions(no_of_positions: int, seed: int = 0) -> List[Tuple[np.ndarray, BoardPiece]]:
+    """
+    Positions (board, player to move) taken after 2 to 20 random moves, skipping finished games
+    """
+    rng = np.random.RandomState(seed)
+    positions = []
+    while len(positions) < no_of_positions:
+        board = initialize_game_state()
+        player = PLAYER1
+        for _ in range(rng.randint(2, 21)):
+            apply_player_action(board, rng.choice(get_valid_actions(board)), player)
+            if check_end_state(board, player) != GameState.STILL_PLAYING:
+                break
+            player = get_opponent(player)
+        else:
+            positions.append((board, player))
+    return positions
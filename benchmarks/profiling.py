@@ -0,0 +1,195 @@
+"""
+Profiles headless games between two agents and breaks the time of each agent down into the phases of its search.
+
+The games are played like tournament.py plays them (agents are packages in `agents`, seeded through their init hook,
+the first agent moves first in the even games) without any console output, under cProfile and, at the same time, a
+sampling profiler of the stacks of the game thread. Written to <output>:
+
+    profile.pstats   the cProfile statistics (python -m pstats, snakeviz, ...)
+    collapsed.txt    sampled stacks in the collapsed format of flamegraph.pl / speedscope / inferno
+    phases.json      time of every agent per phase, as printed
+
+The phases are the cumulative times of the functions that the search functions of an agent call (e.g. `rollout` as
+called by `tree_traversal`), taken from the caller statistics of cProfile, so a function called elsewhere too (e.g.
+check_end_state in a rollout) is only counted in the phase it belongs to. Time of the agent that falls in no phase is
+reported as "other". Both sides of a game between two instances of the same agent are counted together.
+
+    python -m benchmarks.profiling agent_mcts agent_minimax --games 4 --seed 0 --args-1 "[500]"
+"""
+import argparse
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+# phases of each agent: phase -> (file name of the module, calling function, called functions)
+PHASES = {
+    "agent_mcts": {
+        "selection": ("mcts.py", "tree_traversal", ("select_leaf_node",)),
+        "expansion": ("mcts.py", "tree_traversal", ("expand", "make_room")),
+        "rollout": ("mcts.py", "tree_traversal", ("rollout",)),
+        "backpropagation": ("mcts.py", "tree_traversal", ("backpropagate_path",)),
+    },
+    "agent_minimax": {
+        "move generation": ("minimax.py", "minimax_with_alpha_beta_pruning", ("get_valid_actions",
+                                                                              "apply_player_action")),
+        "evaluation": ("minimax.py", "minimax_with_alpha_beta_pruning", ("score_action", "threat_score", "evaluate")),
+        "win check": ("minimax.py", "minimax_with_alpha_beta_pruning", ("check_end_state",)),
+    },
+}
+GENERATE_MOVE = {
+    "agent_mcts": ("mcts.py", "generate_move_mcts"),
+    "agent_minimax": ("minimax.py", "generate_move_minimax"),
+    "agent_random": ("random.py", "generate_move_random"),
+}
+SAMPLE_INTERVAL = 0.001
+
+
+class StackSampler(object):
+    """
+    Samples the stack of `thread_id` every `interval` seconds in a background thread and counts the collapsed stacks
+    """
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self.switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self.switch_interval, self.interval / 2))
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+        sys.setswitchinterval(self.switch_interval)
+
+    def write(self, path: str):
+        with open(path, "w") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+
+def play_games(agent_1: str, agent_2: str, no_of_games: int, args_1: tuple = (), args_2: tuple = (), seed: int = 0,
+               wrap: Optional[Callable] = None) -> List[Tuple[int, int]]:
+    """
+    Plays the games without output and returns (winner, number of moves) of each. With `wrap` the agents play through
+    wrap(generate_move, agent name)
+    """
+    from main import play_game
+    from agents.registry import load_agent
+
+    (generate_move_1, init_1), (generate_move_2, init_2) = load_agent(agent_1), load_agent(agent_2)
+    if wrap is not None:
+        generate_move_1, generate_move_2 = wrap(generate_move_1, agent_1), wrap(generate_move_2, agent_2)
+    results = []
+    for game in range(no_of_games):
+        game_seed = seed + 2 * game
+        first = (generate_move_1, agent_1, args_1, partial(init_1, seed=game_seed))
+        second = (generate_move_2, agent_2, args_2, partial(init_2, seed=game_seed + 1))
+        if game % 2:
+            first, second = second, first
+        winner, moves = play_game(first[0], second[0], first[1], second[1], first[2], second[2], first[3], second[3],
+                                  verbose=False)
+        results.append((int(winner), len(moves)))
+    return results
+
+
+def find_function(stats: Dict, file_name: str, function: str) -> Optional[Tuple]:
+    for key in stats:
+        if key[2] == function and os.path.basename(key[0]) == file_name:
+            return key
+    return None
+
+
+def phase_breakdown(profile_stats: pstats.Stats, agents: List[str]) -> Dict[str, Dict[str, float]]:
+    """
+    Seconds per phase (and in total) of every agent
+    """
+    stats = profile_stats.stats
+    breakdown = {}
+    for agent in dict.fromkeys(agents):
+        if agent not in GENERATE_MOVE:
+            continue
+        entry = find_function(stats, *GENERATE_MOVE[agent])
+        total = stats[entry][3] if entry is not None else 0.0
+        phases = {}
+        for phase, (file_name, caller, callees) in PHASES.get(agent, {}).items():
+            caller_key = find_function(stats, file_name, caller)
+            seconds = 0.0
+            for key, (_, _, _, _, callers) in stats.items():
+                if key[2] in callees and caller_key in callers:
+                    seconds += callers[caller_key][3]
+            phases[phase] = seconds
+        phases["other"] = max(total - sum(phases.values()), 0.0)
+        breakdown[agent] = dict(total=total, phases=phases)
+    return breakdown
+
+
+def print_breakdown(breakdown: Dict[str, Dict], games: int):
+    for agent, result in breakdown.items():
+        total = result["total"]
+        print(f"{agent}: {total:.3f} s in {games} games")
+        for phase, seconds in result["phases"].items():
+            print(f"  {phase:16s} {seconds:9.3f} s  {seconds / total if total else 0.0:6.1%}")
+
+
+def profile(agent_1: str, agent_2: str, no_of_games: int = 2, args_1: tuple = (), args_2: tuple = (), seed: int = 0,
+            output: str = "profile", interval: float = SAMPLE_INTERVAL, verbose: bool = True) -> Dict:
+    os.makedirs(output, exist_ok=True)
+    profiler = cProfile.Profile()
+    t0 = time.perf_counter()
+    with StackSampler(threading.get_ident(), interval) as sampler:
+        profiler.enable()
+        results = play_games(agent_1, agent_2, no_of_games, tuple(args_1), tuple(args_2), seed)
+        profiler.disable()
+    seconds = time.perf_counter() - t0
+    profiler.dump_stats(os.path.join(output, "profile.pstats"))
+    sampler.write(os.path.join(output, "collapsed.txt"))
+    breakdown = phase_breakdown(pstats.Stats(profiler), [agent_1, agent_2])
+    report = dict(agents=[agent_1, agent_2], games=no_of_games, seed=seed, seconds=seconds,
+                  moves=sum(moves for _, moves in results), samples=sum(sampler.stacks.values()), agents_time=breakdown)
+    with open(os.path.join(output, "phases.json"), "w") as phases_file:
+        json.dump(report, phases_file, indent=2)
+    if verbose:
+        print(f"{no_of_games} games, {report['moves']} moves in {seconds:.2f} s (profiled), "
+              f"{report['samples']} stack samples")
+        print_breakdown(breakdown, no_of_games)
+        print(f"results in {output}/: profile.pstats, collapsed.txt, phases.json")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile headless games and break the agents' time down by phase")
+    parser.add_argument("agent_1", help="package name of the first agent in agents, e.g. agent_mcts")
+    parser.add_argument("agent_2", help="package name of the second agent in agents, e.g. agent_minimax")
+    parser.add_argument("--games", type=int, default=2)
+    parser.add_argument("--args-1", type=json.loads, default=[], help="JSON list of extra generate_move arguments")
+    parser.add_argument("--args-2", type=json.loads, default=[], help="JSON list of extra generate_move arguments")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--interval", type=float, default=SAMPLE_INTERVAL, help="stack sampling interval in seconds")
+    parser.add_argument("--output", default="profile")
+    cli_args = parser.parse_args()
+    profile(cli_args.agent_1, cli_args.agent_2, cli_args.games, cli_args.args_1, cli_args.args_2, cli_args.seed,
+            cli_args.output, cli_args.interval)
@@ -0,0 +1,89 @@
+"""
+Random versus tactical MCTS rollouts.
+
+    1. Rollouts per second of both policies, from positions sampled out of random games.
+    2. Win rate of MCTS with tactical rollouts against MCTS with random rollouts when both get the same wall time per
+       move, alternating who moves first.
+
+Run with:  python -m benchmarks.rollout_policies [seconds_per_move] [no_of_games]
+"""
+import sys
+import time
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from agents.agent_mcts import State
+from agents.agent_mcts.mcts import tree_traversal, rollout, RANDOM_ROLLOUT, TACTICAL_ROLLOUT
+from agents.rng import AgentRNG
+from agents.common import BoardPiece, PlayerAction, PLAYER1, PLAYER2, GameState, initialize_game_state, \
+    apply_player_action, check_end_state, get_opponent
+from benchmarks.positions import sample_positions
+
+POLICIES = (RANDOM_ROLLOUT, TACTICAL_ROLLOUT)
+
+
+def rollouts_per_second(policy: str, positions: List[Tuple[np.ndarray, BoardPiece]], seconds: float = 2.0) -> float:
+    rng = AgentRNG(0)
+    nodes = [(State(board, player=player), player) for board, player in positions]
+    root = State(initialize_game_state(), player=PLAYER1)
+    count = 0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        node, player = nodes[count % len(nodes)]
+        rollout(node, root, get_opponent(player), policy, rng)
+        count += 1
+    return count / (time.perf_counter() - t0)
+
+
+def timed_mcts(seconds: float, rollout_policy: str, rng: AgentRNG) -> Callable:
+    """
+    MCTS move generator that searches for a fixed wall time instead of a fixed number of iterations
+    """
+    def generate_move(board: np.ndarray, player: BoardPiece) -> PlayerAction:
+        root = State(board, player=player)
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            tree_traversal(10, root, player, rollout_policy=rollout_policy, rng=rng)
+        return PlayerAction(root.get_best_action(0))
+    return generate_move
+
+
+def play_game(first: Callable, second: Callable) -> int:
+    """
+    Plays one game, returns 1 if `first` won, 2 if `second` won and 0 for a draw
+    """
+    board = initialize_game_state()
+    while True:
+        for index, (gen_move, player) in enumerate(((first, PLAYER1), (second, PLAYER2)), start=1):
+            apply_player_action(board, gen_move(board.copy(), player), player)
+            end_state = check_end_state(board, player)
+            if end_state == GameState.IS_WIN:
+                return index
+            if end_state == GameState.IS_DRAW:
+                return 0
+
+
+def main(seconds_per_move: float = 0.2, no_of_games: int = 20):
+    positions = sample_positions(50)
+    for policy in POLICIES:
+        print(f"{policy:<10} {rollouts_per_second(policy, positions):8.0f} rollouts/s")
+
+    wins = draws = 0
+    for game in range(no_of_games):
+        tactical = timed_mcts(seconds_per_move, TACTICAL_ROLLOUT, AgentRNG(2 * game))
+        random = timed_mcts(seconds_per_move, RANDOM_ROLLOUT, AgentRNG(2 * game + 1))
+        if game % 2 == 0:
+            result = play_game(tactical, random)
+            wins += result == 1
+        else:
+            result = play_game(random, tactical)
+            wins += result == 2
+        draws += result == 0
+    losses = no_of_games - wins - draws
+    print(f"tactical vs random at {seconds_per_move}s/move: {wins} wins, {draws} draws, {losses} losses "
+          f"({(wins + draws / 2) / no_of_games:.1%} score)")
+
+
+if __name__ == "__main__":
+    main(*(float(arg) for arg in sys.argv[1:2]), *(int(arg) for arg in sys.argv[2:3]))
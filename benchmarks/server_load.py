@@ -0,0 +1,103 @@
+"""
+Load generator for server.py: runs an increasing number of concurrent clients, each playing random moves against an
+agent, and reports the per-move latency seen by the clients and the throughput of the server.
+
+By default a server is started in this process (agents on its worker pool), use --host/--port or --unix to load an
+already running one.
+
+    python -m benchmarks.server_load --games 1 2 4 8 16 32 --agent agent_mcts --agent-args 200
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from agents.common import PlayerAction, PLAYER1, PLAYER2, GameState, initialize_game_state, apply_player_action, \
+    get_valid_actions, check_end_state
+from server import GameServer
+
+
+async def play_client(host: str, port: int, unix_path: Optional[str], agent: str, agent_args: List[str],
+                      game: int, latencies: List[float]) -> str:
+    """
+    Plays one game with random moves, appending the latency of every agent reply to `latencies`
+    """
+    if unix_path is not None:
+        reader, writer = await asyncio.open_unix_connection(unix_path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    rng = np.random.default_rng(game)
+    board = initialize_game_state()
+    client_first = game % 2 == 0
+    client, agent_player = (PLAYER1, PLAYER2) if client_first else (PLAYER2, PLAYER1)
+    writer.write(f"NEW {agent} {'first' if client_first else 'second'} {game} {' '.join(agent_args)}\n".encode())
+    t0 = time.perf_counter()
+    while True:
+        fields = (await reader.readline()).decode().split()
+        if not fields:
+            raise ConnectionError("server closed the connection")
+        if fields[0] == "END":
+            result = fields[1]
+            break
+        if fields[0] == "ERROR":
+            raise RuntimeError(" ".join(fields))
+        if fields[0] == "MOVE":
+            latencies.append(time.perf_counter() - t0)
+            apply_player_action(board, PlayerAction(int(fields[1])), agent_player)
+            if check_end_state(board, agent_player) != GameState.STILL_PLAYING:
+                continue  # END follows
+        elif not client_first:
+            continue  # GAME, the agent moves first
+        action = rng.choice(get_valid_actions(board))
+        apply_player_action(board, action, client)
+        t0 = time.perf_counter()
+        writer.write(f"PLAY {action}\n".encode())
+    writer.write(b"QUIT\n")
+    await writer.drain()
+    writer.close()
+    return result
+
+
+async def run_load(game_counts: List[int], agent: str, agent_args: List[str], host: str, port: Optional[int],
+                   unix_path: Optional[str], workers: Optional[int]):
+    game_server = server = None
+    if port is None and unix_path is None:
+        game_server = GameServer(workers)
+        server = await game_server.start(host, 0)
+        port = server.sockets[0].getsockname()[1]
+    print(f"{'games':>6}{'moves':>8}{'moves/s':>10}{'games/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'max ms':>9}")
+    try:
+        for no_of_games in game_counts:
+            latencies = []
+            t0 = time.perf_counter()
+            await asyncio.gather(*(play_client(host, port, unix_path, agent, agent_args, game, latencies)
+                                   for game in range(no_of_games)))
+            elapsed = time.perf_counter() - t0
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+            print(f"{no_of_games:>6}{len(latencies):>8}{len(latencies) / elapsed:>10.1f}{no_of_games / elapsed:>9.2f}"
+                  f"{p50:>9.1f}{p95:>9.1f}{p99:>9.1f}{max(latencies) * 1000:>9.1f}")
+    finally:
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+            game_server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency/throughput of server.py at increasing game counts")
+    parser.add_argument("--games", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--agent", default="agent_mcts")
+    parser.add_argument("--agent-args", nargs="*", default=["200"], help="JSON values passed to generate_move")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--unix", default=None)
+    parser.add_argument("--workers", type=int, default=None, help="workers of the in-process server")
+    cli_args = parser.parse_args()
+    for value in cli_args.agent_args:
+        json.loads(value)
+    asyncio.run(run_load(cli_args.games, cli_args.agent, cli_args.agent_args, cli_args.host, cli_args.port,
+                         cli_args.unix, cli_args.workers))
@@ -0,0 +1,332 @@
+"""
+Strength per time: how quickly each agent configuration finds the right move on a curated suite of positions.
+
+Every position of SUITE is given by the columns played from the empty board and the moves accepted as best:
+    win_in_1   the move that connects four
+    block      the only move that does not lose at once: blocking the opponent's only threat
+    win_in_2   the moves that force a win with the player's second move (the opponent cannot block everything)
+    win_in_3   the moves that force a win with the player's third move
+    endgame    positions with at most 14 empty cells solved exactly (agents.tablebase.Solver): the moves that keep
+               the best result, a win or (where the player cannot win) a draw
+    opening    the empty board, where the first player wins only by playing the centre (Allis 1988)
+The tactical positions were taken from seeded random games, their best moves are checked by a complete search of
+the given depth (see verify, run by the tests).
+
+For every configuration (agent, extra generate_move arguments) and every time budget each position is played once:
+the agent gets a fresh seeded state and a deadline of `budget` seconds. Reported per configuration and budget are
+the accuracy, overall and per category, and the mean CPU seconds per move. Per position the time to solution is the
+move time at the smallest budget from which on the agent always plays a best move, with the nodes (minimax) or
+iterations (MCTS) its search needed, so optimizations can be judged by solved positions per CPU second.
+
+    python -m benchmarks.strength [--budgets 0.05 0.2 1.0] [--category endgame] [--output strength.json]
+    python -m benchmarks.strength --config mcts=agent_mcts --config minimax_no_cache=agent_minimax:[null,0]
+"""
+import argparse
+import json
+import statistics
+import time
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from agents.common import BoardPiece, PLAYER1, PLAYER2, SavedState, initialize_game_state, apply_player_action
+from agents.metrics import InMemorySink, Metrics, set_metrics
+from agents.registry import load_agent
+from agents.bitboard import BOTTOMS, FULL, TOPS, connects_four, to_bitboards
+from agents.tablebase import LOSS, DRAW, WIN, Solver, set_tablebase
+
+WIN_IN_1 = "win_in_1"
+BLOCK = "block"
+WIN_IN_2 = "win_in_2"
+WIN_IN_3 = "win_in_3"
+ENDGAME = "endgame"
+OPENING = "opening"
+CATEGORIES = (WIN_IN_1, BLOCK, WIN_IN_2, WIN_IN_3, ENDGAME, OPENING)
+DEFAULT_BUDGETS = (0.05, 0.2, 1.0)
+
+
+class SuitePosition(NamedTuple):
+    name: str
+    category: str
+    moves: str  # columns played from the empty board
+    best: Tuple[int, ...]  # accepted moves
+
+
+class AgentConfig(NamedTuple):
+    name: str
+    agent: str  # name in agents.registry
+    args: tuple = ()
+
+
+DEFAULT_CONFIGS = [
+    AgentConfig("mcts", "agent_mcts"),
+    AgentConfig("minimax", "agent_minimax"),
+    AgentConfig("minimax_threats", "agent_minimax", (None, 100000, "threats")),
+]
+
+SUITE: List[SuitePosition] = [
+    SuitePosition("win1-a", WIN_IN_1, "15423563562", (4,)),
+    SuitePosition("win1-b", WIN_IN_1, "4355565322362", (4,)),
+    SuitePosition("win1-c", WIN_IN_1, "3566435022", (1,)),
+    SuitePosition("win1-d", WIN_IN_1, "453015114655", (2,)),
+    SuitePosition("win1-e", WIN_IN_1, "54252244330650", (1,)),
+    SuitePosition("win1-f", WIN_IN_1, "25524456151320615560600346224104", (3,)),
+    SuitePosition("win1-g", WIN_IN_1, "406033363141466400", (5,)),
+    SuitePosition("win1-h", WIN_IN_1, "00422340130546662653544", (3,)),
+    SuitePosition("block-a", BLOCK, "36524432245204", (4,)),
+    SuitePosition("block-b", BLOCK, "3123021050156", (4,)),
+    SuitePosition("block-c", BLOCK, "345630330346641166", (5,)),
+    SuitePosition("block-d", BLOCK, "15503240006544502", (3,)),
+    SuitePosition("block-e", BLOCK, "214132336", (5,)),
+    SuitePosition("block-f", BLOCK, "6130440", (5,)),
+    SuitePosition("block-g", BLOCK, "142533466", (0,)),
+    SuitePosition("block-h", BLOCK, "04216606362003", (6,)),
+    SuitePosition("win2-a", WIN_IN_2, "5666343161", (4,)),
+    SuitePosition("win2-b", WIN_IN_2, "153452001145524501600", (2,)),
+    SuitePosition("win2-c", WIN_IN_2, "543221532140", (2,)),
+    SuitePosition("win2-d", WIN_IN_2, "263630", (4,)),
+    SuitePosition("win2-e", WIN_IN_2, "301055", (4,)),
+    SuitePosition("win2-f", WIN_IN_2, "6463333", (2,)),
+    SuitePosition("win2-g", WIN_IN_2, "112616", (3,)),
+    SuitePosition("win2-h", WIN_IN_2, "025553665202254164300365", (6,)),
+    SuitePosition("win3-a", WIN_IN_3, "1654212660263312", (3,)),
+    SuitePosition("win3-b", WIN_IN_3, "5136130062145340346", (5,)),
+    SuitePosition("win3-c", WIN_IN_3, "2313233150016", (1, 2)),
+    SuitePosition("win3-d", WIN_IN_3, "316550666662115323", (3,)),
+    SuitePosition("win3-e", WIN_IN_3, "04032501201563", (2,)),
+    SuitePosition("win3-f", WIN_IN_3, "11646666035431225", (4,)),
+    SuitePosition("win3-g", WIN_IN_3, "41554225362555", (2, 3)),
+    SuitePosition("win3-h", WIN_IN_3, "200542416110266651062031", (3,)),
+    SuitePosition("end-a", ENDGAME, "064330114253006530106356216526", (1,)),
+    SuitePosition("end-b", ENDGAME, "2463613352260161662530151232", (5,)),
+    SuitePosition("end-c", ENDGAME, "22021324365056400154633035111", (2,)),
+    SuitePosition("end-d", ENDGAME, "666035026102504422121124154016", (5,)),
+    SuitePosition("end-e", ENDGAME, "034440261106344460361316605101", (2, 3)),
+    SuitePosition("end-f", ENDGAME, "2505013543504432306661162205", (3,)),
+    SuitePosition("end-g", ENDGAME, "450542604615366402165114456501", (0, 2)),
+    SuitePosition("end-h", ENDGAME, "4045040200123563505165613516", (1,)),
+    SuitePosition("end-i", ENDGAME, "5555255311144016044660000131", (2,)),
+    SuitePosition("end-j", ENDGAME, "054340130454350614321100416353", (5,)),
+    SuitePosition("end-k", ENDGAME, "342641034156660044565556422352", (3,)),
+    SuitePosition("opening-empty", OPENING, "", (3,)),
+]
+WIN_PLIES = {WIN_IN_1: 1, WIN_IN_2: 3, WIN_IN_3: 5}
+
+
+def position_board(position: SuitePosition) -> Tuple[np.ndarray, BoardPiece]:
+    """
+    Board of the position and the player to move
+    """
+    board = initialize_game_state()
+    player = PLAYER1
+    for col in position.moves:
+        apply_player_action(board, int(col), player)
+        player = PLAYER2 if player == PLAYER1 else PLAYER1
+    return board, player
+
+
+def children(current: int, mask: int) -> Iterator[Tuple[int, int, int]]:
+    """
+    Moves of the player to move (bitboards as agents.bitboard): (column, stones of the player after the move, occupied
+    squares after the move) for every column that is not full
+    """
+    for col in range(len(BOTTOMS)):
+        if not mask & TOPS[col]:
+            child_mask = mask | (mask + BOTTOMS[col])
+            yield col, current ^ mask ^ child_mask, child_mask
+
+
+def wins_within(current: int, mask: int, plies: int) -> bool:
+    """
+    True if the player to move (bitboards as agents.tablebase) can force a win within `plies` plies
+    """
+    if plies <= 0:
+        return False
+    if any(connects_four(mover) for _, mover, _ in children(current, mask)):
+        return True
+    return plies >= 3 and any(child_mask != FULL and not escapes(mover ^ child_mask, child_mask, plies - 1)
+                              for _, mover, child_mask in children(current, mask))
+
+
+def escapes(current: int, mask: int, plies: int) -> bool:
+    """
+    True if the player to move can avoid losing within `plies` plies
+    """
+    for _, mover, child_mask in children(current, mask):
+        if connects_four(mover) or child_mask == FULL or not wins_within(mover ^ child_mask, child_mask, plies - 1):
+            return True
+    return False
+
+
+def winning_moves(board: np.ndarray, plies: int) -> List[int]:
+    """
+    Moves that force a win within `plies` plies
+    """
+    current, mask = to_bitboards(board)
+    return [col for col, mover, child_mask in children(current, mask)
+            if connects_four(mover) or (plies >= 3 and child_mask != FULL
+                                        and not escapes(mover ^ child_mask, child_mask, plies - 1))]
+
+
+def solved_moves(board: np.ndarray) -> Tuple[int, List[int]]:
+    """
+    Exact result (WIN, DRAW, LOSS) of the position and the moves that keep it
+    """
+    solver = Solver()
+    current, mask = to_bitboards(board)
+    result, _, _ = solver.solve(current, mask)
+    moves = []
+    for col, mover, child_mask in children(current, mask):
+        if connects_four(mover):
+            move_result = WIN
+        elif child_mask == FULL:
+            move_result = DRAW
+        else:
+            move_result = 2 - solver.solve(mover ^ child_mask, child_mask)[0]
+        if move_result == result:
+            moves.append(col)
+    return result, moves
+
+
+def verify(position: SuitePosition) -> bool:
+    """
+    Checks the best moves of a position by a complete search (the opening is taken from the literature)
+    """
+    board, _ = position_board(position)
+    if position.category in WIN_PLIES:
+        plies = WIN_PLIES[position.category]
+        faster = winning_moves(board, plies - 2) if plies > 1 else []
+        return sorted(winning_moves(board, plies)) == sorted(position.best) and not faster
+    if position.category == BLOCK:
+        current, mask = to_bitboards(board)
+        safe = [col for col, mover, child_mask in children(current, mask)
+                if child_mask == FULL or not wins_within(mover ^ child_mask, child_mask, 1)]
+        return not winning_moves(board, 1) and sorted(safe) == sorted(position.best)
+    if position.category == ENDGAME:
+        result, moves = solved_moves(board)
+        return result != LOSS and sorted(moves) == sorted(position.best)
+    return position.moves == "" and position.best == (3,)
+
+
+def play_position(config: AgentConfig, board: np.ndarray, player: BoardPiece, budget: float, seed: int,
+                  sink: InMemorySink) -> Dict:
+    """
+    One move of the configuration with a deadline of `budget` seconds: the move, wall and CPU seconds and the nodes
+    or iterations of its search
+    """
+    generate_move, init = load_agent(config.agent)
+    saved_state = init(board.copy(), player, seed=seed)
+    del sink.events[:]
+    t0, cpu0 = time.perf_counter(), time.process_time()
+    action, saved_state = generate_move(board.copy(), player, saved_state, *config.args,
+                                        deadline=time.monotonic() + budget)
+    seconds, cpu_seconds = time.perf_counter() - t0, time.process_time() - cpu0
+    if isinstance(saved_state, SavedState):
+        saved_state.close()
+    work = sum(event.get("nodes", event.get("iterations", 0)) for event in sink.events if event["event"] == "search")
+    return dict(move=int(action), seconds=seconds, cpu_seconds=cpu_seconds, work=work)
+
+
+def run(configs: Sequence[AgentConfig], budgets: Sequence[float] = DEFAULT_BUDGETS,
+        positions: Sequence[SuitePosition] = tuple(SUITE), seed: int = 0, verbose: bool = True) -> Dict:
+    """
+    Plays every position with every configuration and budget and returns the raw results and the summary
+    """
+    budgets = sorted(budgets)
+    sink = InMemorySink()
+    previous_metrics = set_metrics(Metrics([sink]))
+    previous_tablebase = set_tablebase(None)  # the agents have to find the moves themselves
+    try:
+        results = {}
+        for config in configs:
+            results[config.name] = {}
+            for position in positions:
+                board, player = position_board(position)
+                moves = [play_position(config, board, player, budget, seed, sink) for budget in budgets]
+                for move in moves:
+                    move["correct"] = move["move"] in position.best
+                results[config.name][position.name] = moves
+            if verbose:
+                print_summary(config.name, summarize(results[config.name], budgets, positions))
+    finally:
+        set_metrics(previous_metrics)
+        set_tablebase(previous_tablebase)
+    return dict(budgets=budgets, results=results,
+                summary={name: summarize(result, budgets, positions) for name, result in results.items()})
+
+
+def time_to_solution(moves: List[Dict]) -> Optional[Dict]:
+    """
+    The move at the smallest budget from which on every move is correct, None if the largest budget fails
+    """
+    solution = None
+    for move in reversed(moves):
+        if not move["correct"]:
+            break
+        solution = move
+    return solution
+
+
+def summarize(results: Dict[str, List[Dict]], budgets: Sequence[float], positions: Sequence[SuitePosition]) -> Dict:
+    category = {position.name: position.category for position in positions}
+    per_budget = []
+    for index, budget in enumerate(budgets):
+        moves = {name: result[index] for name, result in results.items()}
+        categories = {}
+        for name, move in moves.items():
+            categories.setdefault(category[name], []).append(move["correct"])
+        per_budget.append(dict(
+            budget=budget,
+            accuracy=statistics.mean(move["correct"] for move in moves.values()),
+            categories={name: statistics.mean(correct) for name, correct in categories.items()},
+            cpu_seconds=statistics.mean(move["cpu_seconds"] for move in moves.values()),
+        ))
+    solutions = [solution for solution in map(time_to_solution, results.values()) if solution is not None]
+    return dict(
+        budgets=per_budget,
+        solved=len(solutions),
+        positions=len(results),
+        median_seconds_to_solution=statistics.median(s["seconds"] for s in solutions) if solutions else None,
+        median_work_to_solution=statistics.median(s["work"] for s in solutions) if solutions else None,
+    )
+
+
+def print_summary(name: str, summary: Dict):
+    print(f"{name}: {summary['solved']}/{summary['positions']} solved", end="")
+    if summary["solved"]:
+        print(f", median time to solution {summary['median_seconds_to_solution']:.3f} s, "
+              f"{summary['median_work_to_solution']:.0f} nodes/iterations")
+    else:
+        print()
+    for result in summary["budgets"]:
+        categories = " ".join(f"{category} {result['categories'][category]:.0%}" for category in CATEGORIES
+                              if category in result["categories"])
+        print(f"  {result['budget']:6.2f} s  accuracy {result['accuracy']:6.1%}  "
+              f"cpu {result['cpu_seconds']:.3f} s/move  {categories}")
+
+
+def parse_config(text: str) -> AgentConfig:
+    """
+    name=agent or name=agent:[JSON list of extra generate_move arguments]
+    """
+    name, _, spec = text.partition("=")
+    agent, _, args = spec.partition(":")
+    return AgentConfig(name, agent or name, tuple(json.loads(args)) if args else ())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Accuracy of agent configurations per time budget")
+    parser.add_argument("--config", type=parse_config, action="append", default=None,
+                        help="name=agent[:JSON args], repeatable, default: " +
+                             ", ".join(config.name for config in DEFAULT_CONFIGS))
+    parser.add_argument("--budgets", type=float, nargs="+", default=list(DEFAULT_BUDGETS), help="seconds per move")
+    parser.add_argument("--category", choices=CATEGORIES, action="append", default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON file for the results")
+    cli_args = parser.parse_args()
+    cli_positions = [position for position in SUITE if cli_args.category is None or
+                     position.category in cli_args.category]
+    cli_results = run(cli_args.config or DEFAULT_CONFIGS, cli_args.budgets, cli_positions, cli_args.seed)
+    if cli_args.output:
+        with open(cli_args.output, "w") as output_file:
+            json.dump(cli_results, output_file, indent=2)
@@ -0,0 +1,182 @@
+"""
+Microbenchmarks of the board primitives and both agents on a fixed set of positions, with a regression gate.
+
+Every benchmark runs one operation over a fixed position set (the POSITIONS of benchmarks.positions and positions
+sampled by benchmarks.positions.sample_positions with a fixed seed; the agents search with seeded
+RNGs) and reports the time per call: the median and minimum over `repeats` timings of a number of loops calibrated to
+take at least `min_seconds`.
+
+    python -m benchmarks.suite run --output bench.json [--filter minimax] [--repeats 5]
+    python -m benchmarks.suite compare baseline.json bench.json [--threshold 0.25]
+    python -m benchmarks.suite run --output bench.json --baseline baseline.json
+
+compare (and run with --baseline) prints the change of every benchmark and exits with status 1 if any median time
+grew by more than the threshold (a fraction, 0.25 = 25% slower) or if a benchmark of the baseline is missing.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from agents.agent_mcts.mcts import mcts
+from agents.agent_minimax.minimax import minimax_with_alpha_beta_pruning, score_action
+from agents.common import BoardPiece, apply_player_action, get_valid_actions, connected_four, check_end_state
+from agents.rng import AgentRNG
+from benchmarks.positions import POSITIONS, sample_positions
+
+Position = Tuple[np.ndarray, BoardPiece]
+DEFAULT_THRESHOLD = 0.25
+
+
+def search_positions() -> List[Position]:
+    return [(board.copy(), player) for board, player in POSITIONS.values()]
+
+
+def primitive_positions() -> List[Position]:
+    return search_positions() + sample_positions(29, seed=0)
+
+
+def over_positions(operation: Callable[[np.ndarray, BoardPiece, int], object], positions: List[Position]) \
+        -> Callable[[], None]:
+    def run():
+        for index, (board, player) in enumerate(positions):
+            operation(board, player, index)
+    return run
+
+
+def benchmarks() -> Dict[str, Tuple[Callable[[], None], int]]:
+    """
+    name -> (function running the benchmark over its positions, number of calls per run)
+    """
+    primitives = primitive_positions()
+    searches = search_positions()
+    columns = [int(get_valid_actions(board)[0]) for board, _ in primitives]
+    suite = {
+        "apply_player_action": lambda board, player, i: apply_player_action(board, columns[i], player, True),
+        "get_valid_actions": lambda board, player, i: get_valid_actions(board),
+        "connected_four": lambda board, player, i: connected_four(board, player),
+        "check_end_state": lambda board, player, i: check_end_state(board, player),
+        "score_action": lambda board, player, i: score_action(board, player),
+    }
+    result = {name: (over_positions(operation, primitives), len(primitives)) for name, operation in suite.items()}
+    for depth in (2, 4):
+        result[f"minimax_depth_{depth}"] = (over_positions(
+            lambda board, player, i, depth=depth: minimax_with_alpha_beta_pruning(
+                board, depth, -np.inf, np.inf, player, AgentRNG(i)), searches), len(searches))
+    for iterations in (100, 500):
+        result[f"mcts_{iterations}_iterations"] = (over_positions(
+            lambda board, player, i, iterations=iterations: mcts(board, iterations, player, rng=AgentRNG(i)),
+            searches), len(searches))
+    return result
+
+
+def time_benchmark(run: Callable[[], None], calls: int, repeats: int = 5, min_seconds: float = 0.2) -> Dict:
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            run()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_seconds or loops >= 1 << 20:
+            break
+        loops *= 2 if elapsed == 0 else max(2, min(10, int(min_seconds / elapsed) + 1))
+    timings = [elapsed]
+    for _ in range(repeats - 1):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            run()
+        timings.append(time.perf_counter() - t0)
+    per_call = [timing / (loops * calls) for timing in timings]
+    return dict(median=statistics.median(per_call), min=min(per_call), repeats=repeats, loops=loops, calls=calls)
+
+
+def run_suite(name_filter: Optional[str] = None, repeats: int = 5, min_seconds: float = 0.2,
+              verbose: bool = True) -> Dict:
+    results = {}
+    for name, (run, calls) in benchmarks().items():
+        if name_filter and name_filter not in name:
+            continue
+        results[name] = time_benchmark(run, calls, repeats, min_seconds)
+        if verbose:
+            print(f"{name:26s} {format_seconds(results[name]['median']):>10s}  "
+                  f"(min {format_seconds(results[name]['min'])})")
+    return dict(
+        meta=dict(python=platform.python_version(), numpy=np.__version__, machine=platform.machine(),
+                  platform=platform.platform(), time=time.strftime("%Y-%m-%dT%H:%M:%S")),
+        benchmarks=results,
+    )
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = DEFAULT_THRESHOLD, verbose: bool = True) -> List[str]:
+    """
+    Returns the names of the benchmarks of `baseline` which regressed by more than `threshold` or are missing
+    """
+    failures = []
+    for name, base in baseline["benchmarks"].items():
+        result = current["benchmarks"].get(name)
+        if result is None:
+            failures.append(name)
+            if verbose:
+                print(f"{name:26s} missing")
+            continue
+        change = result["median"] / base["median"] - 1
+        regressed = change > threshold
+        if regressed:
+            failures.append(name)
+        if verbose:
+            print(f"{name:26s} {format_seconds(base['median']):>10s} -> {format_seconds(result['median']):>10s} "
+                  f"{change:+7.1%}{'  REGRESSION' if regressed else ''}")
+    return failures
+
+
+def format_seconds(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3f} {unit}"
+    return f"{seconds / 1e-9:.1f} ns"
+
+
+def load(path: str) -> Dict:
+    with open(path) as file:
+        return json.load(file)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmarks with a regression gate")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--output", default=None, help="JSON file for the results")
+    run_parser.add_argument("--filter", default=None, help="only run benchmarks whose name contains this")
+    run_parser.add_argument("--repeats", type=int, default=5)
+    run_parser.add_argument("--min-seconds", type=float, default=0.2, help="minimum duration of one timing")
+    run_parser.add_argument("--baseline", default=None, help="compare against this JSON file afterwards")
+    run_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    cli_args = parser.parse_args()
+
+    if cli_args.command == "run":
+        current_results = run_suite(cli_args.filter, cli_args.repeats, cli_args.min_seconds)
+        if cli_args.output:
+            with open(cli_args.output, "w") as output_file:
+                json.dump(current_results, output_file, indent=2)
+        baseline_path = cli_args.baseline
+    else:
+        current_results = load(cli_args.current)
+        baseline_path = cli_args.baseline
+    if baseline_path:
+        baseline_results = load(baseline_path)
+        if cli_args.command == "run" and cli_args.filter:
+            baseline_results["benchmarks"] = {name: result for name, result in baseline_results["benchmarks"].items()
+                                              if cli_args.filter in name}
+        regressions = compare(baseline_results, current_results, cli_args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {cli_args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
@@ -1,62 +1,271 @@
+import inspect
+import os
+import queue
+import sys
+import threading
+import time
 import numpy as np
-from typing import Optional, Callable
+from typing import Optional, Callable, Tuple, List, TextIO
 from agents.common import PlayerAction, BoardPiece, SavedState, GenMove
-# from agents.agent_minimax import generate_move
-from agents.agent_mcts import generate_move
 
 
-def user_move(board: np.ndarray, _player: BoardPiece, saved_state: Optional[SavedState]):
+DEBUG_BOARDS_VARIABLE = "CONNECT4_DEBUG_BOARDS"
+
+
+class LineReader:
+    """
+    Reads the lines of a stream in a daemon thread, so they can be waited for with a timeout (select does not work on
+    the Windows console). The thread lives as long as the stream: a line typed after a timeout is kept for the next
+    call instead of being read by a thread nobody waits for. At the end of the stream read_line raises EOFError, as
+    input() does
+    """
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+        self.lines = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        try:
+            for line in iter(self.stream.readline, ""):
+                self.lines.put(line.rstrip("\r\n"))
+        except (OSError, ValueError):  # the stream was closed
+            pass
+        self.lines.put(None)
+
+    def read_line(self, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Returns the next line, or None if there was none within `timeout` seconds (without a timeout it waits)
+        """
+        while True:
+            try:
+                # without a timeout, waiting in slices keeps Ctrl+C working (a lock wait is not interrupted on Windows)
+                line = self.lines.get(timeout=1.0 if timeout is None else max(0.0, timeout))
+                break
+            except queue.Empty:
+                if timeout is not None:
+                    return None
+        if line is None:
+            self.lines.put(None)  # for the next call
+            raise EOFError("end of the input stream")
+        return line
+
+
+_stdin_reader: Optional[LineReader] = None
+
+
+def read_line(deadline: Optional[float] = None) -> Optional[str]:
+    """
+    Reads a line from stdin, or returns None if none was typed by `deadline` (a time.monotonic() value), see LineReader.
+    All the reads of stdin go through the reader, a direct input() would compete with its thread for the lines
+    """
+    global _stdin_reader
+    if _stdin_reader is None or _stdin_reader.stream is not sys.stdin:
+        _stdin_reader = LineReader(sys.stdin)
+    return _stdin_reader.read_line(None if deadline is None else deadline - time.monotonic())
+
+
+def user_move(board: np.ndarray, _player: BoardPiece, saved_state: Optional[SavedState],
+              deadline: Optional[float] = None):
+    """
+    Asks the user for a column. With a `deadline` (under a time control) a user who has not answered by the deadline
+    gets the fallback move, a line typed later is read for the next move (see read_line)
+    """
     action = PlayerAction(-1)
     while not 0 <= action < board.shape[1]:
+        print("Column? ", end="", flush=True)
+        answer = read_line(deadline)
+        if answer is None:
+            print()
+            return fallback_move(board), saved_state
         try:
-            action = PlayerAction(input("Column? "))
+            action = PlayerAction(answer)
         except ValueError:
             print("Input could not be converted to the dtype PlayerAction, try entering an integer.")
     return action, saved_state
 
 
-def human_vs_agent(
+class TimeControl:
+    """
+    Per-move time control: every move may take `move_seconds`, plus the player's reserve. The reserve grows by
+    `increment` after every move and shrinks by the time a move used beyond `move_seconds`. An agent still thinking
+    `grace` seconds after its time ran out is cut off and a fallback move is played for it.
+    """
+    def __init__(self, move_seconds: float, increment: float = 0.0, grace: float = 0.1):
+        self.move_seconds = move_seconds
+        self.increment = increment
+        self.grace = grace
+
+    def allowed(self, reserve: float) -> float:
+        return self.move_seconds + reserve
+
+    def update_reserve(self, reserve: float, move_time: float) -> float:
+        return max(0.0, reserve + self.increment - max(0.0, move_time - self.move_seconds))
+
+
+def debug_boards() -> bool:
+    """
+    Returns True if the CONNECT4_DEBUG_BOARDS environment variable is set (to anything but "" or "0"). The harness then
+    locks the game board while an agent moves, so an agent writing to the board it was lent fails at the write, even
+    through a view it made writeable again
+    """
+    return os.environ.get(DEBUG_BOARDS_VARIABLE, "") not in ("", "0")
+
+
+def accepts_deadline(gen_move: Callable) -> bool:
+    """
+    Returns True if the move generator takes a `deadline` keyword argument
+    """
+    try:
+        return "deadline" in inspect.signature(gen_move).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def fallback_move(board: np.ndarray) -> PlayerAction:
+    """
+    Move played for an agent that ran out of time: the valid column closest to the centre
+    """
+    from agents.common import get_valid_actions
+
+    valid_actions = get_valid_actions(board)
+    centre = (board.shape[1] - 1) / 2
+    return PlayerAction(min(valid_actions, key=lambda action: abs(action - centre)))
+
+
+def generate_move_with_time_limit(
+    gen_move: GenMove, board: np.ndarray, player: BoardPiece, saved_state: Optional[SavedState], args: tuple,
+    seconds: float, grace: float, init: Callable = lambda board, player: None,
+) -> Tuple[PlayerAction, Optional[SavedState], bool]:
+    """
+    Calls the move generator in a thread and waits at most `seconds` + `grace` for it. Generators accepting a
+    `deadline` get the time.monotonic() value at which their time runs out.
+    A generator that overruns has its result dropped: the fallback move is played. It is given another `grace` seconds
+    to stop, which a generator with a deadline does at its next check of the deadline, so that it does not take CPU
+    time from the next move. A generator without a deadline cannot be stopped, it is left running in its (daemon)
+    thread. The saved state it was given is dropped too, since the generator keeps changing it, and the agent goes on
+    with a new one from `init`. The dropped state is closed when the generator finishes.
+    :return: tuple
+             action, saved state and whether the generator overran
+    """
+    kwargs = dict(deadline=time.monotonic() + seconds) if accepts_deadline(gen_move) else {}
+    outcome = []
+    abandoned = []
+    lock = threading.Lock()
+
+    def run():
+        try:
+            result = (True, gen_move(board, player, saved_state, *args, **kwargs))
+        except BaseException as error:
+            result = (False, error)
+        with lock:
+            if not abandoned:
+                outcome.append(result)
+                return
+        succeeded, value = result
+        state = value[1] if succeeded else saved_state
+        if isinstance(state, SavedState):
+            state.close()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(seconds + grace)
+    with lock:
+        if not outcome:
+            abandoned.append(True)
+    if abandoned:
+        thread.join(grace)
+        return fallback_move(board), init(board, player), True
+    succeeded, result = outcome[0]
+    if not succeeded:
+        raise result
+    return result[0], result[1], False
+
+
+def play_game(
     generate_move_1: GenMove,
-    generate_move_2: GenMove = user_move,
+    generate_move_2: GenMove,
     player_1: str = "Player 1",
     player_2: str = "Player 2",
     args_1: tuple = (),
     args_2: tuple = (),
     init_1: Callable = lambda board, player: None,
     init_2: Callable = lambda board, player: None,
-):
-    import time
-    from agents.common import PLAYER1, PLAYER2, PLAYER1_PRINT, PLAYER2_PRINT, GameState
+    verbose: bool = True,
+    time_control: Optional[TimeControl] = None,
+) -> Tuple[BoardPiece, List[Tuple[PlayerAction, float]]]:
+    """
+    Plays one game, generate_move_1 moving first (as PLAYER1). init_1/init_2 are called at the start of the game and
+    may return the initial saved state of the agent (e.g. a seeded random number generator, see
+    agents.common.init_saved_state). With verbose=False nothing is printed. Move times are reported to the metrics
+    registry (agents.metrics). With a time_control the moves are generated under its deadlines (see
+    generate_move_with_time_limit), an agent that overran starts over from a new saved state from its init.
+    The agents are lent the board as a read-only view (agents.common.read_only_view), not a copy. Under a time_control
+    they get a read-only copy instead, since a generator that overran keeps running while the game goes on. With
+    CONNECT4_DEBUG_BOARDS set the board is locked while an agent moves (see debug_boards).
+    :return: tuple
+             the winner (NO_PLAYER for a draw) and the played (action, move time in seconds) pairs
+    """
+    from agents.common import PLAYER1, PLAYER2, PLAYER1_PRINT, PLAYER2_PRINT, NO_PLAYER, GameState
     from agents.common import initialize_game_state, pretty_print_board, apply_player_action, check_end_state
+    from agents.common import read_only_view
+    from agents.metrics import get_metrics
+
+    metrics = get_metrics()
+    debug = debug_boards()
 
     players = (PLAYER1, PLAYER2)
-    for play_first in (1, -1):
-        for init, player in zip((init_1, init_2)[::play_first], players):
-            init(initialize_game_state(), player)
-
-        saved_state = {PLAYER1: None, PLAYER2: None}
-        board = initialize_game_state()
-        gen_moves = (generate_move_1, generate_move_2)[::play_first]
-        player_names = (player_1, player_2)[::play_first]
-        gen_args = (args_1, args_2)[::play_first]
-
-        playing = True
-        while playing:
-            for player, player_name, gen_move, args in zip(
-                players, player_names, gen_moves, gen_args,
-            ):
-                t0 = time.time()
+    saved_state = {PLAYER1: None, PLAYER2: None}
+    for init, player in zip((init_1, init_2), players):
+        saved_state[player] = init(initialize_game_state(), player)
+
+    board = initialize_game_state()
+    moves = []
+    reserve = {PLAYER1: 0.0, PLAYER2: 0.0}
+    while True:
+        for player, player_name, gen_move, args, init in zip(
+            players, (player_1, player_2), (generate_move_1, generate_move_2), (args_1, args_2), (init_1, init_2),
+        ):
+            if verbose:
                 print(pretty_print_board(board))
                 print(
                     f'{player_name} you are playing with {PLAYER1_PRINT if player == PLAYER1 else PLAYER2_PRINT}'
                 )
-                action, saved_state[player] = gen_move(
-                    board.copy(), player, saved_state[player], *args
+            t0 = time.perf_counter()
+            if time_control is None:
+                try:
+                    action, saved_state[player] = gen_move(
+                        read_only_view(board, lock=debug), player, saved_state[player], *args
+                    )
+                finally:
+                    board.flags.writeable = True
+                overran = False
+            else:
+                action, saved_state[player], overran = generate_move_with_time_limit(
+                    gen_move, read_only_view(board.copy(), lock=debug), player, saved_state[player], args,
+                    time_control.allowed(reserve[player]), time_control.grace, init,
                 )
-                print(f"Move time: {time.time() - t0:.3f}s")
-                apply_player_action(board, action, player)
-                end_state = check_end_state(board, player)
-                if end_state != GameState.STILL_PLAYING:
+            move_time = time.perf_counter() - t0
+            if time_control is not None:
+                reserve[player] = time_control.update_reserve(reserve[player], move_time)
+            moves.append((PlayerAction(action), move_time))
+            metrics.observe("move_seconds", move_time, agent=player_name)
+            if overran:
+                metrics.increment("overruns", agent=player_name)
+            if verbose:
+                print(f"Move time: {move_time:.3f}s")
+                if overran:
+                    print(f"{player_name} ran out of time, playing column {action}")
+            apply_player_action(board, action, player)
+            end_state = check_end_state(board, player)
+            if end_state != GameState.STILL_PLAYING:
+                for state in saved_state.values():
+                    if isinstance(state, SavedState):
+                        state.close()
+                metrics.increment("games", result="draw" if end_state == GameState.IS_DRAW else "win")
+                metrics.event("game", players=[player_1, player_2], moves=len(moves),
+                              winner=None if end_state == GameState.IS_DRAW else player_name)
+                if verbose:
                     print(pretty_print_board(board))
                     if end_state == GameState.IS_DRAW:
                         print("Game ended in draw")
@@ -64,9 +273,39 @@ def human_vs_agent(
                         print(
                             f'{player_name} won playing {PLAYER1_PRINT if player == PLAYER1 else PLAYER2_PRINT}'
                         )
-                    playing = False
-                    break
+                return (NO_PLAYER if end_state == GameState.IS_DRAW else player), moves
+
+
+def human_vs_agent(
+    generate_move_1: GenMove,
+    generate_move_2: GenMove = user_move,
+    player_1: str = "Player 1",
+    player_2: str = "Player 2",
+    args_1: tuple = (),
+    args_2: tuple = (),
+    init_1: Callable = lambda board, player: None,
+    init_2: Callable = lambda board, player: None,
+    time_control: Optional[TimeControl] = None,
+):
+    """
+    Plays two games, each player starting once (see play_game). Agents that ponder (agent_mcts with ponder=True) keep
+    searching in a thread during the other player's turn, only let them ponder against user_move: an agent opponent
+    in the same process would lose CPU time to that thread
+    """
+    for play_first in (1, -1):
+        play_game(
+            *(generate_move_1, generate_move_2)[::play_first],
+            *(player_1, player_2)[::play_first],
+            *(args_1, args_2)[::play_first],
+            *(init_1, init_2)[::play_first],
+            time_control=time_control,
+        )
 
 
 if __name__ == "__main__":
-    human_vs_agent(generate_move)
+    from agents.registry import load_agent
+
+    from functools import partial
+
+    # the agent thinks during the user's turn, see agents.agent_mcts.ponder
+    human_vs_agent(partial(load_agent("agent_mcts").generate_move, ponder=True))
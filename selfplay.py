@@ -0,0 +1,245 @@
+"""
+Self-play dataset generator.
+
+Plays games on a process pool, either between two agents (packages in `agents`, used through the GenMove contract
+exactly like tournament.py does) or as fast random playouts that bypass the agents entirely, and streams one record
+per position (POSITION_DTYPE: board, side to move, chosen move, outcome for the side to move as +1/0/-1 and the
+position key of agents.common.position_keys) into chunked .npy files in <output>:
+
+    <output>/chunk_00000.npy, chunk_00001.npy, ...   structured arrays, open them with load_chunks (memory-mapped)
+    <output>/manifest.json                            settings, finished games and chunk list
+
+Memory stays bounded by --chunk-size: finished games are buffered until a chunk is full, which is then written
+(atomically) and recorded in the manifest together with the number of games it covers. With deduplication (the
+default) only the first occurrence of every position is kept. Running the same command again resumes after the last
+written chunk, the games are seeded by their number so a resumed run produces the same data as an uninterrupted one.
+
+    python selfplay.py --games 100000 --output dataset
+    python selfplay.py --agents agent_mcts agent_minimax --args-1 "[200]" --games 1000 --output mcts_minimax
+"""
+import argparse
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from agents.common import BoardPiece, PlayerAction, NO_PLAYER, PLAYER1, PLAYER2, initialize_game_state, \
+    is_winning_action, position_keys
+from agents.game_record import ROWS, COLUMNS, replay_positions
+from agents.rng import AgentRNG
+
+PLAYOUT = "playout"
+POSITION_DTYPE = np.dtype([
+    ("board", BoardPiece, (ROWS, COLUMNS)),
+    ("player", BoardPiece),
+    ("move", np.uint8),
+    ("outcome", np.int8),
+    ("key", np.uint64),
+])
+MANIFEST = "manifest.json"
+
+
+def random_playout(rng: AgentRNG) -> Tuple[List[PlayerAction], BoardPiece]:
+    """
+    Plays a game of uniformly random moves and returns its moves and winner (NO_PLAYER for a draw)
+    """
+    board = initialize_game_state()
+    heights = [0] * COLUMNS
+    free = list(range(COLUMNS))
+    player, moves = PLAYER1, []
+    while free:
+        action = free[rng.randint(len(free))]
+        moves.append(action)
+        if is_winning_action(board, action, player):
+            return moves, player
+        board[heights[action], action] = player
+        heights[action] += 1
+        if heights[action] == ROWS:
+            free.remove(action)
+        player = PLAYER2 if player == PLAYER1 else PLAYER1
+    return moves, NO_PLAYER
+
+
+def game_positions(moves: Sequence[PlayerAction], winner: BoardPiece) -> np.ndarray:
+    """
+    One record per move of a game: the board before the move, the side to move, the move and the game's outcome
+    """
+    n = len(moves)
+    records = np.empty(n, dtype=POSITION_DTYPE)
+    records["board"] = replay_positions(moves)[:n]
+    records["player"] = np.where(np.arange(n) % 2 == 0, PLAYER1, PLAYER2)
+    records["move"] = moves
+    records["outcome"] = 0 if winner == NO_PLAYER else np.where(records["player"] == winner, 1, -1)
+    records["key"] = position_keys(records["board"])
+    return records
+
+
+def play_batch(first_game: int, no_of_games: int, agents: Tuple[str, str], args: Tuple[tuple, tuple],
+               seed: int) -> np.ndarray:
+    """
+    Plays games first_game, ..., first_game + no_of_games - 1 in a worker process and returns their positions
+    """
+    batch = []
+    if agents == (PLAYOUT, PLAYOUT):
+        for game in range(first_game, first_game + no_of_games):
+            batch.append(game_positions(*random_playout(AgentRNG(seed + game))))
+    else:
+        from main import play_game
+        from agents.registry import load_agent
+
+        (generate_move_1, init_1), (generate_move_2, init_2) = map(load_agent, agents)
+        for game in range(first_game, first_game + no_of_games):
+            game_seed = seed + 2 * game
+            players = [
+                (generate_move_1, agents[0], args[0], partial(init_1, seed=game_seed)),
+                (generate_move_2, agents[1], args[1], partial(init_2, seed=game_seed + 1)),
+            ]
+            (gen_move_1, name_1, args_1, seeded_init_1), (gen_move_2, name_2, args_2, seeded_init_2) = \
+                players if game % 2 == 0 else players[::-1]
+            winner, moves = play_game(gen_move_1, gen_move_2, name_1, name_2, args_1, args_2,
+                                      seeded_init_1, seeded_init_2, verbose=False)
+            batch.append(game_positions([action for action, _ in moves], winner))
+    return np.concatenate(batch) if batch else np.empty(0, dtype=POSITION_DTYPE)
+
+
+class DatasetWriter(object):
+    """
+    Buffers position records, drops already seen positions and writes full chunks to `output`
+    """
+
+    def __init__(self, output: str, settings: Dict, chunk_size: int, dedup: bool = True):
+        self.output = output
+        self.chunk_size = chunk_size
+        self.dedup = dedup
+        self.manifest = read_manifest(output)
+        if self.manifest is None:
+            self.manifest = dict(settings, games=0, positions=0, chunks=[])
+        elif any(self.manifest.get(name) != value for name, value in settings.items()):
+            raise ValueError(f"{output} holds a dataset generated with different settings, use a new output")
+        self.buffer: List[np.ndarray] = []
+        self.buffered = 0
+        self.buffer_keys = set()
+        self.pending_games = self.manifest["games"]
+        self.seen = np.empty(0, dtype=np.uint64)
+        if dedup:
+            self.seen = np.sort(np.concatenate([chunk["key"] for chunk in load_chunks(output)]
+                                               or [np.empty(0, dtype=np.uint64)]))
+
+    @property
+    def games(self) -> int:
+        return self.manifest["games"]
+
+    def add(self, records: np.ndarray, games: int) -> None:
+        """
+        Adds the positions of all games up to number `games` (exclusive)
+        """
+        if self.dedup:
+            _, first = np.unique(records["key"], return_index=True)
+            records = records[np.sort(first)]
+            index = np.minimum(np.searchsorted(self.seen, records["key"]), max(len(self.seen) - 1, 0))
+            new = (self.seen[index] != records["key"]) if len(self.seen) else np.ones(len(records), dtype=bool)
+            new &= np.array([key not in self.buffer_keys for key in records["key"].tolist()], dtype=bool)
+            records = records[new]
+            self.buffer_keys.update(records["key"].tolist())
+        self.buffer.append(records)
+        self.buffered += len(records)
+        self.pending_games = games
+        if self.buffered >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.buffer:
+            return
+        records = np.concatenate(self.buffer)
+        if len(records):
+            name = f"chunk_{len(self.manifest['chunks']):05d}.npy"
+            path = os.path.join(self.output, name)
+            with open(path + ".tmp", "wb") as chunk_file:
+                np.save(chunk_file, records)
+            os.replace(path + ".tmp", path)
+            self.manifest["chunks"].append(name)
+            self.manifest["positions"] += len(records)
+        self.manifest["games"] = self.pending_games
+        write_manifest(self.output, self.manifest)
+        if self.dedup:
+            self.seen = np.sort(np.concatenate([self.seen, records["key"]]))
+        self.buffer, self.buffered, self.buffer_keys = [], 0, set()
+
+
+def read_manifest(output: str) -> Optional[Dict]:
+    path = os.path.join(output, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as manifest_file:
+        return json.load(manifest_file)
+
+
+def write_manifest(output: str, manifest: Dict) -> None:
+    path = os.path.join(output, MANIFEST)
+    with open(path + ".tmp", "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def load_chunks(output: str) -> List[np.ndarray]:
+    """
+    Memory-maps the chunks of the dataset in `output` (in the order they were written)
+    """
+    manifest = read_manifest(output)
+    if manifest is None:
+        return []
+    return [np.load(os.path.join(output, name), mmap_mode="r") for name in manifest["chunks"]]
+
+
+def generate_dataset(output: str, no_of_games: int, agents: Tuple[str, str] = (PLAYOUT, PLAYOUT),
+                     args: Tuple[tuple, tuple] = ((), ()), processes: Optional[int] = None, seed: int = 0,
+                     chunk_size: int = 100_000, games_per_task: int = 100, dedup: bool = True) -> Dict:
+    """
+    Generates (or resumes generating) the positions of `no_of_games` self-play games into `output` and returns the
+    manifest. At most two tasks of `games_per_task` games per worker are in flight, so results never pile up
+    """
+    if (PLAYOUT in agents) and agents != (PLAYOUT, PLAYOUT):
+        raise ValueError(f"{PLAYOUT} can only play against itself, use agent_random for random moves against an agent")
+    os.makedirs(output, exist_ok=True)
+    settings = dict(agents=list(agents), args=[list(args[0]), list(args[1])], seed=seed, dedup=dedup)
+    writer = DatasetWriter(output, settings, chunk_size, dedup)
+    workers = processes or os.cpu_count() or 1
+    next_game = writer.games
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        while pending or next_game < no_of_games:
+            while next_game < no_of_games and len(pending) < 2 * workers:
+                n = min(games_per_task, no_of_games - next_game)
+                pending.append((next_game + n, executor.submit(
+                    play_batch, next_game, n, tuple(agents), (tuple(args[0]), tuple(args[1])), seed)))
+                next_game += n
+            games, future = pending.popleft()
+            writer.add(future.result(), games)
+    writer.flush()
+    return writer.manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a dataset of self-play positions")
+    parser.add_argument("--agents", nargs=2, default=[PLAYOUT, PLAYOUT],
+                        help=f"package names of the two agents in agents, default: random {PLAYOUT}s")
+    parser.add_argument("--args-1", type=json.loads, default=[], help="JSON list of extra generate_move arguments")
+    parser.add_argument("--args-2", type=json.loads, default=[], help="JSON list of extra generate_move arguments")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="positions per chunk file")
+    parser.add_argument("--games-per-task", type=int, default=100)
+    parser.add_argument("--no-dedup", action="store_true", help="keep repeated positions")
+    parser.add_argument("--output", default="dataset")
+    cli_args = parser.parse_args()
+    manifest = generate_dataset(
+        cli_args.output, cli_args.games, tuple(cli_args.agents), (cli_args.args_1, cli_args.args_2),
+        cli_args.processes, cli_args.seed, cli_args.chunk_size, cli_args.games_per_task, not cli_args.no_dedup,
+    )
+    print(f"{manifest['games']} games, {manifest['positions']} positions in {len(manifest['chunks'])} chunks "
+          f"in {cli_args.output}")
@@ -0,0 +1,303 @@
+"""
+Asyncio game server hosting many concurrent games of a client against an agent.
+
+Every connection plays one game at a time over a line protocol (UTF-8, one command per line):
+
+    client -> server
+        NEW <agent> <first|second> [seed [args ...]]   start a game against the agent package agents.<agent>, the
+                                                       client moves first or second; args are JSON values passed to
+                                                       the agent's generate_move
+        PLAY <column>                                  play a move
+        QUIT                                           close the connection
+    server -> client
+        GAME <id>                                      game started
+        MOVE <column> <seconds>                        move of the agent and the time it took to compute it
+        END <WIN|LOSS|DRAW>                            game over, seen from the client
+        ERROR <message>                                invalid command or move, the game (if any) continues; if
+                                                       the agent failed to move the game is abandoned
+
+Agent moves are computed on a bounded process pool, so a long MCTS search never blocks the event loop or the other
+sessions. At most `max_pending` moves are queued at once, further requests wait for a free slot. The saved state of
+the agent travels to a worker and back with every move, so configurations whose state cannot be pickled (pondering,
+which keeps a thread in it) are refused by NEW. Caches and free lists in the state (the minimax evaluation cache, the
+recycled nodes of an MCTS node budget) are dropped when it is pickled, only what the next move needs is sent.
+
+With --metrics-jsonl and/or --prometheus the server reports move latency (queueing included), compute time, games
+and active sessions (see agents.metrics), flushed every --metrics-interval seconds.
+
+    python server.py --port 4000 --workers 4
+    python server.py --unix /tmp/connect4.sock
+"""
+import argparse
+import asyncio
+import inspect
+import itertools
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+import numpy as np
+
+from agents.common import BoardPiece, PlayerAction, SavedState, PLAYER1, PLAYER2, GameState, initialize_game_state, \
+    apply_player_action, check_end_state, is_action_valid, get_opponent, read_only_view
+from agents.metrics import get_metrics, set_metrics, Metrics, JsonLinesSink, PrometheusTextFileSink
+from agents.registry import load_agent
+
+
+def compute_move(agent: str, board: np.ndarray, player: BoardPiece, saved_state: Optional[SavedState], args: tuple) \
+        -> Tuple[PlayerAction, Optional[SavedState], float]:
+    """
+    Runs the agent's generate_move in a worker process, on a read-only view of the board sent to the worker
+    """
+    generate_move, _ = load_agent(agent)
+    t0 = time.perf_counter()
+    action, saved_state = generate_move(read_only_view(board), player, saved_state, *args)
+    seconds = time.perf_counter() - t0
+    if not (0 <= action < board.shape[1] and is_action_valid(board, PlayerAction(action))):
+        raise ValueError(f"invalid column {action}")
+    return PlayerAction(action), saved_state, seconds
+
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[bytes]:
+    """
+    Reads the next line of the client (empty at the end of the stream), or skips a line longer than the stream limit
+    and returns None
+    """
+    try:
+        return await reader.readuntil(b"\n")
+    except asyncio.IncompleteReadError as error:
+        return error.partial
+    except asyncio.LimitOverrunError as error:
+        consumed = error.consumed
+    try:
+        while True:
+            await reader.readexactly(consumed)
+            try:
+                await reader.readuntil(b"\n")
+                return None
+            except asyncio.LimitOverrunError as error:
+                consumed = error.consumed
+    except asyncio.IncompleteReadError:
+        return b""
+
+
+class AgentError(Exception):
+    """
+    The agent of a session failed to move: it raised, returned an invalid column or its state could not be sent
+    """
+
+
+def check_configuration(generate_move, args: tuple, saved_state: Optional[SavedState]) -> None:
+    """
+    Raises ValueError if the arguments do not fit generate_move, ask for pondering or cannot be sent to a worker with
+    the saved state
+    """
+    try:
+        arguments = inspect.signature(generate_move).bind(None, None, None, *args).arguments
+    except TypeError as error:
+        raise ValueError(f"invalid agent arguments: {error}")
+    except ValueError:  # no signature, the call itself checks the arguments
+        arguments = {}
+    if arguments.get("ponder"):
+        raise ValueError("pondering keeps a thread in the saved state, it cannot move between worker processes")
+    try:
+        pickle.dumps((args, saved_state))
+    except (pickle.PicklingError, TypeError, AttributeError) as error:
+        raise ValueError(f"the agent state cannot be sent to a worker: {error}")
+
+
+class GameSession(object):
+    """
+    One game between a client and an agent
+    """
+
+    def __init__(self, game_id: int, agent: str, client_player: BoardPiece, seed: Optional[int], args: tuple):
+        generate_move, init = load_agent(agent)
+        self.game_id = game_id
+        self.agent = agent
+        self.client_player = client_player
+        self.agent_player = get_opponent(client_player)
+        self.args = args
+        self.board = initialize_game_state()
+        self.saved_state = init(initialize_game_state(), self.agent_player, seed=seed)
+        check_configuration(generate_move, args, self.saved_state)
+
+    def apply(self, action: PlayerAction, player: BoardPiece) -> Optional[str]:
+        """
+        Applies the move and returns the END result for the client if the game is over
+        """
+        apply_player_action(self.board, action, player)
+        end_state = check_end_state(self.board, player)
+        if end_state == GameState.IS_DRAW:
+            return "DRAW"
+        if end_state == GameState.IS_WIN:
+            return "WIN" if player == self.client_player else "LOSS"
+        return None
+
+
+class GameServer(object):
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None):
+        workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.pending = asyncio.Semaphore(max_pending or 4 * workers)
+        self.game_ids = itertools.count()
+        self.active_games = 0
+        self.moves_served = 0
+
+    async def agent_move(self, session: GameSession) -> Tuple[PlayerAction, float]:
+        """
+        Computes the agent's move in a worker, raises AgentError if the agent (or sending its state) failed
+        """
+        t0 = time.perf_counter()
+        async with self.pending:
+            try:
+                action, session.saved_state, seconds = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, compute_move, session.agent, session.board, session.agent_player,
+                    session.saved_state, session.args,
+                )
+            except Exception as error:
+                get_metrics().increment("agent_errors", agent=session.agent)
+                raise AgentError(f"agent {session.agent} failed: {type(error).__name__}: {error}") from error
+        self.moves_served += 1
+        metrics = get_metrics()
+        metrics.observe("move_seconds", time.perf_counter() - t0, agent=session.agent)
+        metrics.observe("compute_seconds", seconds, agent=session.agent)
+        return action, seconds
+
+    async def play_agent(self, session: GameSession, writer: asyncio.StreamWriter) -> Optional[str]:
+        action, seconds = await self.agent_move(session)
+        writer.write(f"MOVE {action} {seconds:.6f}\n".encode())
+        return session.apply(action, session.agent_player)
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = None
+        try:
+            while True:
+                line = await read_command(reader)
+                if line is None:
+                    writer.write(b"ERROR command too long\n")
+                    await writer.drain()
+                    continue
+                if not line:
+                    break
+                try:
+                    fields = line.decode().split()
+                except UnicodeDecodeError as error:
+                    writer.write(f"ERROR command is not UTF-8: {error}\n".encode())
+                    await writer.drain()
+                    continue
+                if not fields:
+                    continue
+                command, fields = fields[0], fields[1:]
+                result = None
+                try:
+                    if command == "QUIT":
+                        break
+                    elif command == "NEW":
+                        try:
+                            agent, order = fields[0], fields[1]
+                            if order not in ("first", "second"):
+                                raise ValueError(f"expected first or second, got {order}")
+                            seed = int(fields[2]) if len(fields) > 2 else None
+                            args = tuple(json.loads(field) for field in fields[3:])
+                            new_session = GameSession(next(self.game_ids), agent,
+                                                      PLAYER1 if order == "first" else PLAYER2, seed, args)
+                        except (IndexError, ValueError, ImportError) as error:
+                            writer.write(f"ERROR cannot start game: {error}\n".encode())
+                            continue
+                        if session is None:
+                            self.active_games += 1
+                        session = new_session
+                        writer.write(f"GAME {session.game_id}\n".encode())
+                        if session.agent_player == PLAYER1:
+                            result = await self.play_agent(session, writer)
+                    elif command == "PLAY":
+                        try:
+                            if session is None:
+                                raise ValueError("no game, send NEW first")
+                            action = PlayerAction(int(fields[0]))
+                            if not (0 <= action < session.board.shape[1] and is_action_valid(session.board, action)):
+                                raise ValueError(f"invalid column {fields[0]}")
+                        except (IndexError, ValueError) as error:
+                            writer.write(f"ERROR {error}\n".encode())
+                            continue
+                        result = session.apply(action, session.client_player)
+                        if result is None:
+                            result = await self.play_agent(session, writer)
+                    else:
+                        writer.write(f"ERROR unknown command {command}\n".encode())
+                except AgentError as error:
+                    # the game cannot go on without the agent's move, it is abandoned
+                    writer.write(f"ERROR {error}\n".encode())
+                    session = None
+                    self.active_games -= 1
+                if result is not None:
+                    writer.write(f"END {result}\n".encode())
+                    get_metrics().increment("games", agent=session.agent, result=result.lower())
+                    session = None
+                    self.active_games -= 1
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            if session is not None:
+                self.active_games -= 1
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0, unix_path: Optional[str] = None) \
+            -> asyncio.AbstractServer:
+        if unix_path is not None:
+            return await asyncio.start_unix_server(self.handle_client, path=unix_path)
+        return await asyncio.start_server(self.handle_client, host, port)
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+async def flush_metrics(game_server: GameServer, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        metrics = get_metrics()
+        metrics.set_gauge("active_games", game_server.active_games)
+        metrics.flush()
+
+
+async def serve(host: str, port: int, unix_path: Optional[str], workers: Optional[int], max_pending: Optional[int],
+                metrics_interval: float = 10.0):
+    game_server = GameServer(workers, max_pending)
+    server = await game_server.start(host, port, unix_path)
+    print(f"Serving on {', '.join(str(socket.getsockname()) for socket in server.sockets)}")
+    flusher = asyncio.create_task(flush_metrics(game_server, metrics_interval)) if get_metrics().enabled else None
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if flusher is not None:
+            flusher.cancel()
+        get_metrics().close()
+        game_server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve concurrent games against the agents")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4000)
+    parser.add_argument("--unix", default=None, help="serve on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=None, help="agent worker processes (one per CPU by default)")
+    parser.add_argument("--max-pending", type=int, default=None, help="moves queued at once (4 per worker)")
+    parser.add_argument("--metrics-jsonl", default=None, help="append metric snapshots to this JSON lines file")
+    parser.add_argument("--prometheus", default=None, help="keep a Prometheus text file with the metrics here")
+    parser.add_argument("--metrics-interval", type=float, default=10.0)
+    cli_args = parser.parse_args()
+    sinks = []
+    if cli_args.metrics_jsonl:
+        sinks.append(JsonLinesSink(cli_args.metrics_jsonl))
+    if cli_args.prometheus:
+        sinks.append(PrometheusTextFileSink(cli_args.prometheus))
+    if sinks:
+        set_metrics(Metrics(sinks))
+    asyncio.run(serve(cli_args.host, cli_args.port, cli_args.unix, cli_args.workers, cli_args.max_pending,
+                      cli_args.metrics_interval))
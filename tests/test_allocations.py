@@ -0,0 +1,62 @@
+import copy
+import json
+import tracemalloc
+
+
+def test_profile_allocations(tmp_path, capsys, monkeypatch):
+    from benchmarks import allocations
+    from benchmarks.positions import POSITIONS
+    from agents.registry import load_agent
+
+    # whole games take long under tracemalloc, the test profiles one move per position (the benchmark plays games)
+    def play_positions(agent_1, agent_2, no_of_games, args_1, args_2, seed, wrap):
+        for agent, args in ((agent_1, args_1), (agent_2, args_2)):
+            generate_move, init = load_agent(agent)
+            for board, player in POSITIONS.values():
+                wrap(generate_move, agent)(board.copy(), player, init(board, player, seed=seed), *args)
+
+    monkeypatch.setattr(allocations, "play_games", play_positions)
+    report = allocations.profile_allocations("agent_random", "agent_mcts", 1, args_2=(30,), seed=3,
+                                             output=str(tmp_path), verbose=False)
+    assert capsys.readouterr().out == ""
+    assert not tracemalloc.is_tracing()
+    with open(tmp_path / "allocations.json") as report_file:
+        assert json.load(report_file)["summary"] == report["summary"]
+    mcts = report["summary"]["agent_mcts"]
+    assert mcts["moves"] == len(POSITIONS)
+    assert mcts["peak_bytes_max"] >= mcts["peak_bytes_mean"] > 0
+    assert set(mcts["phases"]) <= {"selection", "expansion", "rollout", "backpropagation", "other"}
+    assert mcts["phases"].get("expansion", 0) > 0
+    assert all(set(stats) == {"bytes", "blocks"} for stats in mcts["lines"].values())
+
+
+def test_wrap_keeps_the_move():
+    import numpy as np
+    from benchmarks.allocations import AllocationProfiler
+    from agents.common import PLAYER1, initialize_game_state
+
+    def generate_move(board, player, saved_state):
+        saved_state.append(np.zeros(10000))
+        return 3, saved_state
+
+    with AllocationProfiler(interval=0.001) as profiler:
+        profiled = profiler.wrap(generate_move, "agent_test")
+        assert profiled(initialize_game_state(), PLAYER1, [])[0] == 3
+    move, = profiler.moves["agent_test"]
+    assert move["peak_bytes"] >= 80000
+    assert move["retained_bytes"] >= 80000
+
+
+def test_compare():
+    from benchmarks.allocations import compare
+
+    baseline = dict(summary=dict(agent_mcts=dict(peak_bytes_mean=1000, peak_bytes_max=2000, retained_bytes_mean=0,
+                                                 live_at_peak_bytes_mean=800, phases=dict(rollout=500, expansion=300))))
+    assert compare(baseline, baseline, verbose=False) == []
+    grown = copy.deepcopy(baseline)
+    grown["summary"]["agent_mcts"]["peak_bytes_mean"] = 1300
+    grown["summary"]["agent_mcts"]["phases"] = dict(rollout=500)
+    assert compare(baseline, grown, verbose=False) == ["agent_mcts: peak_bytes_mean"]
+    assert compare(baseline, grown, threshold=0.5, verbose=False) == []
+    assert compare(baseline, dict(summary={}), verbose=False)[0] == "agent_mcts: peak_bytes_mean"
+
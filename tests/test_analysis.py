@@ -0,0 +1,34 @@
+import numpy as np
+
+
+def test_side_to_move():
+    from analysis import side_to_move
+    from agents.common import initialize_game_state, apply_player_action, PLAYER1, PLAYER2
+
+    boards = np.stack([initialize_game_state()] * 2)
+    apply_player_action(boards[1], 3, PLAYER1)
+    assert side_to_move(boards).tolist() == [PLAYER1, PLAYER2]
+
+
+def test_board_analyzer():
+    from analysis import BoardAnalyzer
+    from selfplay import random_playout, game_positions
+    from agents.common import PLAYER1, PLAYER2, get_valid_actions
+    from agents.agent_minimax.minimax import minimax_with_alpha_beta_pruning
+    from agents.rng import AgentRNG
+
+    records = np.concatenate([game_positions(*random_playout(AgentRNG(seed))) for seed in range(3)])
+    boards, players = records["board"], records["player"]
+    with BoardAnalyzer(args=(2,), processes=2, seed=0) as analyzer:
+        streamed = list(analyzer.analyze(boards, players, chunk_size=5))
+        assert sorted(index for index, _, _ in streamed) == list(range(len(boards)))
+        actions, scores = analyzer.analyze_all(boards, players)
+    for board, player, action, score in zip(boards, players, actions, scores):
+        assert action in get_valid_actions(board)
+        _, expected = minimax_with_alpha_beta_pruning(board.copy(), 2, -np.inf, np.inf, player)
+        assert score == expected
+
+    with BoardAnalyzer("agent_random", processes=1, seed=0) as analyzer:
+        actions, scores = analyzer.analyze_all(boards)
+    assert all(action in get_valid_actions(board) for board, action in zip(boards, actions))
+    assert np.isnan(scores).all()
@@ -0,0 +1,16 @@
+def test_run_suite():
+    from benchmarks.suite import run_suite
+
+    results = run_suite("get_valid_actions", repeats=2, min_seconds=0.01, verbose=False)
+    assert list(results["benchmarks"]) == ["get_valid_actions"]
+    result = results["benchmarks"]["get_valid_actions"]
+    assert 0 < result["min"] <= result["median"] and result["repeats"] == 2
+
+
+def test_compare():
+    from benchmarks.suite import compare
+
+    baseline = dict(benchmarks=dict(a=dict(median=1.0), b=dict(median=1.0), c=dict(median=1.0)))
+    current = dict(benchmarks=dict(a=dict(median=1.2), b=dict(median=1.3), d=dict(median=5.0)))
+    assert compare(baseline, current, threshold=0.25, verbose=False) == ["b", "c"]
+    assert compare(baseline, current, threshold=0.1, verbose=False) == ["a", "b", "c"]
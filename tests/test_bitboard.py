@@ -0,0 +1,18 @@
+def test_bitboards_round_trip():
+    import numpy as np
+    from agents.bitboard import connects_four, to_bitboards, to_board
+    from agents.common import PLAYER1, PLAYER2, connected_four
+    from benchmarks.positions import sample_positions
+
+    for board, player in sample_positions(20, seed=5):
+        current, mask = to_bitboards(board)
+        assert (to_board(current, mask) == board).all()
+        assert to_bitboards(board, player) == (current, mask)
+        opponent = PLAYER2 if player == PLAYER1 else PLAYER1
+        assert to_bitboards(board, opponent) == (current ^ mask, mask)
+        for stones, piece in ((current, player), (current ^ mask, opponent)):
+            assert connects_four(stones) == connected_four(board, piece)
+    assert to_bitboards(np.zeros((6, 7), dtype=np.int8)) == (0, 0)
+    won = np.zeros((6, 7), dtype=np.int8)
+    won[0, :] = [PLAYER1, PLAYER1, PLAYER1, PLAYER1, PLAYER2, PLAYER2, PLAYER2]
+    assert connects_four(to_bitboards(won, PLAYER1)[0]) and not connects_four(to_bitboards(won, PLAYER2)[0])
@@ -0,0 +1,8 @@
+def test_count_copies():
+    from benchmarks.board_copies import count_copies
+
+    report = count_copies("agent_random", "agent_mcts", 1, args_2=(30,), seed=3, verbose=False)
+    assert report["moves"] > 0 and report["copies_per_move"] > 0
+    # the harness lends the board without copying it, the copies left are those of the search
+    assert not any(line.startswith("main.py") for line in report["lines"])
+    assert any(line.startswith("agents") for line in report["lines"])
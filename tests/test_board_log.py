@@ -0,0 +1,77 @@
+import io
+
+import numpy as np
+import pytest
+
+from agents.common import BoardPiece, PLAYER1, PLAYER2, pretty_print_board
+
+
+def random_boards(n: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 3, (n, 6, 7)).astype(BoardPiece)
+
+
+def game_log(boards: np.ndarray) -> str:
+    """
+    Log as printed by main.play_game: a board, the player to move and the move time
+    """
+    return "\n".join(f"{pretty_print_board(board)}\nPlayer 1 you are playing with X\nMove time: 0.{i:03d}s"
+                     for i, board in enumerate(boards)) + "\n"
+
+
+def test_parse_boards_round_trip():
+    from agents.board_log import parse_boards
+
+    boards = random_boards(50)
+    parsed = parse_boards(game_log(boards))
+    assert parsed.dtype == BoardPiece and parsed.shape == (50, 6, 7)
+    assert (parsed == boards).all()
+    assert [pretty_print_board(board) for board in parsed] == [pretty_print_board(board) for board in boards]
+    assert parsed[0].flags.c_contiguous
+
+
+def test_parse_boards_tolerates_trailing_whitespace():
+    from agents.board_log import parse_boards
+    from agents.common import string_to_board
+
+    boards = random_boards(5, seed=1)
+    log = game_log(boards)
+    assert (parse_boards(log.replace("\n", "  \r\n")) == boards).all()
+    assert (parse_boards(log.replace("|==============|\n", "|==============| \n")) == boards).all()
+    assert (parse_boards(log.rstrip("\n")) == boards).all()
+    # the fixtures of the tests have a trailing space after the top border
+    board = string_to_board(pretty_print_board(boards[0]).replace("\n", " \n", 1))
+    assert (board == boards[0]).all()
+
+
+def test_parse_boards_rejects_malformed_boards():
+    from agents.board_log import parse_boards
+
+    text = pretty_print_board(random_boards(1)[0])
+    for broken in (text.replace("X", "Y", 1), text.replace(" |\n", "|\n", 1), "\n".join(text.splitlines()[1:])):
+        with pytest.raises(ValueError):
+            parse_boards(broken)
+    assert len(parse_boards("no boards\nin this log\n")) == 0
+
+
+def test_iter_boards_across_chunks(tmp_path):
+    from agents.board_log import iter_boards, read_boards
+
+    boards = random_boards(200, seed=2)
+    path = tmp_path / "games.log"
+    path.write_text(game_log(boards))
+    for chunk_size in (1, 17, 1000, 1 << 20):
+        chunks = list(iter_boards(path, chunk_size))
+        assert (np.concatenate(chunks) == boards).all()
+    assert len(list(iter_boards(str(path), 1000))) > 1
+    assert (read_boards(io.BytesIO(game_log(boards[:3]).encode()), 100) == boards[:3]).all()
+    # an incomplete board at the end of a log is dropped
+    assert len(read_boards(io.BytesIO(game_log(boards[:3]).encode()[:-120]))) == 2
+    assert read_boards(io.BytesIO(b"")).shape == (0, 6, 7)
+
+
+def test_string_to_board_keeps_the_orientation():
+    from agents.common import string_to_board, initialize_game_state
+
+    board = initialize_game_state()
+    board[0, 0], board[1, 0], board[0, 6] = PLAYER1, PLAYER2, PLAYER2
+    assert (string_to_board(pretty_print_board(board)) == board).all()
@@ -1,4 +1,5 @@
 import numpy as np
+import pytest
 from agents.common import BoardPiece, NO_PLAYER, PLAYER1, PLAYER2, GameState
 from agents.common import initialize_game_state
 import timeit
@@ -146,6 +147,44 @@ def test_connected_four():
     print(f"Python iteration-based: {res / number * 1e6 : .1f} us per call")
 
 
+def test_is_winning_action():
+    from agents.common import string_to_board, is_winning_action, apply_player_action, connected_four
+    board_str = """|==============|
+|              |
+|              |
+|              |
+|        X O   |
+|    O X X O   |
+|X O X O O X   |
+|==============|
+|0 1 2 3 4 5 6 |"""
+    board = string_to_board(board_str)
+    # diagonal win for X in column 5, nothing for O
+    assert is_winning_action(board, 5, PLAYER1)
+    assert not is_winning_action(board, 5, PLAYER2)
+    for action in range(7):
+        expected = connected_four(apply_player_action(board, action, PLAYER1, True), PLAYER1)
+        assert is_winning_action(board, action, PLAYER1) == expected
+
+    board_str = """|==============|
+|              |
+|              |
+|              |
+|              |
+|    X X       |
+|    X O O O   |
+|==============|
+|0 1 2 3 4 5 6 |"""
+    board = string_to_board(board_str)
+    # only the right end completes O's horizontal row
+    assert is_winning_action(board, 6, PLAYER2)
+    assert not is_winning_action(board, 2, PLAYER2)
+
+    full_column = initialize_game_state()
+    full_column[:, 0] = PLAYER1
+    assert not is_winning_action(full_column, 0, PLAYER1)
+
+
 def test_check_end_state():
     from agents.common import string_to_board
     from agents.common import check_end_state
@@ -189,4 +228,87 @@ def test_check_end_state():
 
     board = string_to_board(board_str)
     end_state = check_end_state(board, PLAYER2)
-    assert (end_state == GameState.IS_DRAW)
\ No newline at end of file
+    assert (end_state == GameState.IS_DRAW)
+
+def test_position_keys():
+    from agents.common import initialize_game_state, apply_player_action, position_keys, PLAYER1, PLAYER2
+
+    boards = np.zeros((4, 6, 7), dtype=np.int8)
+    apply_player_action(boards[1], 3, PLAYER1)
+    apply_player_action(boards[2], 3, PLAYER2)
+    boards[3] = boards[1]
+    apply_player_action(boards[3], 3, PLAYER2)
+    keys = position_keys(boards)
+    assert len(set(keys.tolist())) == 4
+    full = initialize_game_state()
+    full[:] = PLAYER1
+    assert position_keys(full) < 2 ** 49
+    assert position_keys(boards[1]) == keys[1]
+
+
+def test_position_key_of_unreachable_boards():
+    from agents.common import apply_player_action, position_key, position_keys
+
+    board = np.zeros((6, 7), dtype=np.int8)
+    apply_player_action(board, 2, PLAYER2)
+    assert position_key(board) == int(position_keys(board))
+    # pieces floating above empty squares are not in the column lookup table
+    board[3:, 0] = PLAYER1
+    assert position_key(board) == int(position_keys(board))
+
+
+def test_scipy_is_optional(monkeypatch):
+    import subprocess
+    import sys
+    import agents.common as common
+
+    imported = subprocess.run([sys.executable, "-c", "import sys, agents.common; print('scipy' in sys.modules)"],
+                              check=True, capture_output=True, text=True).stdout
+    assert imported.split()[-1] == "False"
+
+    boards = np.random.default_rng(0).integers(0, 3, (200, 6, 7)).astype(BoardPiece)
+    expected = [(common.connected_four(board, PLAYER1), common.connected_four(board, PLAYER2)) for board in boards]
+    monkeypatch.setitem(sys.modules, "scipy.signal._sigtools", None)
+    monkeypatch.setitem(sys.modules, "scipy.signal.sigtools", None)
+    monkeypatch.setattr(common, "_convolve2d", None)
+    assert [(common.connected_four(board, PLAYER1), common.connected_four(board, PLAYER2)) for board in boards] == \
+        expected
+    assert common._convolve2d.__name__ == "numpy_convolve2d"
+
+
+def test_scipy_convolution_is_selected(monkeypatch):
+    import importlib.util
+    import agents.common as common
+
+    try:
+        has_sigtools = any(importlib.util.find_spec(name) is not None
+                           for name in ("scipy.signal._sigtools", "scipy.signal.sigtools"))
+    except ImportError:  # no scipy
+        has_sigtools = False
+    monkeypatch.setattr(common, "_convolve2d", None)
+    board = initialize_game_state()
+    board[0, :4] = PLAYER1
+    assert common.connected_four(board, PLAYER1) and not common.connected_four(board, PLAYER2)
+    assert common._convolve2d.__name__ == ("scipy_convolve2d" if has_sigtools else "numpy_convolve2d")
+
+
+
+def test_read_only_view():
+    from agents.common import read_only_view, apply_player_action, connected_four
+
+    board = initialize_game_state()
+    view = read_only_view(board)
+    with pytest.raises(ValueError):
+        apply_player_action(view, 3, PLAYER1)
+    apply_player_action(view, 3, PLAYER1, copy=True)
+    assert not view.any()
+    assert not connected_four(view, PLAYER1)  # reads the board without writing to it
+    apply_player_action(board, 3, PLAYER1)
+    assert view[0, 3] == PLAYER1  # a view, not a copy
+
+    locked = read_only_view(board, lock=True)
+    with pytest.raises(ValueError):
+        locked.flags.writeable = True
+    board.flags.writeable = True
+    apply_player_action(board, 3, PLAYER2)
+    assert locked[1, 3] == PLAYER2
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+
+def random_game(rng):
+    from agents.common import initialize_game_state, apply_player_action, check_end_state, GameState, \
+        PLAYER1, PLAYER2, NO_PLAYER
+
+    board = initialize_game_state()
+    player, moves = PLAYER1, []
+    while True:
+        action = rng.choice(np.flatnonzero(board[-1] == NO_PLAYER))
+        apply_player_action(board, action, player)
+        moves.append(int(action))
+        state = check_end_state(board, player)
+        if state == GameState.IS_WIN:
+            return board, moves, player
+        if state == GameState.IS_DRAW:
+            return board, moves, NO_PLAYER
+        player = PLAYER2 if player == PLAYER1 else PLAYER1
+
+
+def test_write_and_replay(tmp_path):
+    from agents.game_record import GameRecordWriter, GameRecordReader, RECORD_DTYPE, HEADER_SIZE
+
+    rng = np.random.default_rng(0)
+    games = [random_game(rng) for _ in range(20)]
+    path = tmp_path / "games.c4gr"
+    with GameRecordWriter(path) as writer:
+        for _, moves, winner in games[:10]:
+            writer.write(moves, winner, [0.01] * len(moves))
+    # files are append-only
+    with GameRecordWriter(path) as writer:
+        for _, moves, winner in games[10:]:
+            writer.write(moves, winner)
+    assert path.stat().st_size == HEADER_SIZE + 20 * RECORD_DTYPE.itemsize
+
+    reader = GameRecordReader(path)
+    assert len(reader) == 20
+    for game, (board, moves, winner) in enumerate(games):
+        assert reader.moves(game).tolist() == moves
+        assert reader.winners[game] == winner
+        assert (reader.position(game) == board).all()
+        positions = reader.positions(game)
+        assert (positions[0] == 0).all() and (positions[-1] == board).all()
+        assert (positions[5] == reader.position(game, 5)).all()
+    assert np.allclose(reader.move_times(0), 0.01)
+    assert (reader.move_times(10) == 0).all()
+
+    boards = reader.boards_at(8)
+    assert all((boards[game] == reader.position(game, 8)).all() for game in range(20))
+    finals = reader.boards_at(42, games=[3, 4])
+    assert (finals[0] == games[3][0]).all() and (finals[1] == games[4][0]).all()
+
+
+def test_rejects_foreign_file(tmp_path):
+    from agents.game_record import GameRecordReader, GameRecordWriter
+
+    path = tmp_path / "games.jsonl"
+    path.write_text('{"game": 0}\n')
+    with pytest.raises(ValueError):
+        GameRecordReader(path)
+    with pytest.raises(ValueError):
+        GameRecordWriter(path)
@@ -0,0 +1,97 @@
+import os
+import sys
+import threading
+import time
+
+
+def test_time_control():
+    from main import play_game, TimeControl, generate_move_with_time_limit, accepts_deadline
+    from agents.agent_random import generate_move as generate_move_random
+    from agents.agent_mcts import generate_move as generate_move_mcts
+    from agents.agent_minimax import generate_move as generate_move_minimax
+    from agents.common import initialize_game_state, PLAYER1
+
+    release = threading.Event()
+
+    def blocked_move(board, player, saved_state):
+        release.wait(5)
+        return 0, saved_state
+
+    assert accepts_deadline(generate_move_mcts) and accepts_deadline(generate_move_minimax)
+    assert not accepts_deadline(generate_move_random) and not accepts_deadline(blocked_move)
+
+    board = initialize_game_state()
+    action, saved_state, overran = generate_move_with_time_limit(blocked_move, board, PLAYER1, "state", (), 0.01, 0.01)
+    release.set()
+    assert overran and action == 3 and saved_state is None
+
+    # a deadline that has already passed: the searches stop at their first check, the grace is only an upper bound
+    for generate_move in (generate_move_mcts, generate_move_minimax):
+        action, _, overran = generate_move_with_time_limit(generate_move, board, PLAYER1, None, (), 0.0, 10.0)
+        assert not overran and 0 <= action < 7
+
+    time_control = TimeControl(5.0, increment=1.0, grace=10.0)
+    assert time_control.update_reserve(0.0, 0.01) == 1.0
+    assert time_control.update_reserve(1.0, 6.5) == 0.5
+
+    # every move gets the deadline of its allowed time (move_seconds plus the reserve grown by the increments)
+    remaining = []
+
+    def recording_move(board, player, saved_state, deadline):
+        remaining.append(deadline - time.monotonic())
+        return generate_move_random(board, player, saved_state)
+
+    winner, moves = play_game(recording_move, generate_move_random, verbose=False, time_control=time_control)
+    assert len(remaining) == (len(moves) + 1) // 2
+    assert all(seconds <= 5.0 + 1.0 * move for move, seconds in enumerate(remaining))
+
+
+def test_overrun_drops_the_saved_state():
+    from main import generate_move_with_time_limit
+    from agents.common import SavedState, initialize_game_state, PLAYER1
+
+    closed = threading.Event()
+
+    class ClosingState(SavedState):
+        def close(self):
+            closed.set()
+
+    finish = threading.Event()
+
+    def slow_move(board, player, saved_state):
+        finish.wait(5)
+        saved_state.computational_result = "changed"
+        return 0, saved_state
+
+    state = ClosingState()
+    action, saved_state, overran = generate_move_with_time_limit(
+        slow_move, initialize_game_state(), PLAYER1, state, (), 0.01, 0.01, init=lambda board, player: "fresh",
+    )
+    assert overran and saved_state == "fresh"
+    assert not closed.is_set()
+    # the abandoned generator closes its state once it finishes
+    finish.set()
+    assert closed.wait(5)
+
+
+def test_user_move_deadline(monkeypatch, capsys):
+    import pytest
+    from main import user_move, accepts_deadline
+    from agents.common import initialize_game_state, PLAYER1
+
+    assert accepts_deadline(user_move)
+    read_end, write_end = os.pipe()
+    with os.fdopen(read_end) as stdin, os.fdopen(write_end, "w") as typed:
+        monkeypatch.setattr(sys, "stdin", stdin)
+        board = initialize_game_state()
+        # no answer by the deadline: the fallback move
+        assert user_move(board, PLAYER1, None, deadline=time.monotonic()) == (3, None)
+        typed.write("9\n1\n2\n")
+        typed.flush()
+        assert user_move(board, PLAYER1, "state", deadline=time.monotonic() + 5) == (1, "state")
+        # the line typed after the answer is kept for the next move, also one without a deadline
+        assert user_move(board, PLAYER1, None) == (2, None)
+        typed.close()
+        with pytest.raises(EOFError):
+            user_move(board, PLAYER1, None)
+    assert "Column? " in capsys.readouterr().out
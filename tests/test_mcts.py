@@ -1,7 +1,8 @@
 import numpy as np
 
-from agents.agent_mcts import generate_move, State
-from agents.agent_mcts.mcts import tree_traversal, select_leaf_node, expand, rollout, backpropagate
+from agents.agent_mcts import generate_move, State, NodeBudget
+from agents.agent_mcts.mcts import tree_traversal, select_leaf_node, expand, rollout, backpropagate, \
+    backpropagate_path, new_node_table, mcts, choose_tactical_action, TACTICAL_ROLLOUT
 from agents.common import string_to_board, PLAYER1, PLAYER1_PRINT, PLAYER2_PRINT, PlayerAction, PLAYER2
 
 
@@ -120,14 +121,14 @@ def test_select_leaf_node():
     board_str = "|==============|\n|              |\n|              |\n|              |\n|        X O   |" \
                 "\n|  X O X X O   |\n|X O X O O X   |\n|==============|\n|0 1 2 3 4 5 6 |"""
     child_1_board = string_to_board(board_str)
-    child_1 = State(child_1_board, player=PLAYER2, action=PlayerAction(1))
+    child_1 = State(child_1_board, player=PLAYER2)
     board_str = "|==============|\n|              |\n|              |\n|              |\n|        X O   |" \
                 "\n|X   O X X O   |\n|X O X O O X   |\n|==============|\n|0 1 2 3 4 5 6 |"""
     child_2_board = string_to_board(board_str)
-    child_2 = State(child_2_board, player=PLAYER2, action=PlayerAction(0))
+    child_2 = State(child_2_board, player=PLAYER2)
 
-    init_state.add_child(child_1)
-    init_state.add_child(child_2)
+    init_state.add_child(PlayerAction(1), child_1)
+    init_state.add_child(PlayerAction(0), child_2)
     leaf_node = select_leaf_node(init_state)
     assert(leaf_node == init_state)
 
@@ -140,39 +141,39 @@ def test_select_leaf_node():
     board_str = "|==============|\n|              |\n|              |\n|              |\n|        X O   |" \
                 "\n|  X O X X O   |\n|X O X O O X   |\n|==============|\n|0 1 2 3 4 5 6 |"""
     child_1_board = string_to_board(board_str)
-    child_1 = State(child_1_board, player=PLAYER2, action=PlayerAction(1), value=182.0, visits=204)
+    child_1 = State(child_1_board, player=PLAYER2, value=182.0, visits=204)
     board_str = "|==============|\n|              |\n|              |\n|              |\n|        X O   |" \
                 "\n|X   O X X O   |\n|X O X O O X   |\n|==============|\n|0 1 2 3 4 5 6 |"""
     child_2_board = string_to_board(board_str)
-    child_2 = State(child_2_board, player=PLAYER2, action=PlayerAction(0), value=206.0, visits=226)
+    child_2 = State(child_2_board, player=PLAYER2, value=206.0, visits=226)
     board_str = "|==============|\n|              |\n|              |\n|              |\n|      X X O   |" \
                 "\n|    O X X O   |\n|X O X O O X   |\n|==============|\n|0 1 2 3 4 5 6 |"""
     child_3_board = string_to_board(board_str)
-    child_3 = State(child_3_board, player=PLAYER2, action=PlayerAction(3), value=342.0, visits=348)
+    child_3 = State(child_3_board, player=PLAYER2, value=342.0, visits=348)
     board_str = "|==============|\n|              |\n|              |\n|              |\n|    X   X O   |" \
                 "\n|    O X X O   |\n|X O X O O X   |\n|==============|\n|0 1 2 3 4 5 6 |"""
     child_4_board = string_to_board(board_str)
-    child_4 = State(child_4_board, player=PLAYER2, action=PlayerAction(2), value=249.0, visits=265)
+    child_4 = State(child_4_board, player=PLAYER2, value=249.0, visits=265)
     board_str = "|==============|\n|              |\n|              |\n|        X     |\n|        X O   |" \
                 "\n|    O X X O   |\n|X O X O O X   |\n|==============|\n|0 1 2 3 4 5 6 |"""
     child_5_board = string_to_board(board_str)
-    child_5 = State(child_5_board, player=PLAYER2, action=PlayerAction(4), value=342.0, visits=348)
+    child_5 = State(child_5_board, player=PLAYER2, value=342.0, visits=348)
     board_str = "|==============|\n|              |\n|              |\n|          X   |\n|        X O   |" \
                 "\n|    O X X O   |\n|X O X O O X   |\n|==============|\n|0 1 2 3 4 5 6 |"""
     child_6_board = string_to_board(board_str)
-    child_6 = State(child_6_board, player=PLAYER2, action=PlayerAction(5), value=393.0, visits=393)
+    child_6 = State(child_6_board, player=PLAYER2, value=393.0, visits=393)
     board_str = "|==============|\n|              |\n|              |\n|              |\n|        X O   |" \
                 "\n|    O X X O   |\n|X O X O O X X |\n|==============|\n|0 1 2 3 4 5 6 |"""
     child_7_board = string_to_board(board_str)
-    child_7 = State(child_7_board, player=PLAYER2, action=PlayerAction(6), value=194.0, visits=215)
-
-    init_state.add_child(child_1)
-    init_state.add_child(child_2)
-    init_state.add_child(child_3)
-    init_state.add_child(child_4)
-    init_state.add_child(child_5)
-    init_state.add_child(child_6)
-    init_state.add_child(child_7)
+    child_7 = State(child_7_board, player=PLAYER2, value=194.0, visits=215)
+
+    init_state.add_child(PlayerAction(1), child_1)
+    init_state.add_child(PlayerAction(0), child_2)
+    init_state.add_child(PlayerAction(3), child_3)
+    init_state.add_child(PlayerAction(2), child_4)
+    init_state.add_child(PlayerAction(4), child_5)
+    init_state.add_child(PlayerAction(5), child_6)
+    init_state.add_child(PlayerAction(6), child_7)
     leaf_node = select_leaf_node(init_state)
     assert (leaf_node == child_7)
 
@@ -205,7 +206,7 @@ def test_rollout():
     board_str = "|==============|\n|              |\n|              |\n|          X   |\n|        X O   |" \
                 "\n|    O X X O   |\n|X O X O O X   |\n|==============|\n|0 1 2 3 4 5 6 |"""
     current_node_board = string_to_board(board_str)
-    current_node = State(current_node_board, player=PLAYER2, action=PlayerAction(5))
+    current_node = State(current_node_board, player=PLAYER2)
 
     v = rollout(current_node, init_state, player)
     assert(v == 1)
@@ -220,12 +221,42 @@ def test_rollout():
     board_str = "|==============|\n|              |\n|              |\n|              |\n|              |" \
                 "\n|    X X X     |\n|    X O O O   |\n|==============|\n|0 1 2 3 4 5 6 |"
     current_node_board = string_to_board(board_str)
-    current_node = State(current_node_board, player=PLAYER2, action=PlayerAction(5))
+    current_node = State(current_node_board, player=PLAYER2)
 
     v = rollout(current_node, init_state, player)
     assert (v == 0)
 
 
+def test_tactical_rollout():
+    # Immediate win is always taken -----------------------------
+    board_str = "|==============|\n|              |\n|              |\n|              |\n|        X O   |" \
+                "\n|    O X X O   |\n|X O X O O X   |\n|==============|\n|0 1 2 3 4 5 6 |"""
+    board = string_to_board(board_str)
+    action, is_win = choose_tactical_action(board, np.arange(7), PLAYER1)
+    assert (action == 5 and is_win)
+
+    # Opponent's immediate win is blocked -----------------------------
+    board_str = "|==============|\n|              |\n|              |\n|              |\n|              |" \
+                "\n|    X X       |\n|    X O O O   |\n|==============|\n|0 1 2 3 4 5 6 |"
+    board = string_to_board(board_str)
+    action, is_win = choose_tactical_action(board, np.arange(7), PLAYER1)
+    assert (action == 6 and not is_win)
+
+    # X did not block, O always takes the win in the rollout
+    init_state = State(board.copy(), player=PLAYER1, visits=1)
+    board_str = "|==============|\n|              |\n|              |\n|              |\n|              |" \
+                "\n|    X X X     |\n|    X O O O   |\n|==============|\n|0 1 2 3 4 5 6 |"
+    current_node = State(string_to_board(board_str), player=PLAYER2)
+    for _ in range(10):
+        assert (rollout(current_node, init_state, PLAYER1, TACTICAL_ROLLOUT) == 0)
+
+    # X won by moving into the node
+    board_str = "|==============|\n|              |\n|              |\n|          X   |\n|        X O   |" \
+                "\n|    O X X O   |\n|X O X O O X   |\n|==============|\n|0 1 2 3 4 5 6 |"""
+    current_node = State(string_to_board(board_str), player=PLAYER2)
+    assert (rollout(current_node, init_state, PLAYER1, TACTICAL_ROLLOUT) == 1)
+
+
 def test_back_propagate():
     player = PLAYER1
     board_str = "|==============|\n|              |\n|              |\n|              |\n|        X O   |" \
@@ -235,14 +266,14 @@ def test_back_propagate():
     board_str = "|==============|\n|              |\n|              |\n|              |\n|        X O   |" \
                 "\n|  X O X X O   |\n|X O X O O X   |\n|==============|\n|0 1 2 3 4 5 6 |"""
     child_1_board = string_to_board(board_str)
-    child_1 = State(child_1_board, player=PLAYER2, action=PlayerAction(1), parent=init_state)
+    child_1 = State(child_1_board, player=PLAYER2, parent=init_state)
     board_str = "|==============|\n|              |\n|              |\n|              |\n|        X O   |" \
                 "\n|X   O X X O   |\n|X O X O O X   |\n|==============|\n|0 1 2 3 4 5 6 |"""
     child_2_board = string_to_board(board_str)
-    child_2 = State(child_2_board, player=PLAYER2, action=PlayerAction(0), parent=init_state)
+    child_2 = State(child_2_board, player=PLAYER2, parent=init_state)
 
-    init_state.add_child(child_1)
-    init_state.add_child(child_2)
+    init_state.add_child(PlayerAction(1), child_1)
+    init_state.add_child(PlayerAction(0), child_2)
 
     backpropagate(child_1, 1)
     assert(child_1.value == 1.0)
@@ -253,11 +284,209 @@ def test_back_propagate():
     assert(init_state.visits == 2)
 
 
+def test_expand_links_transposition():
+    player = PLAYER1
+    board_str = "|==============|\n|              |\n|              |\n|              |\n|              |" \
+                "\n|              |\n|X O           |\n|==============|\n|0 1 2 3 4 5 6 |"
+    board = string_to_board(board_str)
+    init_state = State(board.copy(), player=player, visits=1)
+    node_table = new_node_table(init_state)
+    # the same position, reached by another move order, is already known to the table
+    board_str = "|==============|\n|              |\n|              |\n|              |\n|              |" \
+                "\n|              |\n|X O         X |\n|==============|\n|0 1 2 3 4 5 6 |"
+    known = State(string_to_board(board_str), player=PLAYER2)
+    node_table[known.key()] = known
+    for action in range(6):
+        init_state.add_child(PlayerAction(action), State(board, player=PLAYER2))
+
+    child = expand(init_state, node_table)
+    assert (child is known)
+    assert (init_state.children[6] is known)
+    assert (len(node_table) == 2)
+
+
+def test_tree_traversal_with_transpositions():
+    player = PLAYER1
+    board_str = "|==============|\n|              |\n|              |\n|              |\n|        X O   |" \
+                "\n|    O X X O   |\n|X O X O O X   |\n|==============|\n|0 1 2 3 4 5 6 |"""
+    board = string_to_board(board_str)
+    init_state = State(board.copy(), player=player)
+    node_table = new_node_table(init_state)
+    tree_traversal(2000, init_state, player, node_table)
+    assert (child_traversal_max_wins(init_state) == 5)
+    assert (init_state.visits == 2000)
+    # every expansion adds a link, but transposed positions do not allocate a new node
+    links = sum(len(node.children) for node in node_table.values())
+    assert (links == 2000 - 1)
+    assert (len(node_table) < links + 1)
+
+    assert (mcts(board, 2000, player, use_transpositions=True) == 5)
+
+
+def test_transposition_edges_keep_their_actions():
+    from agents.common import initialize_game_state, apply_player_action
+    from agents.rng import AgentRNG
+
+    init_state = State(initialize_game_state(), player=PLAYER1)
+    node_table = new_node_table(init_state)
+    tree_traversal(3000, init_state, PLAYER1, node_table, rng=AgentRNG(0))
+    links = sum(len(node.children) for node in node_table.values())
+    assert (len(node_table) < links + 1)
+    # a shared node is reached through a different action from each of its parents
+    for node in node_table.values():
+        for action, child in node.children.items():
+            assert (apply_player_action(node.board, action, node.player, True) == child.board).all()
+            assert (child.parent is None)
+
+    # the subtree kept for the next search is not released, even where other children of the root share its nodes
+    node_budget = NodeBudget(10000)
+    action = init_state.get_best_action(0)
+    kept = init_state.children.pop(action)
+    kept_nodes = new_node_table(kept)
+    node_budget.release_tree(init_state, keep=kept)
+    released = {id(node) for node in node_budget.free_nodes}
+    assert (not any(id(node) in released for node in kept_nodes.values()))
+    assert (len(released) == len(set(map(id, node_table.values())) - set(map(id, kept_nodes.values()))))
+
+
+def test_deprecated_action_keyword():
+    import pytest
+    from agents.common import initialize_game_state, apply_player_action
+
+    # the old calls, the action given to the child and read by add_child(child), still work with a warning
+    init_state = State(initialize_game_state(), player=PLAYER1)
+    with pytest.warns(DeprecationWarning):
+        child = State(apply_player_action(init_state.board, 3, PLAYER1, True), player=PLAYER2,
+                      action=PlayerAction(3), parent=init_state)
+    with pytest.warns(DeprecationWarning):
+        init_state.add_child(child)
+    assert (init_state.children == {3: child})
+    with pytest.raises(TypeError), pytest.warns(DeprecationWarning):
+        init_state.add_child(State(initialize_game_state(), player=PLAYER2))
+
+
+def test_generate_move_with_transpositions(monkeypatch):
+    from agents.common import initialize_game_state, apply_player_action
+    from agents.agent_mcts import init, ponder
+
+    board = initialize_game_state()
+    saved_state = init(board, PLAYER1, seed=0)
+    action, saved_state = generate_move(board, PLAYER1, saved_state, no_of_iterations=300, use_transpositions=True)
+    assert (saved_state.use_transpositions and 0 <= action < 7)
+    # the setting is kept for the rest of the game, also by the ponderer (which stops by itself after 300 iterations)
+    monkeypatch.setattr(ponder, "MAX_PONDER_ITERATIONS", 300)
+    apply_player_action(board, action, PLAYER1)
+    apply_player_action(board, 0, PLAYER2)
+    action, saved_state = generate_move(board, PLAYER1, saved_state, no_of_iterations=300, max_nodes=100,
+                                         ponder=True)
+    assert (saved_state.use_transpositions)
+    saved_state.ponderer.thread.join()
+    assert (saved_state.ponderer.iterations == 300)
+    apply_player_action(board, action, PLAYER1)
+    apply_player_action(board, 0, PLAYER2)
+    generate_move(board, PLAYER1, saved_state, no_of_iterations=300, max_nodes=100, ponder=True)
+    assert (saved_state.node_budget.last_report['peak_nodes'] <= 100)
+    saved_state.close()
+
+
+def test_back_propagate_path():
+    player = PLAYER1
+    board = string_to_board("|==============|\n|              |\n|              |\n|              |\n|              |"
+                            "\n|              |\n|              |\n|==============|\n|0 1 2 3 4 5 6 |")
+    init_state = State(board, player=player)
+    child = State(board, player=PLAYER2, parent=None)
+    grandchild = State(board, player=PLAYER1, parent=None)
+
+    backpropagate_path([init_state, child, grandchild], 1)
+    assert (grandchild.value == 1.0)
+    assert (child.value == 0.0)
+    assert (init_state.value == 1.0)
+    assert (init_state.visits == child.visits == grandchild.visits == 1)
+
+
+def test_node_budget():
+    player = PLAYER1
+    board_str = "|==============|\n|              |\n|              |\n|              |\n|        X O   |" \
+                "\n|    O X X O   |\n|X O X O O X   |\n|==============|\n|0 1 2 3 4 5 6 |"""
+    board = string_to_board(board_str)
+
+    # pruning the least visited leaves keeps the tree within the budget and recycles the freed nodes
+    node_budget = NodeBudget(100)
+    assert (mcts(board, 2000, player, node_budget=node_budget) == 5)
+    report = node_budget.last_report
+    assert (report['peak_nodes'] <= 100)
+    assert (report['pruned'] > 0)
+    assert (report['recycled'] > 0)
+    assert (report['allocated'] < 100)
+    assert (len(node_budget.free_nodes) <= 100)
+
+    # the next search reuses the nodes released at the end of the previous one
+    mcts(board, 500, player, node_budget=node_budget)
+    assert (node_budget.last_report['allocated'] == 0)
+
+    # with the stop policy the tree stops growing
+    node_budget = NodeBudget(50, policy='stop')
+    mcts(board, 500, player, node_budget=node_budget)
+    assert (node_budget.last_report['peak_nodes'] == 50)
+    assert (node_budget.last_report['expansions_refused'] > 0)
+
+    action, saved_state = generate_move(board, player, None, 500, 100)
+    assert (isinstance(saved_state.node_budget, NodeBudget))
+    assert (saved_state.node_budget.last_report['peak_nodes'] <= 100)
+
+    # the free list is not pickled (the server sends the saved state to a worker with every move)
+    import pickle
+    assert (len(saved_state.node_budget.free_nodes) > 0)
+    copied = pickle.loads(pickle.dumps(saved_state.node_budget))
+    assert (copied.free_nodes == [] and copied.max_nodes == 100)
+    assert (copied.last_report == saved_state.node_budget.last_report)
+
+
 def child_traversal_max_wins(init_state: State) -> PlayerAction:
     children_wins = np.zeros(len(init_state.children.values()))
-    for child in init_state.children.values():
-        children_wins[child.action] = child.value
-        print("Action: " + str(child.action) + ", Wins:" + str(child.value) + " , Visits:", str(child.visits)
+    for action, child in init_state.children.items():
+        children_wins[action] = child.value
+        print("Action: " + str(action) + ", Wins:" + str(child.value) + " , Visits:", str(child.visits)
               + ", Value:" + (str(child.value / child.visits)))
 
     return PlayerAction(np.argmax(children_wins))
+
+
+def test_ponder(monkeypatch):
+    from agents.common import initialize_game_state, apply_player_action
+    from agents.agent_mcts import init, ponder
+
+    # the pondering thread stops by itself after MAX_PONDER_ITERATIONS, the test waits for it instead of sleeping
+    monkeypatch.setattr(ponder, "MAX_PONDER_ITERATIONS", 500)
+    board = initialize_game_state()
+    saved_state = init(board, PLAYER1, seed=0)
+    action, saved_state = generate_move(board, PLAYER1, saved_state, 200, None, 'random', True)
+    ponderer = saved_state.ponderer
+    ponderer.thread.join()
+    assert (ponderer.iterations == 500)
+    pondered_root = ponderer.root
+    assert (pondered_root.visits >= 500)
+
+    # the opponent replies with its most explored move, whose subtree is adopted by the next search
+    reply_action, reply = max(pondered_root.children.items(), key=lambda edge: edge[1].visits)
+    pondered_visits = reply.visits
+    apply_player_action(board, action, PLAYER1)
+    apply_player_action(board, reply_action, PLAYER2)
+    action, saved_state = generate_move(board, PLAYER1, saved_state, 200, None, 'random', True)
+    assert (ponderer.hits == 1 and ponderer.misses == 0)
+    assert (reply.visits >= max(pondered_visits, 200))
+    assert (reply.parent is None)
+
+    saved_state.close()
+    assert (ponderer.thread is None)
+
+    # pondering with a node budget keeps the tree within the budget
+    board = initialize_game_state()
+    saved_state = init(board, PLAYER1, seed=1)
+    action, saved_state = generate_move(board, PLAYER1, saved_state, 300, 100, 'random', True)
+    saved_state.ponderer.thread.join()
+    apply_player_action(board, action, PLAYER1)
+    apply_player_action(board, 0, PLAYER2)
+    generate_move(board, PLAYER1, saved_state, 300, 100, 'random', True)
+    assert (saved_state.node_budget.last_report['peak_nodes'] <= 100)
+    saved_state.close()
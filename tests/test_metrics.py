@@ -0,0 +1,105 @@
+import json
+import math
+
+
+def test_null_metrics_by_default():
+    from agents.metrics import get_metrics
+
+    metrics = get_metrics()
+    assert not metrics.enabled
+    metrics.increment("moves")
+    metrics.observe("move_seconds", 0.1)
+    assert metrics.counters == {} and metrics.histograms == {}
+
+
+def test_metrics_aggregation():
+    from agents.metrics import Metrics, InMemorySink, Histogram
+
+    sink = InMemorySink()
+    metrics = Metrics([sink])
+    metrics.increment("moves", agent="a")
+    metrics.increment("moves", 2, agent="a")
+    metrics.increment("moves", agent="b")
+    metrics.set_gauge("tree_nodes", 10)
+    for value in (0.002, 0.02, 0.2, 50):
+        metrics.observe("move_seconds", value)
+    metrics.event("search", nodes=3)
+    metrics.flush()
+
+    assert sink.events[0]["event"] == "search" and sink.events[0]["nodes"] == 3
+    assert sink.snapshot.counters[("moves", (("agent", "a"),))] == 3
+    assert sink.snapshot.counters[("moves", (("agent", "b"),))] == 1
+    assert sink.snapshot.gauges[("tree_nodes", ())] == 10
+    histogram = sink.snapshot.histograms[("move_seconds", ())]
+    assert histogram.count == 4 and math.isclose(histogram.sum, 50.222)
+    assert histogram.counts[-1] == 1
+    assert histogram.quantile(0.5) == 0.025
+    assert histogram.quantile(1.0) == math.inf
+
+    assert Histogram((1, 2)).quantile(0.5) == 1
+
+
+def test_metric_sinks(tmp_path):
+    from agents.metrics import Metrics, JsonLinesSink, PrometheusTextFileSink
+
+    jsonl_path, prometheus_path = str(tmp_path / "metrics.jsonl"), str(tmp_path / "metrics.prom")
+    metrics = Metrics([JsonLinesSink(jsonl_path), PrometheusTextFileSink(prometheus_path)])
+    metrics.increment("games", result="win")
+    metrics.observe("move_seconds", 0.003, agent="mcts")
+    metrics.event("game", moves=12)
+    metrics.close()
+
+    with open(jsonl_path) as file:
+        records = [json.loads(line) for line in file]
+    assert records[0]["event"] == "game" and records[0]["moves"] == 12
+    assert records[1]["event"] == "snapshot" and records[1]["counters"] == {"games,result=win": 1}
+
+    with open(prometheus_path) as file:
+        text = file.read()
+    assert "# TYPE connect4_games counter" in text
+    assert 'connect4_games{result="win"} 1' in text
+    assert 'connect4_move_seconds_bucket{agent="mcts",le="0.001"} 0' in text
+    assert 'connect4_move_seconds_bucket{agent="mcts",le="0.005"} 1' in text
+    assert 'connect4_move_seconds_bucket{agent="mcts",le="+Inf"} 1' in text
+    assert 'connect4_move_seconds_count{agent="mcts"} 1' in text
+
+
+def test_agents_report_metrics():
+    from agents.metrics import Metrics, InMemorySink, set_metrics
+    from agents.agent_mcts import generate_move as generate_move_mcts
+    from agents.agent_minimax import generate_move as generate_move_minimax
+    from agents.common import initialize_game_state, PLAYER1
+
+    sink = InMemorySink()
+    previous = set_metrics(Metrics([sink]))
+    try:
+        generate_move_mcts(initialize_game_state(), PLAYER1, None, 200)
+        generate_move_minimax(initialize_game_state(), PLAYER1, None)
+    finally:
+        set_metrics(previous)
+
+    mcts_event, minimax_event = sink.events
+    assert mcts_event["agent"] == "mcts" and mcts_event["iterations"] == 200
+    assert mcts_event["tree_nodes"] == 200 and mcts_event["rollouts"] == 200
+    assert minimax_event["agent"] == "minimax" and minimax_event["nodes"] > minimax_event["leaves"] > 0
+
+
+def test_mcts_metrics_count_only_the_iterations_of_the_search():
+    from agents.metrics import Metrics, InMemorySink, set_metrics
+    from agents.agent_mcts import State
+    from agents.agent_mcts.mcts import mcts, tree_traversal
+    from agents.common import initialize_game_state, PLAYER1
+
+    # a root kept from an earlier search (reused or pondered) already has visits
+    root = State(initialize_game_state(), player=PLAYER1)
+    tree_traversal(300, root, PLAYER1)
+    sink = InMemorySink()
+    previous = set_metrics(Metrics([sink]))
+    try:
+        mcts(initialize_game_state(), 200, PLAYER1, root=root)
+    finally:
+        set_metrics(previous)
+
+    event, = sink.events
+    assert root.visits == 500
+    assert event["iterations"] == 200 and event["rollouts"] == 200
@@ -61,4 +61,138 @@ def test_generate_minimax_move():
 
     board = string_to_board(board_str)
     action, _ = generate_move(board, PLAYER1, None)
-    assert (action == 4)
\ No newline at end of file
+    assert (action == 4)
+
+def test_evaluation_cache():
+    from agents.agent_minimax import EvaluationCache
+    import pickle
+    from agents.agent_minimax.minimax import score_action, generate_move_minimax, MinimaxSavedState, \
+        minimax_with_alpha_beta_pruning, THREATS
+    from agents.agent_minimax.threats import threat_score
+    from agents.common import initialize_game_state, apply_player_action, init_saved_state, PLAYER1, PLAYER2
+    from agents.rng import AgentRNG
+
+    board = initialize_game_state()
+    cache = EvaluationCache(score_action, max_entries=2)
+    boards = [apply_player_action(board, column, PLAYER1, True) for column in range(3)]
+    assert [cache.evaluate(b, PLAYER2) for b in boards] == [score_action(b, PLAYER2) for b in boards]
+    assert cache.evaluate(boards[2], PLAYER2) == score_action(boards[2], PLAYER2)
+    assert cache.evaluate(boards[2], PLAYER1) == score_action(boards[2], PLAYER1)
+    assert (cache.hits, cache.misses, cache.evictions, len(cache)) == (1, 4, 2, 2)
+
+    cache = EvaluationCache(score_action)
+    _, expected = minimax_with_alpha_beta_pruning(board, 3, -np.inf, np.inf, PLAYER1)
+    # seeded: the move order is random and with some orders alpha-beta cuts every transposition at depth 3
+    _, score = minimax_with_alpha_beta_pruning(board, 3, -np.inf, np.inf, PLAYER1, AgentRNG(0), cache=cache)
+    assert score == expected and cache.hits > 0
+
+    action, saved_state = generate_move_minimax(board, PLAYER1, init_saved_state(board, PLAYER1, seed=0))
+    assert isinstance(saved_state, MinimaxSavedState) and saved_state.eval_cache.misses > 0
+    apply_player_action(board, action, PLAYER1)
+    apply_player_action(board, 3, PLAYER2)
+    hits = saved_state.eval_cache.hits
+    _, saved_state_2 = generate_move_minimax(board, PLAYER1, saved_state)
+    assert saved_state_2.eval_cache is saved_state.eval_cache and saved_state.eval_cache.hits > hits
+
+    # the entries are not pickled, the settings and counters are
+    copied = pickle.loads(pickle.dumps(saved_state))
+    assert len(saved_state.eval_cache) > 0 and len(copied.eval_cache) == 0
+    assert copied.eval_cache.evaluate_uncached is score_action and copied.eval_cache.hits == saved_state.eval_cache.hits
+    assert copied.eval_cache.max_entries == saved_state.eval_cache.max_entries
+
+    # one cache per evaluator: the scores of score_action are never returned for threat_score
+    cache = saved_state.eval_cache
+    _, saved_state = generate_move_minimax(board, PLAYER1, saved_state, None, 100, THREATS)
+    assert saved_state.eval_cache is not cache and saved_state.eval_cache.evaluate_uncached is threat_score
+    _, saved_state = generate_move_minimax(board, PLAYER1, saved_state)
+    assert saved_state.eval_cache is cache
+    _, saved_state = generate_move_minimax(board, PLAYER1, None, None, 0)
+    assert saved_state.eval_cache is None
+
+
+def test_multi_pv():
+    from agents.agent_minimax.minimax import multi_pv, minimax_with_alpha_beta_pruning, score_action
+    from agents.agent_minimax import EvaluationCache
+    from agents.common import initialize_game_state, apply_player_action, get_valid_actions, PLAYER1, PLAYER2
+    from agents.transposition import SharedTranspositionTable
+
+    board = initialize_game_state()
+    for col, player in ((3, PLAYER1), (3, PLAYER2), (2, PLAYER1)):
+        apply_player_action(board, col, player)
+    expected = {}
+    for col in get_valid_actions(board):
+        child = apply_player_action(board, col, PLAYER2, True)
+        _, expected[col] = minimax_with_alpha_beta_pruning(child, 2, -np.inf, np.inf, PLAYER1)
+
+    table = SharedTranspositionTable(1 << 12)
+    try:
+        scores = multi_pv(board, 3, PLAYER2, table=table, cache=EvaluationCache(score_action))
+        assert {col: score for col, score in scores} == expected
+        assert [score for _, score in scores] == sorted(expected.values())
+        top = multi_pv(board, 3, PLAYER2, k=2, table=table)
+        assert [score for _, score in top] == sorted(expected.values())[:2]
+        assert all(expected[col] == score for col, score in top)
+    finally:
+        table.close()
+        table.unlink()
+
+
+def test_threat_score():
+    from agents.agent_minimax.threats import threat_score, WIN_SCORE, IMMEDIATE_WIN_SCORE, LINES
+    from agents.agent_minimax.minimax import generate_move_minimax, THREATS
+    from agents.common import initialize_game_state, PLAYER1, PLAYER2
+
+    assert LINES.shape == (69, 42)
+    board = initialize_game_state()
+    assert threat_score(board, PLAYER1) == 0
+    board[0, :3] = PLAYER1
+    board[1, :2] = PLAYER2
+    assert threat_score(board, PLAYER1) == IMMEDIATE_WIN_SCORE
+    board[0, 3] = PLAYER1
+    assert threat_score(board, PLAYER2) == -WIN_SCORE
+
+    # a threat on the 3rd row (odd) is good for PLAYER1, the same threat of PLAYER2 (colours swapped) is not
+    board = initialize_game_state()
+    board[:3, :3] = [[PLAYER2, PLAYER1, PLAYER2], [PLAYER1, PLAYER2, PLAYER1], [PLAYER1, PLAYER1, PLAYER1]]
+    swapped = np.where(board == 0, 0, 3 - board).astype(board.dtype)
+    assert threat_score(board, PLAYER1) == -threat_score(board, PLAYER2) > threat_score(swapped, PLAYER2) > 0
+
+    action, saved_state = generate_move_minimax(board, PLAYER1, None, None, 100, THREATS)
+    assert saved_state.eval_cache.evaluate_uncached is threat_score
+
+
+def test_evaluator_is_used_under_a_deadline(monkeypatch):
+    import time
+    import agents.agent_minimax.minimax as minimax
+    from agents.agent_minimax.threats import threat_score
+    from agents.common import initialize_game_state, PLAYER1
+
+    calls = dict(threats=0)
+
+    def counting_threat_score(board, player):
+        calls["threats"] += 1
+        return threat_score(board, player)
+
+    monkeypatch.setitem(minimax.EVALUATORS, minimax.THREATS, counting_threat_score)
+    for cache_size in (0, 100):
+        calls["threats"] = 0
+        minimax.generate_move_minimax(initialize_game_state(), PLAYER1, None, None, cache_size, minimax.THREATS,
+                                      deadline=time.monotonic() + 0.2)
+        assert calls["threats"] > 0
+
+
+def test_short_deadline_finds_the_win_in_one():
+    import time
+    from agents.agent_minimax.minimax import generate_move_minimax, iterative_deepening
+    from agents.common import string_to_board, init_saved_state, PLAYER1
+    from agents.rng import AgentRNG
+
+    board = string_to_board("|==============|\n|              |\n|              |\n|              |\n|        X O   |"
+                            "\n|    O X X O   |\n|X O X O O X   |\n|==============|\n|0 1 2 3 4 5 6 |")
+    for seed in range(5):
+        # a deadline that has already passed: only the first search, of depth 2, runs
+        action, depth = iterative_deepening(board, PLAYER1, time.monotonic(), AgentRNG(seed))
+        assert action == 5 and depth == 2
+        action, _ = generate_move_minimax(board, PLAYER1, init_saved_state(board, PLAYER1, seed=seed),
+                                          deadline=time.monotonic())
+        assert action == 5
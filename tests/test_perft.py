@@ -0,0 +1,18 @@
+def test_reference_counts():
+    from benchmarks.perft import perft, REFERENCE
+    from agents.common import initialize_game_state, PLAYER1
+
+    for depth in range(5):
+        assert perft(initialize_game_state(), PLAYER1, depth, "array")[:3] == REFERENCE[depth]
+    for depth in range(8):
+        assert perft(initialize_game_state(), PLAYER1, depth, "bitboard")[:3] == REFERENCE[depth]
+
+
+def test_backends_agree():
+    from benchmarks.perft import perft, divide
+    from benchmarks.positions import sample_positions
+
+    for board, player in sample_positions(6, seed=4):
+        array = perft(board, player, 3, "array")
+        assert perft(board, player, 3, "bitboard") == array
+        assert sum(result.leaves for result in divide(board, player, 3).values()) == array.leaves
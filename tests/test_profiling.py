@@ -0,0 +1,18 @@
+import json
+
+
+def test_profile(tmp_path, capsys):
+    from benchmarks.profiling import profile
+
+    report = profile("agent_random", "agent_minimax", 1, seed=3, output=str(tmp_path), interval=0.0005,
+                     verbose=False)
+    assert capsys.readouterr().out == ""
+    assert {path.name for path in tmp_path.iterdir()} == {"profile.pstats", "collapsed.txt", "phases.json"}
+    minimax = report["agents_time"]["agent_minimax"]
+    assert set(minimax["phases"]) == {"move generation", "evaluation", "win check", "other"}
+    assert 0 < sum(minimax["phases"].values()) <= minimax["total"] * 1.01
+    assert minimax["phases"]["evaluation"] > 0
+    with open(tmp_path / "phases.json") as phases_file:
+        assert json.load(phases_file)["games"] == 1
+    lines = (tmp_path / "collapsed.txt").read_text().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
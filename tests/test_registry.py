@@ -0,0 +1,23 @@
+def test_load_agent():
+    from agents.registry import load_agent, agent_names
+    from agents.agent_random import generate_move
+
+    agent = load_agent("agent_random")
+    assert agent.generate_move is generate_move
+    assert agent.init(None, None, seed=1).rng is not None
+    assert load_agent("agent_random") is agent
+    generate_move_mcts, init_mcts = load_agent("agent_mcts")
+    assert init_mcts(None, None, seed=1).rng is not None
+    assert "agent_minimax" in agent_names()
+
+
+def test_agents_are_imported_on_first_use():
+    import subprocess
+    import sys
+
+    code = ("import sys; from agents.registry import register, load_agent; import main, tournament; "
+            "register('random', 'agents.agent_random'); print('agents.agent_random' in sys.modules, "
+            "'agents.agent_mcts' in sys.modules, 'agents.agent_minimax' in sys.modules); load_agent('random'); "
+            "print('agents.agent_random' in sys.modules)")
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    assert output.split() == ["False", "False", "False", "True"]
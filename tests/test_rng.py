@@ -0,0 +1,39 @@
+import numpy as np
+
+from agents.rng import AgentRNG
+
+
+def test_agent_rng_is_reproducible():
+    rng_1, rng_2 = AgentRNG(7, block_size=16), AgentRNG(7, block_size=16)
+    # crossing several block refills
+    samples_1 = [rng_1.random() for _ in range(100)]
+    samples_2 = [rng_2.random() for _ in range(100)]
+    assert samples_1 == samples_2
+    assert all(0 <= s < 1 for s in samples_1)
+    assert samples_1 != [AgentRNG(8).random() for _ in range(100)]
+
+
+def test_agent_rng_choice_and_randint():
+    rng = AgentRNG(0)
+    options = np.array([1, 3, 5])
+    chosen = {rng.choice(options) for _ in range(200)}
+    assert chosen == {1, 3, 5}
+    assert {rng.randint(7) for _ in range(500)} == set(range(7))
+
+    array = np.arange(10)
+    rng.shuffle(array)
+    assert sorted(array) == list(range(10))
+
+
+def test_seeded_agents_replay():
+    from agents.agent_mcts import generate_move as generate_move_mcts, init as init_mcts
+    from agents.agent_random import generate_move as generate_move_random, init as init_random
+    from agents.common import initialize_game_state, PLAYER1
+
+    board = initialize_game_state()
+    for generate_move, init, args in ((generate_move_mcts, init_mcts, (300,)), (generate_move_random, init_random, ())):
+        moves = []
+        for _ in range(2):
+            saved_state = init(board, PLAYER1, seed=3)
+            moves.append([generate_move(board, PLAYER1, saved_state, *args)[0] for _ in range(5)])
+        assert moves[0] == moves[1]
@@ -0,0 +1,47 @@
+import numpy as np
+
+
+def test_game_positions():
+    from selfplay import random_playout, game_positions
+    from agents.common import apply_player_action, connected_four, PLAYER1, PLAYER2, NO_PLAYER
+    from agents.rng import AgentRNG
+
+    moves, winner = random_playout(AgentRNG(3))
+    records = game_positions(moves, winner)
+    assert len(records) == len(moves)
+    assert (records["board"][0] == 0).all()
+    board = records["board"][-1].copy()
+    apply_player_action(board, records["move"][-1], records["player"][-1])
+    if winner == NO_PLAYER:
+        assert (records["outcome"] == 0).all()
+    else:
+        assert connected_four(board, winner)
+        assert records["outcome"][-1] == 1 and records["player"][-1] == winner
+        assert (records["outcome"][records["player"] != winner] == -1).all()
+    assert set(records["player"][:2]) == {PLAYER1, PLAYER2}
+
+
+def test_generate_dataset_dedup_and_resume(tmp_path):
+    from selfplay import generate_dataset, load_chunks
+
+    fresh = generate_dataset(str(tmp_path / "fresh"), 40, processes=1, chunk_size=200, games_per_task=10)
+    chunks = load_chunks(str(tmp_path / "fresh"))
+    assert fresh["games"] == 40 and len(chunks) == len(fresh["chunks"]) > 1
+    assert isinstance(chunks[0], np.memmap)
+    keys = np.concatenate([chunk["key"] for chunk in chunks])
+    assert len(keys) == fresh["positions"] == len(np.unique(keys))
+
+    generate_dataset(str(tmp_path / "resumed"), 20, processes=1, chunk_size=200, games_per_task=10)
+    resumed = generate_dataset(str(tmp_path / "resumed"), 40, processes=1, chunk_size=200, games_per_task=10)
+    assert resumed["games"] == 40 and resumed["positions"] == fresh["positions"]
+    assert np.array_equal(np.concatenate([chunk["key"] for chunk in load_chunks(str(tmp_path / "resumed"))]), keys)
+
+
+def test_generate_dataset_agents(tmp_path):
+    from selfplay import generate_dataset, load_chunks
+
+    manifest = generate_dataset(str(tmp_path), 2, agents=("agent_random", "agent_minimax"), processes=1,
+                                dedup=False)
+    records = np.concatenate(load_chunks(str(tmp_path)))
+    assert manifest["games"] == 2 and len(records) == manifest["positions"]
+    assert (records["board"][0] == 0).all()
@@ -0,0 +1,91 @@
+import asyncio
+
+
+def test_game_server():
+    from server import GameServer
+    from benchmarks.server_load import play_client
+
+    async def session():
+        game_server = GameServer(workers=1)
+        server = await game_server.start()
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            for command, reply in (("PLAY 3", "ERROR"), ("NEW agent_unknown first", "ERROR"),
+                                   ("NEW agent_random first 1", "GAME"), ("PLAY 9", "ERROR"), ("PLAY 3", "MOVE")):
+                writer.write(f"{command}\n".encode())
+                assert (await reader.readline()).decode().startswith(reply)
+            writer.write(b"QUIT\n")
+            writer.close()
+
+            latencies = []
+            results = await asyncio.gather(*(play_client("127.0.0.1", port, None, "agent_random", [], game, latencies)
+                                             for game in range(4)))
+            assert all(result in ("WIN", "LOSS", "DRAW") for result in results)
+            assert len(latencies) > 0
+            assert game_server.moves_served == len(latencies) + 1
+            assert game_server.active_games == 0
+        finally:
+            server.close()
+            await server.wait_closed()
+            game_server.close()
+
+    asyncio.run(session())
+
+
+def test_game_server_errors():
+    from server import GameServer
+
+    async def session():
+        game_server = GameServer(workers=1)
+        server = await game_server.start()
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            for command, reply in (
+                    # pondering keeps a thread in the saved state, which cannot be sent to a worker
+                    ("NEW agent_mcts first 1 200 null \"random\" true", "ERROR cannot start game"),
+                    ("NEW agent_random first 1 200", "ERROR cannot start game"),
+                    # the agent raises in the worker: the game is abandoned
+                    ("NEW agent_minimax second 1 1 0 \"bogus\"", "GAME"), ("", "ERROR agent agent_minimax failed"),
+                    ("PLAY 3", "ERROR no game"), ("\udcff", "ERROR command is not UTF-8"),
+                    ("NEW agent_mcts second 1 50", "GAME"), ("", "MOVE")):
+                if command:
+                    writer.write(f"{command}\n".encode(errors="surrogateescape"))
+                assert (await reader.readline()).decode().startswith(reply)
+            assert game_server.active_games == 1
+            writer.write(b"QUIT\n")
+            writer.close()
+
+            # a line over the stream limit is skipped, the connection goes on with the next one
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"PLAY " + b"3" * 2 ** 17 + b"\nPLAY 3\n")
+            assert await reader.readline() == b"ERROR command too long\n"
+            assert (await reader.readline()).decode().startswith("ERROR no game")
+            writer.write(b"QUIT\n")
+            assert await reader.readline() == b""
+            writer.close()
+        finally:
+            server.close()
+            await server.wait_closed()
+            game_server.close()
+
+    asyncio.run(session())
+
+
+def test_compute_move_rejects_invalid_columns(monkeypatch):
+    import sys
+    import types
+    import pytest
+    from server import compute_move
+    from agents.common import initialize_game_state, PLAYER1
+    from agents import registry
+
+    module = types.ModuleType("invalid_agent")
+    module.generate_move = lambda board, player, saved_state: (7, saved_state)
+    monkeypatch.setitem(sys.modules, "invalid_agent", module)
+    monkeypatch.setitem(registry.AGENTS, "agent_invalid", "invalid_agent")
+    monkeypatch.setattr(registry, "_loaded", {})
+    with pytest.raises(ValueError, match="invalid column 7"):
+        compute_move("agent_invalid", initialize_game_state(), PLAYER1, None, ())
+    assert compute_move("agent_random", initialize_game_state(), PLAYER1, None, ())[0] in range(7)
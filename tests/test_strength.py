@@ -0,0 +1,24 @@
+def test_suite_best_moves():
+    from benchmarks.strength import SUITE, CATEGORIES, verify
+
+    assert {position.category for position in SUITE} == set(CATEGORIES)
+    assert len({position.name for position in SUITE}) == len(SUITE)
+    assert [position.name for position in SUITE if not verify(position)] == []
+
+
+def test_run():
+    from benchmarks.strength import SUITE, AgentConfig, run, parse_config
+    from agents.metrics import get_metrics
+
+    assert parse_config('threats=agent_minimax:[null, 0, "threats"]') == \
+        AgentConfig("threats", "agent_minimax", (None, 0, "threats"))
+    positions = [position for position in SUITE if position.category == "win_in_1"][:2]
+    report = run([AgentConfig("minimax", "agent_minimax"), AgentConfig("mcts", "agent_mcts", (50,))], (0.01, 0.05),
+                 positions, verbose=False)
+    assert not get_metrics().enabled
+    for name in ("minimax", "mcts"):
+        moves = report["results"][name][positions[0].name]
+        assert len(moves) == 2 and all(move["work"] > 0 and move["correct"] == (move["move"] in positions[0].best)
+                                       for move in moves)
+        summary = report["summary"][name]
+        assert summary["positions"] == 2 and [result["budget"] for result in summary["budgets"]] == [0.01, 0.05]
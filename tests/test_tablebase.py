@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def tablebase(tmp_path):
+    from agents.tablebase import Tablebase, generate, random_seeds
+
+    path = str(tmp_path / "endgame.c4tb")
+    generate(path, 8, random_seeds(200, 8, seed=1))
+    tablebase = Tablebase(path)
+    yield tablebase
+    tablebase.close()
+
+
+def test_entries_are_consistent(tablebase):
+    from agents.bitboard import to_board
+    from agents.tablebase import random_seeds, WIN, LOSS, DRAW
+    from agents.common import apply_player_action, is_winning_action, check_end_state, GameState, PLAYER1, PLAYER2
+
+    assert tablebase.max_empty == 8
+    checked = 0
+    for current, mask in random_seeds(200, 8, seed=1):
+        board = to_board(current, mask)
+        player = PLAYER1 if np.count_nonzero(board) % 2 == 0 else PLAYER2
+        opponent = PLAYER2 if player == PLAYER1 else PLAYER1
+        entry = tablebase.probe(board, player)
+        assert tablebase.probe(board, opponent) is None
+        if entry.distance == 1:
+            assert entry.result in (WIN, DRAW)
+            assert entry.result != WIN or is_winning_action(board, entry.move, player)
+            continue
+        child = apply_player_action(board, entry.move, player, True)
+        assert check_end_state(child, player) == GameState.STILL_PLAYING
+        child_entry = tablebase.probe(child, opponent)
+        assert child_entry.result == {WIN: LOSS, DRAW: DRAW, LOSS: WIN}[entry.result]
+        assert child_entry.distance == entry.distance - 1
+        checked += 1
+    assert checked > 0
+    assert tablebase.probe(np.zeros((6, 7), dtype=board.dtype), PLAYER1) is None
+
+
+def test_agents_play_tablebase_moves(tablebase):
+    from agents.bitboard import to_board
+    from agents.tablebase import random_seeds, set_tablebase
+    from agents.agent_mcts import generate_move as generate_move_mcts
+    from agents.agent_minimax import generate_move as generate_move_minimax
+    from agents.common import PLAYER1, PLAYER2
+
+    previous = set_tablebase(tablebase)
+    try:
+        for current, mask in list(random_seeds(200, 8, seed=1))[:5]:
+            board = to_board(current, mask)
+            player = PLAYER1 if np.count_nonzero(board) % 2 == 0 else PLAYER2
+            move = tablebase.probe(board, player).move
+            assert generate_move_mcts(board, player, None, 1)[0] == move
+            assert generate_move_minimax(board, player, None)[0] == move
+    finally:
+        set_tablebase(previous)
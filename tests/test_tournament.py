@@ -0,0 +1,100 @@
+import math
+
+
+def test_play_game_headless(capsys):
+    from main import play_game
+    from agents.agent_random import generate_move, init
+    from agents.common import NO_PLAYER, PLAYER1, PLAYER2
+    from functools import partial
+
+    results = [play_game(generate_move, generate_move, init_1=partial(init, seed=1), init_2=partial(init, seed=2),
+                         verbose=False) for _ in range(2)]
+    assert capsys.readouterr().out == ""
+    assert results[0][0] in (NO_PLAYER, PLAYER1, PLAYER2)
+    # seeded agents replay the same game
+    assert [action for action, _ in results[0][1]] == [action for action, _ in results[1][1]]
+    assert all(move_time >= 0 for _, move_time in results[0][1])
+
+
+def test_play_game_lends_read_only_boards(monkeypatch):
+    import pytest
+    from main import play_game, DEBUG_BOARDS_VARIABLE
+    from agents.agent_mcts import generate_move as generate_move_mcts
+    from agents.agent_minimax import generate_move as generate_move_minimax
+    from agents.agent_random import generate_move as generate_move_random
+    from agents.common import apply_player_action
+
+    def writing_move(board, player, saved_state):
+        apply_player_action(board, 0, player)
+        return 0, saved_state
+
+    def sneaky_move(board, player, saved_state):
+        board.flags.writeable = True
+        board[5, 6] = player
+        return 0, saved_state
+
+    with pytest.raises(ValueError):
+        play_game(writing_move, generate_move_random, verbose=False)
+    with pytest.raises(ValueError):
+        play_game(generate_move_random, writing_move, verbose=False)
+    monkeypatch.setenv(DEBUG_BOARDS_VARIABLE, "1")
+    with pytest.raises(ValueError):
+        play_game(sneaky_move, generate_move_random, verbose=False)
+    play_game(lambda board, player, saved_state: generate_move_mcts(board, player, saved_state, 50),
+              generate_move_minimax, verbose=False)
+
+
+def test_summarize():
+    from tournament import summarize, wilson_interval, elo_difference
+
+    records = [
+        dict(first=1, second=2, winner=1, move_times=[0.1, 0.2, 0.1]),
+        dict(first=2, second=1, winner=0, move_times=[0.2, 0.1]),
+        dict(first=1, second=2, winner=2, move_times=[0.1, 0.2]),
+        dict(first=2, second=1, winner=1, move_times=[0.2, 0.1]),
+    ]
+    summary = summarize(records, "a", "b")
+    assert (summary["wins"], summary["draws"], summary["losses"]) == (2, 1, 1)
+    assert summary["score"] == 0.625
+    assert summary["score_ci"][0] < 0.625 < summary["score_ci"][1]
+    assert summary["elo"] > 0
+    assert math.isclose(summary["mean_move_time"][0], 0.1)
+    assert math.isclose(summary["mean_move_time"][1], 0.2)
+
+    low, high = wilson_interval(50, 100)
+    assert math.isclose(low + high, 1.0)
+    assert elo_difference(0.5) == 0
+    assert math.isclose(elo_difference(10 / 11), 400)
+
+
+def test_summarize_clean_sweep():
+    import json
+    from tournament import summarize, elo_difference
+
+    records = [dict(first=1 + game % 2, second=2 - game % 2, winner=1, move_times=[0.1]) for game in range(10)]
+    summary = summarize(records, "a", "b")
+    assert summary["score"] == 1.0
+    assert summary["elo"] == elo_difference(0.95) > 0
+    assert all(math.isfinite(bound) for bound in summary["elo_ci"])
+    assert json.loads(json.dumps(summary, allow_nan=False))["elo"] == summary["elo"]
+    swept = summarize([dict(record, winner=3 - record["winner"]) for record in records], "a", "b")
+    assert math.isclose(swept["elo"], -summary["elo"])
+
+
+def test_run_tournament(tmp_path):
+    import json
+    from tournament import run_tournament
+
+    summary = run_tournament("agent_random", "agent_random", 4, processes=2, output=str(tmp_path))
+    assert summary["games"] == 4
+    assert summary["wins"] + summary["draws"] + summary["losses"] == 4
+    with open(tmp_path / "games.jsonl") as games_file:
+        records = [json.loads(line) for line in games_file]
+    assert sorted(record["game"] for record in records) == [0, 1, 2, 3]
+    assert all(len(record["moves"]) == len(record["move_times"]) for record in records)
+
+    from agents.game_record import GameRecordReader
+    reader = GameRecordReader(tmp_path / "games.c4gr")
+    assert len(reader) == 4
+    assert sorted(map(len, (reader.moves(i) for i in range(4)))) == sorted(len(r["moves"]) for r in records)
+
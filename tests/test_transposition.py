@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def table():
+    from agents.transposition import SharedTranspositionTable
+
+    table = SharedTranspositionTable(1 << 10)
+    yield table
+    table.close()
+    table.unlink()
+
+
+def store_entries(table, keys):
+    for key in keys:
+        table.store(key, float(key), 3, move=key % 7)
+    return table.stores
+
+
+def test_store_and_probe(table):
+    from agents.transposition import EXACT, LOWER_BOUND, UPPER_BOUND, bound_flag, SLOT_WORDS, HEADER_WORDS
+
+    assert table.n_slots == 1 << 10
+    assert table.probe(0) is None
+    table.store(0, -1.5, 4, LOWER_BOUND, 3)
+    entry = table.probe(0)
+    assert entry == (-1.5, 4, LOWER_BOUND, 3, 0)
+    table.store(0, 2.0, 5, EXACT, -1, visits=10)
+    assert table.probe(0) == (2.0, 5, EXACT, -1, 10)
+    assert table.probe(1) is None
+    assert (bound_flag(0, 0, 10), bound_flag(10, 0, 10), bound_flag(5, 0, 10)) == (UPPER_BOUND, LOWER_BOUND, EXACT)
+
+    # a torn (partially overwritten) entry fails the verification
+    for slot in range(table.n_slots):
+        base = HEADER_WORDS + SLOT_WORDS * slot
+        if table.words[base + 3] == 10:
+            table.words[base + 3] = 11
+    assert table.probe(0) is None
+
+
+def test_replacement():
+    from agents.transposition import SharedTranspositionTable
+
+    table = SharedTranspositionTable(2)  # a single bucket
+    try:
+        table.store(1, 1.0, 5)
+        table.store(2, 2.0, 1)
+        table.store(3, 3.0, 2)  # replaces the shallower entry
+        assert table.probe(1) is not None and table.probe(2) is None and table.probe(3) is not None
+        table.new_search()
+        table.store(4, 4.0, 1)  # entries of an older search go first, then the shallower
+        assert table.probe(1) is not None and table.probe(3) is None
+        assert table.replacements == 2
+    finally:
+        table.close()
+        table.unlink()
+
+
+def test_shared_between_processes(table):
+    from concurrent.futures import ProcessPoolExecutor
+
+    keys = list(range(100, 400, 3))
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        assert list(executor.map(store_entries, [table, table], [keys[::2], keys[1::2]])) == [50, 50]
+    entries = [table.probe(key) for key in keys]
+    assert sum(entry is not None and entry.value == key for entry, key in zip(entries, keys)) > 90
+
+
+def test_minimax_with_table(table):
+    from agents.agent_minimax.minimax import minimax_with_alpha_beta_pruning, generate_move_minimax
+    from selfplay import random_playout, game_positions
+    from agents.common import get_valid_actions
+    from agents.rng import AgentRNG
+
+    records = game_positions(*random_playout(AgentRNG(5)))[:12]
+    for board, player in zip(records["board"], records["player"]):
+        _, expected = minimax_with_alpha_beta_pruning(board.copy(), 3, -np.inf, np.inf, player)
+        stats = dict(nodes=0, leaves=0)
+        _, score = minimax_with_alpha_beta_pruning(board.copy(), 3, -np.inf, np.inf, player, stats=stats, table=table)
+        assert score == expected
+        cached = dict(nodes=0, leaves=0)
+        _, score = minimax_with_alpha_beta_pruning(board.copy(), 3, -np.inf, np.inf, player, stats=cached, table=table)
+        assert score == expected and cached['nodes'] < stats['nodes']
+    action, _ = generate_move_minimax(records["board"][0].copy(), records["player"][0], None, table.name)
+    assert action in get_valid_actions(records["board"][0])
+
+
+def test_mcts_with_table(table):
+    from agents.agent_mcts.mcts import generate_move_mcts, shared_key, SHARED_MIN_VISITS
+    from agents.common import initialize_game_state, PLAYER1, PLAYER2
+    from agents.rng import AgentRNG
+    from agents.common import SavedState
+
+    board = initialize_game_state()
+    generate_move_mcts(board, PLAYER1, SavedState(rng=AgentRNG(0)), 500, shared_table=table.name)
+    root = table.probe(shared_key(board, PLAYER1))
+    assert root is not None and root.visits >= 500
+    assert table.probe(shared_key(board, PLAYER2)) is None
+    stores = table.stores
+    generate_move_mcts(board, PLAYER1, SavedState(rng=AgentRNG(1)), 500, shared_table=table)
+    assert table.hits > 0 and table.stores > stores
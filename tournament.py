@@ -0,0 +1,193 @@
+"""
+Headless tournament between two agents, played on a process pool.
+
+Agents are given by their name in agents.registry, by default the name of their package in `agents` (e.g. agent_mcts),
+and are used through the same contract as in main.py: the package's `generate_move` (GenMove) and, if present, `init`
+hook, which is called with the seed of the game. The first agent moves first in the even games, the second one in the
+odd games.
+
+Every finished game is appended to <output>/games.jsonl (who moved first and who won as 1 or 2 for the first or second
+agent of the tournament, 0 for a draw; seed, moves and per-move times) and, in the compact binary format of
+agents.game_record, to <output>/games.c4gr. The summary (win/draw/loss rates with 95% confidence intervals, score and
+Elo difference) is printed and written to <output>/summary.json.
+
+With --move-seconds the games are played under a per-move time control (see main.TimeControl), agents accepting a
+`deadline` size their search to it and overrunning agents are cut off with a fallback move.
+
+Both agents of a game share a process, so do not let agent_mcts ponder here (its ponder argument): the pondering thread
+would take CPU time from the opponent's search.
+
+    python tournament.py agent_mcts agent_random --games 1000 --processes 8 --args-1 "[500]"
+    python tournament.py agent_mcts agent_minimax --games 200 --move-seconds 0.5 --increment 0.1
+"""
+import argparse
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+from agents.common import NO_PLAYER, PLAYER1, PLAYER2
+from agents.game_record import GameRecordWriter
+from agents.registry import load_agent
+
+Z_95 = 1.959963984540054
+
+
+def play_match(game: int, agent_1: str, agent_2: str, args_1: tuple, args_2: tuple, seed: int,
+               time_control=None) -> Dict:
+    """
+    Plays game number `game` of the tournament in a worker process and returns its record
+    """
+    from main import play_game
+
+    (generate_move_1, init_1), (generate_move_2, init_2) = load_agent(agent_1), load_agent(agent_2)
+    init_1, init_2 = partial(init_1, seed=seed), partial(init_2, seed=seed + 1)
+    first, second = (1, 2) if game % 2 == 0 else (2, 1)
+    if game % 2 == 0:
+        winner, moves = play_game(generate_move_1, generate_move_2, agent_1, agent_2, args_1, args_2, init_1, init_2,
+                                  verbose=False, time_control=time_control)
+    else:
+        winner, moves = play_game(generate_move_2, generate_move_1, agent_2, agent_1, args_2, args_1, init_2, init_1,
+                                  verbose=False, time_control=time_control)
+    return dict(
+        game=game,
+        seed=seed,
+        first=first,
+        second=second,
+        winner={PLAYER1: first, PLAYER2: second, NO_PLAYER: 0}[winner],
+        moves=[int(action) for action, _ in moves],
+        move_times=[move_time for _, move_time in moves],
+    )
+
+
+def wilson_interval(successes: float, n: int, z: float = Z_95) -> Tuple[float, float]:
+    """
+    Wilson score confidence interval of a rate
+    """
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    centre = (p + z * z / (2 * n)) / (1 + z * z / n)
+    half_width = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return max(0.0, centre - half_width), min(1.0, centre + half_width)
+
+
+def elo_difference(score: float, n: Optional[int] = None) -> float:
+    """
+    Elo difference corresponding to the expected score, +-inf for a score of 1 or 0. With the number of games `n`
+    the score is clamped to [1 / (2n), 1 - 1 / (2n)] first, so a clean sweep gives a finite estimate (and valid JSON)
+    """
+    if n is not None:
+        bound = 1 / (2 * max(n, 1))
+        score = min(max(score, bound), 1 - bound)
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+def summarize(records: List[Dict], agent_1: str, agent_2: str) -> Dict:
+    """
+    Win/draw/loss rates of agent_1 against agent_2 with 95% confidence intervals, score and Elo difference
+    """
+    n = len(records)
+    wins = sum(record["winner"] == 1 for record in records)
+    losses = sum(record["winner"] == 2 for record in records)
+    draws = n - wins - losses
+    score = (wins + draws / 2) / n if n else 0.5
+    score_interval = wilson_interval(wins + draws / 2, n)
+    move_times = {1: [], 2: []}
+    for record in records:
+        for index, move_time in enumerate(record["move_times"]):
+            move_times[record["first"] if index % 2 == 0 else record["second"]].append(move_time)
+    return dict(
+        agent_1=agent_1,
+        agent_2=agent_2,
+        games=n,
+        wins=wins,
+        draws=draws,
+        losses=losses,
+        win_rate=wins / n if n else 0.0,
+        win_rate_ci=wilson_interval(wins, n),
+        draw_rate=draws / n if n else 0.0,
+        draw_rate_ci=wilson_interval(draws, n),
+        score=score,
+        score_ci=score_interval,
+        elo=elo_difference(score, n),
+        elo_ci=tuple(elo_difference(bound, n) for bound in score_interval),
+        mean_move_time=[sum(times) / len(times) if times else 0.0 for times in move_times.values()],
+        max_move_time=[max(times, default=0.0) for times in move_times.values()],
+    )
+
+
+def run_tournament(agent_1: str, agent_2: str, no_of_games: int, processes: Optional[int] = None,
+                   args_1: tuple = (), args_2: tuple = (), seed: int = 0, output: str = "tournament",
+                   time_control=None) -> Dict:
+    """
+    Plays `no_of_games` games on a pool of `processes` worker processes (one per CPU if None), streaming every
+    finished game to <output>/games.jsonl and <output>/games.c4gr, and returns the summary
+    """
+    os.makedirs(output, exist_ok=True)
+    records = []
+    record_path = os.path.join(output, "games.c4gr")
+    if os.path.exists(record_path):
+        os.remove(record_path)
+    with open(os.path.join(output, "games.jsonl"), "w") as games_file, GameRecordWriter(record_path) as record_file, \
+            ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [
+            executor.submit(play_match, game, agent_1, agent_2, tuple(args_1), tuple(args_2), seed + 2 * game,
+                            time_control)
+            for game in range(no_of_games)
+        ]
+        for future in as_completed(futures):
+            record = future.result()
+            records.append(record)
+            games_file.write(json.dumps(record) + "\n")
+            games_file.flush()
+            board_winner = {0: NO_PLAYER, record["first"]: PLAYER1, record["second"]: PLAYER2}[record["winner"]]
+            record_file.write(record["moves"], board_winner, record["move_times"])
+            record_file.flush()
+
+    summary = summarize(records, agent_1, agent_2)
+    with open(os.path.join(output, "summary.json"), "w") as summary_file:
+        json.dump(summary, summary_file, indent=2)
+    return summary
+
+
+def print_summary(summary: Dict):
+    agent_1, agent_2 = summary["agent_1"], summary["agent_2"]
+    print(f"{agent_1} vs {agent_2}: {summary['games']} games")
+    print(f"  wins   {summary['wins']:6d}  {summary['win_rate']:6.1%}  "
+          f"[{summary['win_rate_ci'][0]:.1%}, {summary['win_rate_ci'][1]:.1%}]")
+    print(f"  draws  {summary['draws']:6d}  {summary['draw_rate']:6.1%}  "
+          f"[{summary['draw_rate_ci'][0]:.1%}, {summary['draw_rate_ci'][1]:.1%}]")
+    print(f"  losses {summary['losses']:6d}")
+    print(f"  score  {summary['score']:.3f} [{summary['score_ci'][0]:.3f}, {summary['score_ci'][1]:.3f}]  "
+          f"Elo {summary['elo']:+.0f} [{summary['elo_ci'][0]:+.0f}, {summary['elo_ci'][1]:+.0f}]")
+    for index, agent in enumerate((agent_1, agent_2)):
+        print(f"  {agent} move time: mean {summary['mean_move_time'][index]:.4f}s, "
+              f"max {summary['max_move_time'][index]:.4f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play a headless agent-vs-agent tournament")
+    parser.add_argument("agent_1", help="package name of the first agent in agents, e.g. agent_mcts")
+    parser.add_argument("agent_2", help="package name of the second agent in agents, e.g. agent_random")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--args-1", type=json.loads, default=[], help="JSON list of extra generate_move arguments")
+    parser.add_argument("--args-2", type=json.loads, default=[], help="JSON list of extra generate_move arguments")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="tournament")
+    parser.add_argument("--move-seconds", type=float, default=None, help="time per move, no time control if omitted")
+    parser.add_argument("--increment", type=float, default=0.0, help="seconds added to the reserve after each move")
+    cli_args = parser.parse_args()
+    from main import TimeControl
+    print_summary(run_tournament(
+        cli_args.agent_1, cli_args.agent_2, cli_args.games, cli_args.processes, cli_args.args_1, cli_args.args_2,
+        cli_args.seed, cli_args.output,
+        None if cli_args.move_seconds is None else TimeControl(cli_args.move_seconds, cli_args.increment),
+    ))